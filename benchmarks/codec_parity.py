@@ -0,0 +1,126 @@
+'''Parity check of the numpy turbo codec backend against the itpp turbo_codec.
+
+   Usage, from the repository root:
+       python benchmarks/codec_parity.py
+       python benchmarks/codec_parity.py --block-sizes 176 1056 4032 --snrs-db -2 -1.5 -1 --nrof-blocks 1000
+
+   For every block size (transport block size + 24 bit CRC of the notebooks) the same random bits are encoded with
+   both backends, which have to give the same encoded bits. The codewords are sent as BPSK over AWGN at every SNR,
+   and both backends decode the same soft values. The check fails if
+     - the backends return a different number of decoded bits, or decode the noiseless codewords to different bits
+       (i.e. in a different order) than the transmitted ones, or
+     - the block error rates of the backends differ by more than the --confidence interval of the difference of two
+       binomial proportions.
+   The SNRs are Es/N0 of the coded BPSK symbols; the defaults lie around the waterfall of the rate 1/3 code.
+   The check is skipped, with exit status 0, when py-itpp is not installed.
+'''
+import argparse
+import os
+import sys
+
+import numpy as np
+import scipy.stats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+CRC_SIZE = 24
+
+'''Block sizes of the notebooks' MCS table: transport block sizes 152, 1032 and 4008 with CRC'''
+BLOCK_SIZES = [152 + CRC_SIZE, 1032 + CRC_SIZE, 4008 + CRC_SIZE]
+SNRS_DB = [-2.0, -1.5, -1.0]
+
+SEED = 0
+
+'''Decoded bits of both backends for the same soft values, as numpy arrays'''
+def decode_both(block_size, soft_values):
+    from radio_data.src import codec, conversion
+
+    itpp_bits = conversion.to_numpy(codec.decode(block_size, conversion.to_vec(soft_values), 'itpp'))
+    numpy_bits = conversion.to_numpy(codec.decode(block_size, soft_values, 'numpy'))
+
+    return (np.asarray(itpp_bits, dtype=np.uint8), np.asarray(numpy_bits, dtype=np.uint8))
+
+'''Whether the block error rates errors_1 / nrof_blocks and errors_2 / nrof_blocks agree within the two-sided
+   confidence interval of the difference of two binomial proportions (pooled normal approximation)
+'''
+def rates_agree(errors_1, errors_2, nrof_blocks, confidence):
+    pooled_rate = (errors_1 + errors_2) / (2.0 * nrof_blocks)
+    standard_error = np.sqrt(pooled_rate * (1.0 - pooled_rate) * 2.0 / nrof_blocks)
+    z = scipy.stats.norm.ppf(0.5 + 0.5 * confidence)
+
+    return (abs(errors_1 - errors_2) / float(nrof_blocks) <= z * standard_error, z * standard_error)
+
+'''Run the parity check, print one line per check and return the number of failed checks'''
+def check_parity(block_sizes=BLOCK_SIZES, snrs_db=SNRS_DB, nrof_blocks=500, confidence=0.99, seed=SEED):
+    from radio_data.src import codec, conversion
+
+    rng = np.random.default_rng(seed)
+    nrof_failures = 0
+
+    for block_size in block_sizes:
+        info_bits = rng.integers(0, 2, nrof_blocks * block_size).astype(np.uint8)
+
+        itpp_encoded = np.asarray(conversion.to_numpy(codec.encode(block_size, conversion.to_bvec(info_bits), 'itpp')), dtype=np.uint8)
+        numpy_encoded = np.asarray(conversion.to_numpy(codec.encode(block_size, info_bits, 'numpy')), dtype=np.uint8)
+
+        encoder_parity = itpp_encoded.shape == numpy_encoded.shape and np.array_equal(itpp_encoded, numpy_encoded)
+        print('K=%5d  encoder: %s' %(block_size, 'identical' if encoder_parity else 'DIFFERENT'))
+        nrof_failures += not encoder_parity
+
+        symbols = 1.0 - 2.0 * itpp_encoded
+
+        itpp_decoded, numpy_decoded = decode_both(block_size, symbols)
+        order_parity = (itpp_decoded.size == info_bits.size and numpy_decoded.size == info_bits.size
+                        and np.array_equal(itpp_decoded, info_bits) and np.array_equal(numpy_decoded, info_bits))
+        print('K=%5d  noiseless decode: %d / %d bits, %s' %(block_size,
+                                                             itpp_decoded.size,
+                                                             numpy_decoded.size,
+                                                             'same bits and order' if order_parity else 'DIFFERENT'))
+        nrof_failures += not order_parity
+        if not order_parity:
+            continue
+
+        for snr_db in snrs_db:
+            noise_variance = np.power(10, -0.1 * snr_db)
+            received = symbols + np.sqrt(noise_variance) * rng.standard_normal(symbols.size)
+            soft_values = 2.0 * received / noise_variance
+
+            itpp_decoded, numpy_decoded = decode_both(block_size, soft_values)
+
+            itpp_errors = int(np.count_nonzero(np.any(np.reshape(itpp_decoded != info_bits, (nrof_blocks, block_size)), axis=1)))
+            numpy_errors = int(np.count_nonzero(np.any(np.reshape(numpy_decoded != info_bits, (nrof_blocks, block_size)), axis=1)))
+
+            agree, tolerance = rates_agree(itpp_errors, numpy_errors, nrof_blocks, confidence)
+            print('K=%5d  %5.1f dB  BLER itpp %0.4f  numpy %0.4f  tolerance %0.4f  %s' %(block_size,
+                                                                                         snr_db,
+                                                                                         itpp_errors / float(nrof_blocks),
+                                                                                         numpy_errors / float(nrof_blocks),
+                                                                                         tolerance,
+                                                                                         'ok' if agree else 'MISMATCH'))
+            nrof_failures += not agree
+
+    return nrof_failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the numpy turbo codec backend against the itpp turbo_codec.')
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=BLOCK_SIZES, help='block sizes including the CRC')
+    parser.add_argument('--snrs-db', type=float, nargs='+', default=SNRS_DB, help='Es/N0 of the coded BPSK symbols')
+    parser.add_argument('--nrof-blocks', type=int, default=500, help='blocks per block size and SNR')
+    parser.add_argument('--confidence', type=float, default=0.99)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args(argv)
+
+    try:
+        import itpp
+    except ImportError:
+        print('py-itpp is not installed, skipping the codec parity check')
+        return 0
+
+    nrof_failures = check_parity(args.block_sizes, args.snrs_db, args.nrof_blocks, args.confidence, args.seed)
+    print('%d checks failed' %(nrof_failures) if nrof_failures else 'All checks passed')
+
+    return 1 if nrof_failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
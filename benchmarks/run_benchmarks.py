@@ -0,0 +1,422 @@
+'''Benchmarks of the simulation chain and of the utilities hot paths.
+
+   Usage, from the repository root:
+       python benchmarks/run_benchmarks.py --frames 100 1000 --output benchmarks/results.json
+       python benchmarks/run_benchmarks.py --frames 100 --baseline benchmarks/results.json --threshold 0.2
+
+   Every stage runs with fixed seeds on the sizes of the notebooks: 72 subcarriers, 12 OFDM symbols per subframe and
+   all 29 MCSs, for each requested number of frames. The best time of --repeat runs is reported as frames/s and
+   blocks/s (transport blocks, i.e. frames x MCSs for the per-MCS stages). The stages marked as itpp-only in STAGES,
+   i.e. those running the itpp channel, modem, turbo codec or random numbers, are skipped when py-itpp is not
+   installed; all other stages run without it.
+
+   benchmarks/baseline.json holds reference results, with the machine they were measured on under 'environment'.
+
+   With --baseline, every stage is compared against the same stage and number of frames in a results file written
+   earlier, and the script exits with status 1 if any throughput dropped by more than --threshold.
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utilities as utils
+
+
+NROF_SUBCARRIERS = 72
+NROF_OFDM_SYMBOLS = 12
+FFT_SIZE = 128
+CHANNEL_MODEL = 'ITU_VEHICULAR_B'
+RELATIVE_SPEED = 33.33 # m/s
+SNR_DB = 5.0
+CRC_SIZE = 24
+
+'''The 29 MCSs of the notebooks, transport block sizes without CRC'''
+BLOCK_SIZES       = [152, 200, 248, 320, 408, 504, 600, 712, 808, 936,
+                     936, 1032, 1192, 1352, 1544, 1736, 1800,
+                     1800, 1928, 2152, 2344, 2600, 2792, 2984, 3240, 3496, 3624, 3752, 4008]
+MODULATION_ORDERS = [2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+                     4, 4, 4, 4, 4, 4, 4,
+                     6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6]
+
+'''Evaluation and Wiener filter sizes of the Scenario I / II notebooks'''
+NROF_SNRS = 10
+WIENER_TAPS = 10
+WIENER_DELAYS = np.arange(10)
+WIENER_DOPPLERS = (20.0 / 3.0) * np.array([16.67, 33.33])
+SAMPLING_INTERVAL = 1e-3
+
+SEED = 0
+
+'''Seed numpy, and itpp if it is installed, before every timed run'''
+def seed_generators():
+    np.random.seed(SEED)
+
+    try:
+        import itpp
+    except ImportError:
+        return
+
+    itpp.random.RNG_reset(SEED)
+
+def _mcs_table():
+    return [(block_size + CRC_SIZE, modorder) for block_size, modorder in zip(BLOCK_SIZES, MODULATION_ORDERS)]
+
+def _channel(nrof_frames):
+    from radio_data.src import TDL_channel
+
+    channel_coeff = TDL_channel.channel_frequency_response_np(FFT_SIZE, RELATIVE_SPEED, CHANNEL_MODEL, nrof_frames,
+                                                              nrof_subcarriers=NROF_SUBCARRIERS, rng=SEED)[0]
+
+    # Block fading over the subframe, in the (symbols * subcarriers, frames) layout of simulate
+    return np.tile(channel_coeff.T, (NROF_OFDM_SYMBOLS, 1))
+
+def _random_symbols(nrof_frames):
+    rng = np.random.default_rng(SEED)
+    nrof_symbols = nrof_frames * NROF_OFDM_SYMBOLS * NROF_SUBCARRIERS
+
+    return np.sqrt(0.5) * (rng.standard_normal(nrof_symbols) + 1j * rng.standard_normal(nrof_symbols))
+
+'''Every stage builds its inputs for the given number of frames and returns (run, nrof_frames, nrof_blocks), where run()
+   is timed. nrof_frames is None for stages that do not depend on the number of frames, nrof_blocks when they do not
+   process transport blocks.
+'''
+def stage_tdl_channel_np(nrof_frames):
+    from radio_data.src import TDL_channel
+
+    def run():
+        TDL_channel.channel_frequency_response_np(FFT_SIZE, RELATIVE_SPEED, CHANNEL_MODEL, nrof_frames,
+                                                  nrof_subcarriers=NROF_SUBCARRIERS, rng=SEED)
+
+    return (run, nrof_frames, None)
+
+def stage_tdl_channel_itpp(nrof_frames):
+    from radio_data.src import TDL_channel
+
+    def run():
+        TDL_channel.channel_frequency_response(FFT_SIZE, RELATIVE_SPEED, CHANNEL_MODEL, nrof_frames)
+
+    return (run, nrof_frames, None)
+
+def stage_ofdm(nrof_frames):
+    from radio_data.src import ofdm
+
+    symbols = _random_symbols(nrof_frames)
+
+    def run():
+        frame_symbols = ofdm.multiplex_symbols_np(NROF_OFDM_SYMBOLS, NROF_SUBCARRIERS, symbols)
+        ofdm.de_multiplex_symbols_np(NROF_OFDM_SYMBOLS, NROF_SUBCARRIERS, frame_symbols)
+
+    return (run, nrof_frames, None)
+
+def _stage_demodulation(modorder):
+    def stage(nrof_frames):
+        from radio_data.src import modem
+
+        symbols = _random_symbols(nrof_frames)
+        modem.constellation_np(modorder)
+
+        def run():
+            modem.demodulate_soft_values_np(modorder, 0.5, symbols)
+
+        return (run, nrof_frames, None)
+
+    return stage
+
+def stage_rate_match(nrof_frames):
+    from radio_data.src import codec
+
+    rng = np.random.default_rng(SEED)
+    mcs_inputs = []
+    for block_size, modorder in _mcs_table():
+        encoded_block_size = 3 * block_size + 12
+        transmit_block_size = NROF_SUBCARRIERS * NROF_OFDM_SYMBOLS * modorder
+        bits = rng.integers(0, 2, encoded_block_size * nrof_frames, dtype=np.uint8)
+
+        mcs_inputs.append((encoded_block_size, transmit_block_size, bits))
+
+    def run():
+        for encoded_block_size, transmit_block_size, bits in mcs_inputs:
+            rate_matched = codec.rate_match_np(transmit_block_size, encoded_block_size)(bits)
+            codec.de_rate_match_np(transmit_block_size, encoded_block_size)(rate_matched.astype(np.float64))
+
+    return (run, nrof_frames, nrof_frames * len(mcs_inputs))
+
+def _stage_encode(backend):
+    def stage(nrof_frames):
+        from radio_data.src import codec
+
+        mcs_table = _mcs_table()
+        _prepare_codecs(mcs_table, backend)
+
+        seed_generators()
+        mcs_bits = [_random_bits(block_size * nrof_frames, backend) for block_size, _ in mcs_table]
+
+        def run():
+            for (block_size, _), bits in zip(mcs_table, mcs_bits):
+                codec.encode(block_size, bits, backend)
+
+        return (run, nrof_frames, nrof_frames * len(mcs_table))
+
+    return stage
+
+def _stage_decode(backend):
+    def stage(nrof_frames):
+        from radio_data.src import codec, conversion
+
+        mcs_table = _mcs_table()
+        _prepare_codecs(mcs_table, backend)
+
+        seed_generators()
+        mcs_soft_values = []
+        for block_size, _ in mcs_table:
+            encoded_bits = conversion.to_numpy(codec.encode(block_size, _random_bits(block_size * nrof_frames, backend), backend))
+
+            # Noiseless BPSK soft values; the decoder runs its fixed number of iterations whatever the input
+            soft_values = 1.0 - 2.0 * encoded_bits
+            mcs_soft_values.append(soft_values if backend == 'numpy' else conversion.to_vec(soft_values))
+
+        def run():
+            for (block_size, _), soft_values in zip(mcs_table, mcs_soft_values):
+                codec.decode(block_size, soft_values, backend)
+
+        return (run, nrof_frames, nrof_frames * len(mcs_table))
+
+    return stage
+
+def _stage_simulate_all_mcs(backend):
+    def stage(nrof_frames):
+        from radio_data.src import single_link_bicm_ofdm
+
+        mcs_table = _mcs_table()
+        _prepare_codecs(mcs_table, backend)
+
+        channel = _channel(nrof_frames)
+
+        def run():
+            single_link_bicm_ofdm.simulate_all_mcs(channel, SNR_DB, mcs_table, codec_backend=backend)
+
+        return (run, nrof_frames, nrof_frames * len(mcs_table))
+
+    return stage
+
+'''Random bits as an itpp bvec for the itpp backend, as a numpy array for the numpy backend, which runs without itpp'''
+def _random_bits(nrof_bits, backend):
+    if backend == 'numpy':
+        return np.random.default_rng(SEED).integers(0, 2, nrof_bits, dtype=np.uint8)
+
+    import itpp
+    return itpp.random.randb(nrof_bits)
+
+'''Build the codecs of the MCS table before timing'''
+def _prepare_codecs(mcs_table, backend):
+    from radio_data.src import codec
+
+    block_sizes = set(block_size for block_size, _ in mcs_table)
+    if backend == 'numpy':
+        for block_size in block_sizes:
+            codec.get_numpy_turbo_code(block_size)
+    else:
+        codec.prepare_turbo_codecs(block_sizes)
+
+def stage_evaluate_link_adaptation(nrof_frames):
+    rng = np.random.default_rng(SEED)
+    ack_probabilities = rng.random((nrof_frames, len(BLOCK_SIZES), NROF_SNRS))
+    realized_ack = (rng.random((nrof_frames, len(BLOCK_SIZES), NROF_SNRS)) < ack_probabilities).astype(np.float64)
+
+    def run():
+        utils.evaluate_link_adaptation(ack_probabilities, realized_ack, BLOCK_SIZES)
+
+    return (run, nrof_frames, nrof_frames * NROF_SNRS)
+
+def stage_wiener_coeff_bank(nrof_frames):
+    snrs = 10 ** (0.1 * np.linspace(0, 20, NROF_SNRS))
+
+    def run():
+        # Start from an empty in-memory coefficient cache, otherwise only the first run computes anything
+        utils._Wiener_coeff_cache.clear()
+        utils.Wiener_filter_coeff_bank(WIENER_TAPS, WIENER_DELAYS, WIENER_DOPPLERS, snrs, True, SAMPLING_INTERVAL)
+
+    return (run, None, None)
+
+def stage_wiener_predict(nrof_frames):
+    rng = np.random.default_rng(SEED)
+    channel = np.sqrt(0.5) * (rng.standard_normal((nrof_frames, NROF_SUBCARRIERS, NROF_SNRS)) +
+                              1j * rng.standard_normal((nrof_frames, NROF_SUBCARRIERS, NROF_SNRS)))
+    Wiener_coeff = rng.standard_normal((NROF_SNRS, WIENER_TAPS))
+
+    def run():
+        utils.Wiener_predict(Wiener_coeff, channel)
+
+    return (run, nrof_frames, nrof_frames * NROF_SNRS)
+
+def stage_stack_features(nrof_frames):
+    features = np.random.default_rng(SEED).standard_normal((nrof_frames * NROF_SNRS, 2 * NROF_SUBCARRIERS))
+
+    def run():
+        utils.stack_features(features, WIENER_TAPS, dtype=np.float32)
+
+    return (run, nrof_frames, nrof_frames * NROF_SNRS)
+
+'''(name, stage, itpp-only). The demodulation stages need the itpp QAM constellation, and simulate_all_mcs draws its
+   bits, interleavers and noise with itpp for both codec backends.
+'''
+STAGES = [('tdl_channel_np', stage_tdl_channel_np, False),
+          ('tdl_channel_itpp', stage_tdl_channel_itpp, True),
+          ('ofdm_multiplex_demultiplex', stage_ofdm, False),
+          ('modem_demodulate_qpsk', _stage_demodulation(2), True),
+          ('modem_demodulate_16qam', _stage_demodulation(4), True),
+          ('modem_demodulate_64qam', _stage_demodulation(6), True),
+          ('codec_rate_match', stage_rate_match, False),
+          ('codec_encode', _stage_encode('itpp'), True),
+          ('codec_decode', _stage_decode('itpp'), True),
+          ('codec_encode_numpy', _stage_encode('numpy'), False),
+          ('codec_decode_numpy', _stage_decode('numpy'), False),
+          ('simulate_all_mcs', _stage_simulate_all_mcs('itpp'), True),
+          ('simulate_all_mcs_numpy', _stage_simulate_all_mcs('numpy'), True),
+          ('utilities_evaluate_link_adaptation', stage_evaluate_link_adaptation, False),
+          ('utilities_wiener_coeff_bank', stage_wiener_coeff_bank, False),
+          ('utilities_wiener_predict', stage_wiener_predict, False),
+          ('utilities_stack_features', stage_stack_features, False)]
+
+'''Time one stage: the best of nrof_repeats runs, each after reseeding. itpp-only stages are skipped without py-itpp.'''
+def run_stage(stage, nrof_frames, nrof_repeats, itpp_only=False):
+    if itpp_only and not _itpp_available():
+        return {'skipped': 'itpp-only stage, py-itpp is not installed'}
+
+    try:
+        seed_generators()
+        run, nrof_stage_frames, nrof_blocks = stage(nrof_frames)
+    except ImportError as error:
+        return {'skipped': str(error)}
+
+    times = []
+    for _ in range(nrof_repeats):
+        seed_generators()
+
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    seconds = min(times)
+    result = {'seconds': seconds}
+    if nrof_stage_frames is not None:
+        result['frames_per_s'] = nrof_stage_frames / seconds
+    if nrof_blocks is not None:
+        result['blocks_per_s'] = nrof_blocks / seconds
+
+    return result
+
+def run_benchmarks(frames=(100, 1000), nrof_repeats=3, stage_names=None):
+    results = {}
+    for name, stage, itpp_only in STAGES:
+        if stage_names and name not in stage_names:
+            continue
+
+        for nrof_frames in frames:
+            key = '%s/%d' %(name, nrof_frames)
+            results[key] = run_stage(stage, nrof_frames, nrof_repeats, itpp_only)
+
+            print(_format_result(key, results[key]))
+            sys.stdout.flush()
+
+    return {'environment': _environment(),
+            'settings': {'frames': list(frames), 'repeat': nrof_repeats, 'seed': SEED},
+            'results': results}
+
+'''Compare against a baseline results file. The throughput ratio of a stage is the inverse ratio of its times.
+   Returns the stages whose throughput dropped by more than threshold, as (key, ratio) tuples.
+'''
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, result in results['results'].items():
+        baseline_result = baseline['results'].get(key)
+        if 'skipped' in result or baseline_result is None or 'skipped' in baseline_result:
+            continue
+
+        ratio = baseline_result['seconds'] / result['seconds']
+        print('%-45s %8.2fx baseline%s' %(key, ratio, '  REGRESSION' if ratio < 1.0 - threshold else ''))
+
+        if ratio < 1.0 - threshold:
+            regressions.append((key, ratio))
+
+    return regressions
+
+def _format_result(key, result):
+    if 'skipped' in result:
+        return '%-45s skipped (%s)' %(key, result['skipped'])
+
+    line = '%-45s %10.4fs' %(key, result['seconds'])
+    if 'frames_per_s' in result:
+        line += ', %12.1f frames/s' %(result['frames_per_s'])
+    if 'blocks_per_s' in result:
+        line += ', %12.1f blocks/s' %(result['blocks_per_s'])
+
+    return line
+
+def _itpp_available():
+    try:
+        import itpp
+    except ImportError:
+        return False
+
+    return True
+
+def _environment():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu': _cpu_model(),
+            'nrof_cpus': os.cpu_count(),
+            'itpp': _itpp_available()}
+
+'''CPU model name from /proc/cpuinfo where available, platform.processor() is often empty on Linux'''
+def _cpu_model():
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+
+    return platform.processor()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simulation chain and the utilities hot paths.')
+    parser.add_argument('--frames', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage, the best one is reported')
+    parser.add_argument('--stages', nargs='+', choices=[name for name, _, _ in STAGES], help='run only these stages')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative throughput drop against the baseline that counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.frames, args.repeat, args.stages)
+
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+        print('Saved results to %s' %(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('%d stage(s) regressed by more than %d%%' %(len(regressions), 100 * args.threshold))
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,10 @@
-import itpp
+import numpy as np
+
+try:
+    import itpp
+except ImportError:
+    # Only the itpp TDL_Channel generator needs py-itpp, channel_frequency_response_np runs without it
+    itpp = None
 
 def channel_frequency_response(fft_size,
                                relative_speed,
@@ -51,4 +57,97 @@ def channel_frequency_response(fft_size,
     freq_resp = itpp.cmat()
     channel.calc_frequency_response(channel_coeff, freq_resp, fft_size)
     
-    return freq_resp
\ No newline at end of file
+    return freq_resp
+
+'''Power delay profiles of ITU-R M.1225 as (relative delays in s, average powers in dB), as in itpp Channel_Specification'''
+POWER_DELAY_PROFILES = {'ITU_PEDESTRIAN_A': ([0.0, 110e-9, 190e-9, 410e-9],
+                                             [0.0, -9.7, -19.2, -22.8]),
+                        'ITU_PEDESTRIAN_B': ([0.0, 200e-9, 800e-9, 1200e-9, 2300e-9, 3700e-9],
+                                             [0.0, -0.9, -4.9, -8.0, -7.8, -23.9]),
+                        'ITU_VEHICULAR_A':  ([0.0, 310e-9, 710e-9, 1090e-9, 1730e-9, 2510e-9],
+                                             [0.0, -1.0, -9.0, -10.0, -15.0, -20.0]),
+                        'ITU_VEHICULAR_B':  ([0.0, 300e-9, 8900e-9, 12900e-9, 17100e-9, 20000e-9],
+                                             [-2.5, 0.0, -12.8, -10.0, -25.2, -16.0])}
+
+'''Upper bound on the size of the (realizations, frames, taps, sinusoids) phase array computed at a time'''
+_MAX_PHASE_ELEMENTS = 1 << 22
+
+'''Numpy counterpart of channel_frequency_response for many independent realizations at once.
+   The tap gains follow a sum-of-sinusoids (Jakes) model with the same normalized Doppler as the itpp channel, 
+   sampled at the start of every 1 ms subframe, and are generated for all (realizations x frames x taps) in one go.
+   The delay profile is discretized to the sampling interval like TDL_Channel does and normalized to unit power.
+   The frequency response is obtained with one precomputed DFT matrix multiply.
+   
+   Returns a complex array of shape (realizations, frames, subcarriers), i.e. realization r is 
+   channel_frequency_response(...).T().to_numpy_ndarray()[:, :nrof_subcarriers]. All fft_size bins are returned
+   when nrof_subcarriers is None. rng is a numpy Generator, or a seed for one.
+'''
+def channel_frequency_response_np(fft_size,
+                                  relative_speed,
+                                  channel_model,
+                                  nrof_subframes,
+                                  nrof_realizations=1,
+                                  nrof_subcarriers=None,
+                                  nrof_sinusoids=32,
+                                  rng=None):
+    
+    carrier_freq = 2.0e9 # 2 GHz
+    subcarrier_spacing = 15000 # Hz
+    
+    sampling_frequency = subcarrier_spacing * fft_size
+    sampling_interval = 1.0 / sampling_frequency
+
+    doppler_frequency = (carrier_freq / 3e8) * relative_speed
+    norm_doppler = doppler_frequency * sampling_interval
+
+    frame_duration = 1.0e-3 # 1 ms
+    frame_samples = int(frame_duration / sampling_interval)
+    
+    if channel_model not in POWER_DELAY_PROFILES:
+        raise ValueError('Specified channel model %s not configured in %s'%(channel_model, __file__))
+
+    rng = np.random.default_rng(rng)
+    
+    tap_delays, tap_powers = _discrete_delay_profile(channel_model, sampling_interval)
+    nrof_taps = tap_delays.size
+    
+    if nrof_subcarriers is None:
+        nrof_subcarriers = fft_size
+    
+    # DFT of the tap positions, (taps x subcarriers)
+    dft_matrix = np.exp(-2j * np.pi * np.outer(tap_delays, np.arange(nrof_subcarriers)) / fft_size)
+    
+    # Random arrival angles (stratified over the circle) and phases of every sinusoid
+    angle_offsets = rng.random((nrof_realizations, nrof_taps, nrof_sinusoids))
+    arrival_angles = 2 * np.pi * (np.arange(nrof_sinusoids) + angle_offsets) / nrof_sinusoids
+    phases = 2 * np.pi * rng.random((nrof_realizations, nrof_taps, nrof_sinusoids))
+    
+    angular_doppler = 2 * np.pi * norm_doppler * np.cos(arrival_angles)
+    frame_start_samples = frame_samples * np.arange(nrof_subframes)
+    tap_amplitudes = np.sqrt(tap_powers / nrof_sinusoids)
+    
+    freq_resp = np.empty((nrof_realizations, nrof_subframes, nrof_subcarriers), dtype=np.complex128)
+    
+    realizations_per_chunk = max(1, int(_MAX_PHASE_ELEMENTS / (nrof_subframes * nrof_taps * nrof_sinusoids)))
+    for start in range(0, nrof_realizations, realizations_per_chunk):
+        stop = min(start + realizations_per_chunk, nrof_realizations)
+        
+        # (realizations, frames, taps, sinusoids)
+        phase = frame_start_samples[np.newaxis, :, np.newaxis, np.newaxis] * angular_doppler[start:stop, np.newaxis] + phases[start:stop, np.newaxis]
+        
+        channel_coeff = tap_amplitudes * np.sum(np.exp(1j * phase), axis=-1)
+        
+        freq_resp[start:stop] = np.matmul(channel_coeff, dft_matrix)
+    
+    return freq_resp
+
+'''Tap delays in samples and normalized linear tap powers, with taps falling on the same sample merged'''
+def _discrete_delay_profile(channel_model, sampling_interval):
+    delays, powers_db = POWER_DELAY_PROFILES[channel_model]
+    
+    sample_delays = np.round(np.array(delays) / sampling_interval).astype(np.int64)
+    tap_delays, tap_indices = np.unique(sample_delays, return_inverse=True)
+    
+    tap_powers = np.bincount(tap_indices, weights=10 ** (0.1 * np.array(powers_db)))
+    
+    return (tap_delays, tap_powers / np.sum(tap_powers))
@@ -0,0 +1,453 @@
+'''Effective-SNR link abstraction (EESM / MIESM) of the simulation chain, for fast block success generation.
+
+   The per-subcarrier SNRs snr * |h_k|^2 of a frame are compressed into one effective SNR per MCS,
+       EESM   snr_eff = -beta * ln(mean_k exp(-snr_k / beta))
+       MIESM  snr_eff = beta * I^-1(mean_k I(snr_k / beta))
+   with I the mutual information of the constellation of the MCS over AWGN. The block error probability is then
+   read from the AWGN BLER curve of the MCS at the effective SNR. The AWGN curves and one beta per MCS are
+   calibrated once against the full simulator (single_link_bicm_ofdm.simulate_all_mcs), after which block success
+   of whole datasets is drawn without encoding or decoding a single block. Only the calibration runs the
+   simulator and needs py-itpp; loading an abstraction and drawing block success with it do not.
+
+   The simulator applies the channel to the OFDM samples after the IFFT, so after equalization every symbol of an
+   OFDM symbol sees the harmonic mean of the subcarrier SNRs (see single_link_bicm_ofdm._unit_noise_variance). The
+   mappings weight the weak subcarriers accordingly, which shows as betas below 1.
+
+   Usage, from the radio_data directory, to calibrate on held-out channel realizations and print the validation
+   report against the full simulator:
+       python -m src.abstraction calibrate --method eesm --snrs-db 0 5 10 15 20 abstraction/eesm.npz
+   and then to generate a dataset with the abstraction instead of the simulator:
+       python -m src.generate --abstraction abstraction/eesm.npz --snrs-db 5 --nrof-samples 1000000 dataset
+
+   Drawn block success shares one uniform random number per frame over the MCSs, so within a frame an MCS with
+   a higher success probability never fails while one with a lower probability succeeds, as in the simulator
+   where all MCSs of a frame see the same channel.
+'''
+import argparse
+import functools
+import logging
+
+import numpy as np
+
+from . import codec, dataset
+
+
+METHODS = ('eesm', 'miesm')
+
+'''Smallest BLER of the AWGN curves, the curves are interpolated in log10(BLER)'''
+BLER_FLOOR = 1e-4
+
+DEFAULT_AWGN_SNRS_DB = np.arange(-10.0, 30.5, 0.5)
+
+'''Candidate beta values of the calibration'''
+DEFAULT_BETAS = np.logspace(-2, 2, 81)
+
+'''SNR grid of the mutual information tables and the Gauss-Hermite order per noise dimension'''
+_MI_SNRS_DB = np.arange(-20.0, 40.25, 0.25)
+_GAUSS_HERMITE_ORDER = 12
+
+'''Frames per simulate_all_mcs call of the calibration'''
+_SIMULATION_CHUNK_SIZE = 1000
+
+'''Upper bound on the number of per-subcarrier SNRs processed at once by generate_block_success'''
+_MAX_CHUNK_ELEMENTS = 1 << 22
+
+class LinkAbstraction(object):
+    '''Effective-SNR abstraction of the simulator for an MCS table of (transport block size, modulation order)
+       pairs, with one beta per MCS and the AWGN BLER curves awgn_bler (MCSs, SNRs) over awgn_snrs_db.
+
+       Channels are given with the subcarriers on the last axis and the SNR in dB broadcast against the other
+       axes; results have the MCSs on the last axis.
+    '''
+    def __init__(self, method, mcs_table, betas, awgn_snrs_db, awgn_bler):
+        _check_method(method)
+
+        self.method = method
+        self.mcs_table = [(int(block_size), int(modorder)) for block_size, modorder in mcs_table]
+        self.betas = np.asarray(betas, dtype=np.float64)
+        self.awgn_snrs_db = np.asarray(awgn_snrs_db, dtype=np.float64)
+        self.awgn_bler = np.asarray(awgn_bler, dtype=np.float64)
+
+        self._log_awgn_bler = _log_bler(self.awgn_bler)
+
+        # MCSs with the same beta (and for MIESM the same constellation) share their effective SNR
+        self._mappings = {}
+        for mcs_index, (beta, (_, modorder)) in enumerate(zip(self.betas, self.mcs_table)):
+            self._mappings.setdefault((beta, modorder if method == 'miesm' else None), []).append(mcs_index)
+
+    '''Effective SNRs in dB (..., MCSs) of linear per-subcarrier SNRs (..., subcarriers)'''
+    def effective_snr_db(self, snrs):
+        effective_snrs_db = np.empty(snrs.shape[:-1] + (len(self.mcs_table),))
+        for (beta, modorder), mcs_indices in self._mappings.items():
+            effective_snrs_db[..., mcs_indices] = _to_db(effective_snr(snrs, beta, self.method, modorder))[..., np.newaxis]
+
+        return effective_snrs_db
+
+    '''Block success probability (..., MCSs) of channels (..., subcarriers) at snr_db'''
+    def block_success_probability(self, channel, snr_db):
+        effective_snrs_db = self.effective_snr_db(subcarrier_snrs(channel, snr_db))
+
+        probability = np.empty_like(effective_snrs_db)
+        for mcs_index in range(len(self.mcs_table)):
+            probability[..., mcs_index] = 1.0 - _awgn_block_error_rate(effective_snrs_db[..., mcs_index],
+                                                                       self.awgn_snrs_db,
+                                                                       self._log_awgn_bler[mcs_index])
+
+        return probability
+
+    '''Block success (..., MCSs) as uint8 drawn with the numpy Generator rng, one uniform number per channel'''
+    def block_success(self, channel, snr_db, rng):
+        probability = self.block_success_probability(channel, snr_db)
+
+        return (rng.random(probability.shape[:-1])[..., np.newaxis] < probability).astype(np.uint8)
+
+    '''Block success in the dataset layout (frames, MCSs, columns) for channel_coeff (frames, subcarriers, columns)
+       and the SNR in dB of every column, processed in chunks of frames. Chunking does not change the result.
+    '''
+    def generate_block_success(self, channel_coeff, column_snrs_db, rng):
+        nrof_frames, nrof_subcarriers, nrof_columns = channel_coeff.shape
+        column_snrs_db = np.asarray(column_snrs_db, dtype=np.float64)
+
+        block_success = np.empty((nrof_frames, len(self.mcs_table), nrof_columns), dtype=np.uint8)
+
+        chunk_size = max(1, int(_MAX_CHUNK_ELEMENTS / (nrof_subcarriers * nrof_columns)))
+        for start in range(0, nrof_frames, chunk_size):
+            channel = np.transpose(channel_coeff[start:start + chunk_size], (0, 2, 1))
+
+            block_success[start:start + chunk_size] = np.transpose(self.block_success(channel, column_snrs_db, rng), (0, 2, 1))
+
+        return block_success
+
+'''Linear per-subcarrier SNRs (..., subcarriers) of channels (..., subcarriers) at snr_db'''
+def subcarrier_snrs(channel, snr_db):
+    return np.abs(channel) ** 2 * np.expand_dims(np.power(10.0, 0.1 * np.asarray(snr_db, dtype=np.float64)), -1)
+
+'''Linear effective SNR (...) of linear per-subcarrier SNRs (..., subcarriers)'''
+def effective_snr(snrs, beta, method='eesm', modulation_order=None):
+    if method == 'eesm':
+        return eesm(snrs, beta)
+    if method == 'miesm':
+        return miesm(snrs, beta, modulation_order)
+
+    _check_method(method)
+
+'''Exponential effective SNR mapping, evaluated relative to the weakest subcarrier so that exp never underflows'''
+def eesm(snrs, beta):
+    scaled_snrs = snrs / beta
+    scaled_snrs_min = np.min(scaled_snrs, axis=-1)
+
+    return beta * (scaled_snrs_min - np.log(np.mean(np.exp(scaled_snrs_min[..., np.newaxis] - scaled_snrs), axis=-1)))
+
+'''Mutual information effective SNR mapping with the constellation of the modulation order'''
+def miesm(snrs, beta, modulation_order):
+    table_snrs_db, table_mutual_information = mutual_information_table(modulation_order)
+
+    mutual_information = np.interp(_to_db(snrs / beta), table_snrs_db, table_mutual_information)
+
+    return beta * np.power(10.0, 0.1 * np.interp(np.mean(mutual_information, axis=-1), table_mutual_information, table_snrs_db))
+
+'''Mutual information in bits per symbol of the constellation of the modulation order over AWGN, as
+   (SNRs in dB, mutual information) on _MI_SNRS_DB. The expectation over the noise is taken by Gauss-Hermite
+   quadrature. The table is made strictly increasing so that it can be inverted by interpolation.
+'''
+@functools.lru_cache(maxsize=None)
+def mutual_information_table(modulation_order):
+    points = _qam_points(modulation_order)
+    nrof_points = points.size
+
+    # Unit variance complex noise: real and imaginary parts are N(0, 1/2), i.e. weight exp(-t^2) / sqrt(pi) each
+    nodes, weights = np.polynomial.hermite.hermgauss(_GAUSS_HERMITE_ORDER)
+    noise = np.reshape(nodes[:, np.newaxis] + 1j * nodes[np.newaxis, :], -1)
+    noise_weights = np.reshape(weights[:, np.newaxis] * weights[np.newaxis, :], -1) / np.pi
+
+    differences = (points[:, np.newaxis] - points[np.newaxis, :])[:, :, np.newaxis]
+
+    mutual_information = np.empty(_MI_SNRS_DB.size)
+    for snr_index, snr_db in enumerate(_MI_SNRS_DB):
+        metrics = np.abs(noise) ** 2 - np.abs(np.sqrt(np.power(10.0, 0.1 * snr_db)) * differences + noise) ** 2
+
+        metrics_max = np.max(metrics, axis=1)
+        log_sum = metrics_max + np.log(np.sum(np.exp(metrics - metrics_max[:, np.newaxis, :]), axis=1))
+
+        mutual_information[snr_index] = np.log2(nrof_points) - np.sum(noise_weights * log_sum) / (nrof_points * np.log(2))
+
+    mutual_information = np.maximum.accumulate(mutual_information) + 1e-9 * np.arange(_MI_SNRS_DB.size)
+
+    return (_MI_SNRS_DB, mutual_information)
+
+'''Points of the square QAM constellation of the modulation order with unit average energy, the points of the itpp
+   QAM of modem.py. The mutual information does not depend on the bit labels, so they are not needed.
+'''
+def _qam_points(modulation_order):
+    nrof_levels = int(round(np.sqrt(2 ** modulation_order)))
+    levels = 2.0 * np.arange(nrof_levels) - (nrof_levels - 1)
+
+    points = np.reshape(levels[:, np.newaxis] + 1j * levels[np.newaxis, :], -1)
+
+    return points / np.sqrt(np.mean(np.abs(points) ** 2))
+
+'''Block success of the full simulator (frames, MCSs, SNRs) for block fading channels (frames, subcarriers) at every
+   SNR of snrs_db. The frames are simulated in chunks, each seeded from seed (an int or a sequence of ints) and the
+   chunk index as the work units of generate.py.
+'''
+def simulate_block_success(channel, snrs_db, mcs_table, seed=0, codec_backend='itpp'):
+    # The simulator needs py-itpp, which the rest of this module does not
+    from . import single_link_bicm_ofdm
+
+    nrof_frames = channel.shape[0]
+    snrs_db = np.asarray(snrs_db, dtype=np.float64)
+
+    block_success = np.empty((nrof_frames, len(mcs_table), snrs_db.size), dtype=np.uint8)
+    for chunk_index, start in enumerate(range(0, nrof_frames, _SIMULATION_CHUNK_SIZE)):
+        _seed_simulation(list(np.atleast_1d(seed)) + [chunk_index])
+
+        channel_block_fading = np.tile(np.transpose(channel[start:start + _SIMULATION_CHUNK_SIZE]),
+                                       (single_link_bicm_ofdm.NROF_SUBFRAME_OFDM_SYMBOLS, 1))
+
+        _, block_success[start:start + _SIMULATION_CHUNK_SIZE] = single_link_bicm_ofdm.simulate_all_mcs(channel_block_fading,
+                                                                                                         snrs_db,
+                                                                                                         mcs_table,
+                                                                                                         codec_backend=codec_backend)
+
+    return block_success
+
+'''AWGN BLER curves (MCSs, SNRs) of the full simulator over snrs_db'''
+def calibrate_awgn_curves(mcs_table, snrs_db=DEFAULT_AWGN_SNRS_DB, nrof_frames=500, nrof_subcarriers=72, seed=0, codec_backend='itpp'):
+    block_success = simulate_block_success(np.ones((nrof_frames, nrof_subcarriers), dtype=np.complex128),
+                                           snrs_db,
+                                           mcs_table,
+                                           seed,
+                                           codec_backend)
+
+    return 1.0 - np.mean(block_success, axis=0)
+
+'''Beta per MCS that maximizes the likelihood of the simulated block success (..., MCSs) given the linear
+   per-subcarrier SNRs (..., subcarriers), searched over the candidate betas.
+'''
+def fit_betas(snrs, block_success, mcs_table, awgn_snrs_db, awgn_bler, method='eesm', betas=DEFAULT_BETAS):
+    _check_method(method)
+
+    log_awgn_bler = _log_bler(np.asarray(awgn_bler, dtype=np.float64))
+    sample_axes = tuple(range(1, snrs.ndim))
+
+    groups = {}
+    for mcs_index, (_, modorder) in enumerate(mcs_table):
+        groups.setdefault(modorder if method == 'miesm' else None, []).append(mcs_index)
+
+    fitted_betas = np.empty(len(mcs_table))
+    for modorder, mcs_indices in groups.items():
+        effective_snrs_db = np.stack([_to_db(effective_snr(snrs, beta, method, modorder)) for beta in betas])
+
+        for mcs_index in mcs_indices:
+            error_probability = _awgn_block_error_rate(effective_snrs_db, awgn_snrs_db, log_awgn_bler[mcs_index])
+            likelihood = np.where(block_success[..., mcs_index], 1.0 - error_probability, error_probability)
+
+            log_likelihood = np.sum(np.log(np.clip(likelihood, 1e-12, 1.0)), axis=sample_axes)
+            fitted_betas[mcs_index] = betas[np.argmax(log_likelihood)]
+
+    return fitted_betas
+
+'''Calibrate an abstraction of the full simulator for the MCS table: the AWGN BLER curves over awgn_snrs_db, and
+   the betas from the block success of the block fading channels (frames, subcarriers) at every SNR of snrs_db.
+'''
+def calibrate(mcs_table,
+              channel,
+              snrs_db,
+              method='eesm',
+              awgn_snrs_db=DEFAULT_AWGN_SNRS_DB,
+              nrof_awgn_frames=500,
+              betas=DEFAULT_BETAS,
+              seed=0,
+              codec_backend='itpp'):
+
+    awgn_bler = calibrate_awgn_curves(mcs_table, awgn_snrs_db, nrof_awgn_frames, channel.shape[-1], [seed, 0], codec_backend)
+    logging.info('Calibrated the AWGN curves of %d MCSs at %d SNRs' %(len(mcs_table), len(awgn_snrs_db)))
+
+    snrs_db = np.asarray(snrs_db, dtype=np.float64)
+    block_success = simulate_block_success(channel, snrs_db, mcs_table, [seed, 1], codec_backend)
+    logging.info('Simulated %d frames at %d SNRs' %(channel.shape[0], snrs_db.size))
+
+    fitted_betas = fit_betas(subcarrier_snrs(channel[:, np.newaxis, :], snrs_db),
+                             np.transpose(block_success, (0, 2, 1)),
+                             mcs_table,
+                             awgn_snrs_db,
+                             awgn_bler,
+                             method,
+                             betas)
+
+    return LinkAbstraction(method, mcs_table, fitted_betas, awgn_snrs_db, awgn_bler)
+
+'''Compare the abstraction with block success (..., MCSs) of the full simulator for channels (..., subcarriers)
+   at snr_db. Returns the simulated and predicted BLER (MCSs, SNRs) per distinct SNR, and the Brier score, the
+   mean squared difference between predicted success probability and simulated success, per MCS.
+'''
+def validate(abstraction, channel, snr_db, block_success):
+    probability = abstraction.block_success_probability(channel, snr_db)
+
+    snr_db = np.broadcast_to(snr_db, probability.shape[:-1])
+    snrs_db = np.unique(snr_db)
+
+    simulated_bler = np.empty((len(abstraction.mcs_table), snrs_db.size))
+    predicted_bler = np.empty((len(abstraction.mcs_table), snrs_db.size))
+    for snr_index, snr in enumerate(snrs_db):
+        samples = snr_db == snr
+        simulated_bler[:, snr_index] = 1.0 - np.mean(block_success[samples], axis=0)
+        predicted_bler[:, snr_index] = 1.0 - np.mean(probability[samples], axis=0)
+
+    brier_score = np.mean(np.reshape((probability - block_success) ** 2, (-1, len(abstraction.mcs_table))), axis=0)
+
+    return {'snrs_db': snrs_db,
+            'simulated_bler': simulated_bler,
+            'predicted_bler': predicted_bler,
+            'brier_score': brier_score,
+            'nrof_samples': int(snr_db.size)}
+
+'''Validation report as a table: per MCS its beta, the mean simulated and predicted BLER over the SNRs, the largest
+   BLER difference at any SNR and the Brier score
+'''
+def validation_table(abstraction, report):
+    lines = ['%d samples at SNRs %s dB, method %s' %(report['nrof_samples'],
+                                                     ' '.join('%g' %(snr) for snr in report['snrs_db']),
+                                                     abstraction.method),
+             '%4s %6s %6s %8s %10s %10s %12s %8s' %('mcs', 'tbs', 'order', 'beta', 'sim BLER', 'pred BLER', 'max |dBLER|', 'Brier')]
+
+    bler_differences = np.abs(report['predicted_bler'] - report['simulated_bler'])
+    for mcs_index, (block_size, modorder) in enumerate(abstraction.mcs_table):
+        lines.append('%4d %6d %6d %8.3f %10.4f %10.4f %12.4f %8.4f' %(mcs_index,
+                                                                     block_size,
+                                                                     modorder,
+                                                                     abstraction.betas[mcs_index],
+                                                                     np.mean(report['simulated_bler'][mcs_index]),
+                                                                     np.mean(report['predicted_bler'][mcs_index]),
+                                                                     np.max(bler_differences[mcs_index]),
+                                                                     report['brier_score'][mcs_index]))
+
+    lines.append('overall max |dBLER| %0.4f, mean Brier score %0.4f' %(np.max(bler_differences), np.mean(report['brier_score'])))
+
+    return '\n'.join(lines)
+
+def save_abstraction(path, abstraction):
+    np.savez(path,
+             method=abstraction.method,
+             mcs_table=np.array(abstraction.mcs_table),
+             betas=abstraction.betas,
+             awgn_snrs_db=abstraction.awgn_snrs_db,
+             awgn_bler=abstraction.awgn_bler)
+
+def load_abstraction(path):
+    with np.load(path) as arrays:
+        return LinkAbstraction(str(arrays['method']),
+                               arrays['mcs_table'].tolist(),
+                               arrays['betas'],
+                               arrays['awgn_snrs_db'],
+                               arrays['awgn_bler'])
+
+'''Monotone non-increasing log10 BLER curves, floored at BLER_FLOOR'''
+def _log_bler(bler):
+    return np.log10(np.maximum(np.minimum.accumulate(bler, axis=-1), BLER_FLOOR))
+
+def _awgn_block_error_rate(effective_snrs_db, awgn_snrs_db, log_awgn_bler):
+    return np.power(10.0, np.interp(effective_snrs_db, awgn_snrs_db, log_awgn_bler))
+
+def _to_db(snrs):
+    with np.errstate(divide='ignore'):
+        return 10.0 * np.log10(snrs)
+
+def _seed_simulation(key):
+    import itpp
+
+    itpp_seed, numpy_seed = np.random.SeedSequence(key).generate_state(2)
+
+    itpp.random.RNG_reset(int(itpp_seed))
+    np.random.seed(int(numpy_seed))
+
+def _check_method(method):
+    if method not in METHODS:
+        raise ValueError('Unknown effective SNR mapping: ' + str(method))
+
+def main(argv=None):
+    from . import generate
+
+    parser = argparse.ArgumentParser(description='Effective-SNR link abstraction tools.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    calibrate_parser = subparsers.add_parser('calibrate', help='calibrate an abstraction and validate it on held-out channels')
+    calibrate_parser.add_argument('output', help='.npz file to write the abstraction to')
+    calibrate_parser.add_argument('--method', default='eesm', choices=list(METHODS))
+    calibrate_parser.add_argument('--channel-model', default='ITU_VEHICULAR_B',
+                                  choices=['ITU_PEDESTRIAN_A', 'ITU_PEDESTRIAN_B', 'ITU_VEHICULAR_A', 'ITU_VEHICULAR_B'])
+    calibrate_parser.add_argument('--relative-speed', type=float, default=33.33, help='relative speed in m/s')
+    calibrate_parser.add_argument('--snrs-db', type=float, nargs='+', default=[0, 5, 10, 15, 20])
+    calibrate_parser.add_argument('--nrof-samples', type=int, default=250, help='frames per channel realization')
+    calibrate_parser.add_argument('--nrof-realizations', type=int, default=8, help='channel realizations for calibration')
+    calibrate_parser.add_argument('--nrof-validation-realizations', type=int, default=2, help='held-out channel realizations')
+    calibrate_parser.add_argument('--nrof-awgn-frames', type=int, default=500)
+    calibrate_parser.add_argument('--seed', type=int, default=0)
+    calibrate_parser.add_argument('--channel-generator', default='numpy', choices=['itpp', 'numpy'])
+    codec.add_backend_arguments(calibrate_parser)
+
+    validate_parser = subparsers.add_parser('validate', help='validate an abstraction against a dataset of the full simulator')
+    validate_parser.add_argument('abstraction')
+    validate_parser.add_argument('dataset')
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.command == 'calibrate':
+        codec_backend = codec.backend_argument(calibrate_parser, args)
+
+        mcs_table = [(block_size + generate.CRC_SIZE, modorder)
+                     for block_size, modorder in zip(generate.TRANSPORT_BLOCK_SIZES, generate.MODULATION_ORDERS)]
+
+        nrof_realizations = args.nrof_realizations + args.nrof_validation_realizations
+        channel_coeff = generate.generate_channels(args.channel_model,
+                                                   args.relative_speed,
+                                                   args.nrof_samples,
+                                                   nrof_realizations,
+                                                   seed=args.seed,
+                                                   channel_generator=args.channel_generator)
+
+        # (frames, subcarriers) of all realizations, the last ones held out for validation
+        channel = np.reshape(np.transpose(channel_coeff, (2, 0, 1)), (-1, channel_coeff.shape[1]))
+        nrof_calibration_frames = args.nrof_realizations * args.nrof_samples
+
+        abstraction = calibrate(mcs_table,
+                                channel[:nrof_calibration_frames],
+                                args.snrs_db,
+                                method=args.method,
+                                nrof_awgn_frames=args.nrof_awgn_frames,
+                                seed=args.seed,
+                                codec_backend=codec_backend)
+        save_abstraction(args.output, abstraction)
+        print('Saved abstraction to %s' %(args.output))
+
+        validation_channel = channel[nrof_calibration_frames:]
+        block_success = simulate_block_success(validation_channel, args.snrs_db, mcs_table, [args.seed, 2], codec_backend)
+
+        report = validate(abstraction,
+                          validation_channel[:, np.newaxis, :],
+                          np.asarray(args.snrs_db, dtype=np.float64),
+                          np.transpose(block_success, (0, 2, 1)))
+        print(validation_table(abstraction, report))
+    elif args.command == 'validate':
+        abstraction = load_abstraction(args.abstraction)
+        validation_dataset = dataset.load_dataset(args.dataset)
+        if len(validation_dataset['block_sizes']) != len(abstraction.mcs_table):
+            raise ValueError('The dataset has %d MCSs, the abstraction %d' %(len(validation_dataset['block_sizes']), len(abstraction.mcs_table)))
+
+        channel_coeff = np.asarray(validation_dataset['channel'])
+        nrof_columns = channel_coeff.shape[2]
+        snrs_db = np.asarray(validation_dataset['snrs_db'], dtype=np.float64)
+        column_snrs_db = np.repeat(snrs_db, nrof_columns // snrs_db.size)
+
+        report = validate(abstraction,
+                          np.transpose(channel_coeff, (0, 2, 1)),
+                          column_snrs_db,
+                          np.transpose(np.asarray(validation_dataset['block_success']), (0, 2, 1)))
+        print(validation_table(abstraction, report))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+'''BLER-vs-SNR curves by adaptive Monte Carlo simulation with sequential stopping.
+
+   Instead of a fixed number of samples per SNR, every point of a curve is simulated in batches until its BLER is
+   known to the requested precision: the Wilson confidence interval is narrower than a fraction of the BLER (or
+   than an absolute width), a number of block errors has been counted, or the point is known to lie below the BLER
+   floor of interest. Points with a BLER close to 1 stop after the first batch, points in the waterfall region get
+   the samples their precision needs, and as BLER does not increase with the SNR, every point above one that is
+   below the floor stops as well. The points above the lowest point without errors therefore wait until that point
+   is settled, so only one point of the error-free tail is simulated at a time. Each batch runs the vector-SNR single_link_bicm_ofdm.simulate once for all
+   points that are still active, sharing the transmitter chain.
+
+   Usage, from the radio_data directory:
+       python -m src.bler_curve --channel-model AWGN --snrs-db -4 -3 -2 -1 0 1 2 --relative-precision 0.1 curves.json
+'''
+import argparse
+import json
+import logging
+import statistics
+
+import numpy as np
+
+import itpp
+
+from . import TDL_channel, single_link_bicm_ofdm
+
+
+'''Why a point stopped'''
+STOP_PRECISION = 'precision'
+STOP_ERRORS = 'errors'
+STOP_FLOOR = 'below_floor'
+STOP_MONOTONE = 'monotone'
+STOP_BUDGET = 'max_blocks'
+
+class FadingChannelSource(object):
+    '''Draws nrof_frames independent block fading frames (frames, subcarriers) of a TDL channel model per call'''
+    def __init__(self, channel_model, relative_speed=33.33, nrof_subcarriers=72, fft_size=128, seed=0):
+        self.channel_model = channel_model
+        self.relative_speed = relative_speed
+        self.nrof_subcarriers = nrof_subcarriers
+        self.fft_size = fft_size
+        self.rng = np.random.default_rng(np.random.SeedSequence(seed))
+
+    def __call__(self, nrof_frames):
+        return TDL_channel.channel_frequency_response_np(self.fft_size,
+                                                         self.relative_speed,
+                                                         self.channel_model,
+                                                         1,
+                                                         nrof_realizations=nrof_frames,
+                                                         nrof_subcarriers=self.nrof_subcarriers,
+                                                         rng=self.rng)[:, 0, :]
+
+'''AWGN channel source'''
+def awgn_channel_source(nrof_subcarriers=72):
+    return lambda nrof_frames: np.ones((nrof_frames, nrof_subcarriers), dtype=np.complex128)
+
+'''Wilson score interval (lower, upper) of a binomial proportion with errors out of blocks, element-wise'''
+def wilson_interval(nrof_errors, nrof_blocks, confidence=0.95):
+    z = statistics.NormalDist().inv_cdf(0.5 + 0.5 * confidence)
+
+    nrof_errors = np.asarray(nrof_errors, dtype=np.float64)
+    nrof_blocks = np.maximum(np.asarray(nrof_blocks, dtype=np.float64), 1.0)
+    estimate = nrof_errors / nrof_blocks
+
+    denominator = 1.0 + z * z / nrof_blocks
+    center = (estimate + z * z / (2.0 * nrof_blocks)) / denominator
+    half_width = z / denominator * np.sqrt(estimate * (1.0 - estimate) / nrof_blocks + z * z / (4.0 * nrof_blocks * nrof_blocks))
+
+    return (np.where(nrof_errors > 0, np.maximum(center - half_width, 0.0), 0.0), np.minimum(center + half_width, 1.0))
+
+'''Estimate the BLER curve of one MCS over snrs_db (increasing) with sequential stopping.
+
+   channel_source(nrof_frames) returns (frames, subcarriers) block fading channels, AWGN by default. A point stops
+   when the half width of its Wilson interval at the given confidence is at most relative_precision times its
+   BLER estimate or at most absolute_precision, when it has nrof_target_errors block errors, when the upper end of
+   its interval is below bler_floor, or after max_blocks blocks. Once a point without errors stops, all points at
+   higher SNRs stop as well.
+   None disables a criterion.
+
+   Every round simulates the same number of frames for all active points: the smallest number any of them is
+   projected to still need for its precision, within [batch_size, max_batch_size]. Round r is seeded from
+   (seed, r), as the work units of generate.py.
+
+   Returns a dict with per point the BLER estimate, the interval, the number of blocks and errors and the stop
+   reason, and the total number of simulated blocks. The interval of a point stopped by monotonicity has the upper
+   end of the settled point without errors under it.
+'''
+def estimate_bler_curve(transport_block_size,
+                        modorder,
+                        snrs_db,
+                        channel_source=None,
+                        relative_precision=0.1,
+                        absolute_precision=None,
+                        nrof_target_errors=None,
+                        bler_floor=1e-3,
+                        confidence=0.95,
+                        batch_size=50,
+                        max_batch_size=2000,
+                        max_blocks=100000,
+                        seed=0,
+                        common_random_numbers=False,
+                        codec_backend='itpp'):
+
+    snrs_db = np.asarray(snrs_db, dtype=np.float64)
+    if np.any(np.diff(snrs_db) <= 0):
+        raise ValueError('The SNRs of a BLER curve have to be increasing')
+
+    if channel_source is None:
+        channel_source = awgn_channel_source()
+
+    nrof_points = snrs_db.size
+    nrof_blocks = np.zeros(nrof_points, dtype=np.int64)
+    nrof_errors = np.zeros(nrof_points, dtype=np.int64)
+    stop_reasons = [None] * nrof_points
+
+    round_index = 0
+    while any(stop_reason is None for stop_reason in stop_reasons):
+        active = np.array([stop_reason is None for stop_reason in stop_reasons])
+
+        error_free = np.flatnonzero(active & (nrof_errors == 0) & (nrof_blocks > 0))
+        if error_free.size > 0:
+            active[error_free[0] + 1:] = False
+
+        nrof_frames = _next_batch_size(nrof_errors[active], nrof_blocks[active], relative_precision, bler_floor, confidence,
+                                       batch_size, max_batch_size, max_blocks)
+
+        _seed_round(seed, round_index)
+        channel = channel_source(nrof_frames)
+        channel_block_fading = np.tile(np.transpose(channel), (single_link_bicm_ofdm.NROF_SUBFRAME_OFDM_SYMBOLS, 1))
+
+        _, block_success = single_link_bicm_ofdm.simulate(transport_block_size,
+                                                          modorder,
+                                                          channel.shape[1],
+                                                          snrs_db[active],
+                                                          channel_block_fading,
+                                                          common_random_numbers=common_random_numbers,
+                                                          codec_backend=codec_backend)
+
+        nrof_blocks[active] += block_success.shape[0]
+        nrof_errors[active] += np.count_nonzero(block_success == 0, axis=0)
+
+        lower, upper = wilson_interval(nrof_errors, nrof_blocks, confidence)
+        half_width = 0.5 * (upper - lower)
+        bler = nrof_errors / np.maximum(nrof_blocks, 1)
+
+        for point_index in np.flatnonzero(active):
+            if relative_precision is not None and nrof_errors[point_index] > 0 and half_width[point_index] <= relative_precision * bler[point_index]:
+                stop_reasons[point_index] = STOP_PRECISION
+            elif absolute_precision is not None and half_width[point_index] <= absolute_precision:
+                stop_reasons[point_index] = STOP_PRECISION
+            elif nrof_target_errors is not None and nrof_errors[point_index] >= nrof_target_errors:
+                stop_reasons[point_index] = STOP_ERRORS
+            elif bler_floor is not None and upper[point_index] < bler_floor:
+                stop_reasons[point_index] = STOP_FLOOR
+            elif max_blocks is not None and nrof_blocks[point_index] >= max_blocks:
+                stop_reasons[point_index] = STOP_BUDGET
+
+        # BLER does not increase with the SNR: everything above a settled point without errors is bounded by it
+        settled_error_free = [point_index for point_index in range(nrof_points)
+                              if stop_reasons[point_index] in (STOP_FLOOR, STOP_BUDGET) and nrof_errors[point_index] == 0]
+        if settled_error_free:
+            for point_index in range(settled_error_free[0] + 1, nrof_points):
+                if stop_reasons[point_index] is None:
+                    stop_reasons[point_index] = STOP_MONOTONE
+
+        logging.info('TBS %d round %d: %d frames at %d SNRs' %(transport_block_size, round_index, nrof_frames, np.count_nonzero(active)))
+        round_index += 1
+
+    lower, upper = wilson_interval(nrof_errors, nrof_blocks, confidence)
+
+    # A point stopped by monotonicity is bounded by the settled point under it
+    monotone = np.array([stop_reason == STOP_MONOTONE for stop_reason in stop_reasons])
+    upper = np.where(monotone, np.minimum.accumulate(upper), upper)
+
+    return {'transport_block_size': transport_block_size,
+            'modorder': modorder,
+            'snrs_db': snrs_db,
+            'bler': nrof_errors / np.maximum(nrof_blocks, 1),
+            'ci_lower': lower,
+            'ci_upper': upper,
+            'confidence': confidence,
+            'nrof_blocks': nrof_blocks,
+            'nrof_errors': nrof_errors,
+            'stop_reasons': stop_reasons,
+            'total_blocks': int(np.sum(nrof_blocks))}
+
+'''Estimate the BLER curves of all MCSs of an MCS table of (transport block size, modulation order) pairs.
+   Keyword arguments are passed to estimate_bler_curve; MCS m is seeded from (seed, m).
+'''
+def estimate_bler_curves(mcs_table, snrs_db, seed=0, **kwargs):
+    return [estimate_bler_curve(transport_block_size, modorder, snrs_db, seed=[seed, mcs_index], **kwargs)
+            for mcs_index, (transport_block_size, modorder) in enumerate(mcs_table)]
+
+'''Table of the curves: per point the BLER with its interval, the blocks spent and the stop reason'''
+def curve_table(curves):
+    lines = ['%6s %6s %8s %10s %22s %9s %8s  %s' %('tbs', 'order', 'snr_db', 'bler', 'interval', 'blocks', 'errors', 'stop')]
+    for curve in curves:
+        for point_index, snr_db in enumerate(curve['snrs_db']):
+            lines.append('%6d %6d %8.2f %10.4g %10.4g .. %-8.4g %9d %8d  %s' %(curve['transport_block_size'],
+                                                                              curve['modorder'],
+                                                                              snr_db,
+                                                                              curve['bler'][point_index],
+                                                                              curve['ci_lower'][point_index],
+                                                                              curve['ci_upper'][point_index],
+                                                                              curve['nrof_blocks'][point_index],
+                                                                              curve['nrof_errors'][point_index],
+                                                                              curve['stop_reasons'][point_index]))
+
+    lines.append('total blocks %d' %(sum(curve['total_blocks'] for curve in curves)))
+
+    return '\n'.join(lines)
+
+'''JSON serializable copy of curves'''
+def curves_to_json(curves):
+    return [{key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in curve.items()} for curve in curves]
+
+'''Frames of the next round: the fewest blocks any active point is projected to still need, within
+   [batch_size, max_batch_size] and the remaining budget. A point with errors is projected to need the blocks for the
+   relative precision at its current BLER estimate, one without errors those for its interval to fall below the floor
+   (or, without a floor, max_batch_size more), and a point without blocks a first batch.
+'''
+def _next_batch_size(nrof_errors, nrof_blocks, relative_precision, bler_floor, confidence, batch_size, max_batch_size, max_blocks):
+    z = statistics.NormalDist().inv_cdf(0.5 + 0.5 * confidence)
+
+    projected_blocks = np.full(nrof_blocks.shape, np.inf)
+
+    with_errors = nrof_errors > 0
+    if relative_precision is not None:
+        bler = nrof_errors[with_errors] / nrof_blocks[with_errors]
+        projected_blocks[with_errors] = z * z * (1.0 - bler) / (bler * relative_precision * relative_precision)
+    if bler_floor is not None:
+        projected_blocks[~with_errors] = z * z * (1.0 / bler_floor - 1.0)
+    else:
+        projected_blocks[~with_errors] = nrof_blocks[~with_errors] + max_batch_size
+    projected_blocks[nrof_blocks == 0] = batch_size
+
+    needed = np.min(projected_blocks - nrof_blocks)
+    needed = int(needed) if np.isfinite(needed) else batch_size
+
+    nrof_frames = min(max(needed, batch_size), max_batch_size)
+    if max_blocks is not None:
+        nrof_frames = min(nrof_frames, int(max_blocks - np.min(nrof_blocks)))
+
+    return max(1, nrof_frames)
+
+def _seed_round(seed, round_index):
+    itpp_seed, numpy_seed = np.random.SeedSequence(list(np.atleast_1d(seed)) + [round_index]).generate_state(2)
+
+    itpp.random.RNG_reset(int(itpp_seed))
+    np.random.seed(int(numpy_seed))
+
+def main(argv=None):
+    from . import codec, generate
+
+    parser = argparse.ArgumentParser(description='Estimate BLER-vs-SNR curves with sequential stopping.')
+    parser.add_argument('output', help='JSON file to write the curves to')
+    parser.add_argument('--channel-model', default='AWGN',
+                        choices=['ITU_PEDESTRIAN_A', 'ITU_PEDESTRIAN_B', 'ITU_VEHICULAR_A', 'ITU_VEHICULAR_B', 'AWGN'])
+    parser.add_argument('--relative-speed', type=float, default=33.33, help='relative speed in m/s')
+    parser.add_argument('--snrs-db', type=float, nargs='+', default=list(range(-5, 21)))
+    parser.add_argument('--mcs', type=int, nargs='+', help='indices into the MCS table of generate.py, all by default')
+    parser.add_argument('--relative-precision', type=float, default=0.1, help='target CI half width relative to the BLER')
+    parser.add_argument('--absolute-precision', type=float, help='target CI half width')
+    parser.add_argument('--target-errors', type=int, help='stop a point after this many block errors')
+    parser.add_argument('--bler-floor', type=float, default=1e-3, help='stop points whose CI lies below this BLER')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--max-batch-size', type=int, default=2000)
+    parser.add_argument('--max-blocks', type=int, default=100000, help='block budget per point')
+    parser.add_argument('--seed', type=int, default=0)
+    codec.add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    codec_backend = codec.backend_argument(parser, args)
+
+    mcs_indices = args.mcs if args.mcs is not None else range(len(generate.TRANSPORT_BLOCK_SIZES))
+    mcs_table = [(generate.TRANSPORT_BLOCK_SIZES[mcs_index] + generate.CRC_SIZE, generate.MODULATION_ORDERS[mcs_index])
+                 for mcs_index in mcs_indices]
+
+    if args.channel_model == 'AWGN':
+        channel_source = awgn_channel_source()
+    else:
+        channel_source = FadingChannelSource(args.channel_model, args.relative_speed, seed=args.seed)
+
+    curves = estimate_bler_curves(mcs_table,
+                                  args.snrs_db,
+                                  seed=args.seed,
+                                  channel_source=channel_source,
+                                  relative_precision=args.relative_precision,
+                                  absolute_precision=args.absolute_precision,
+                                  nrof_target_errors=args.target_errors,
+                                  bler_floor=args.bler_floor,
+                                  confidence=args.confidence,
+                                  batch_size=args.batch_size,
+                                  max_batch_size=args.max_batch_size,
+                                  max_blocks=args.max_blocks,
+                                  codec_backend=codec_backend)
+
+    print(curve_table(curves))
+
+    with open(args.output, 'w') as curves_file:
+        json.dump(curves_to_json(curves), curves_file, indent=2)
+
+    print('Saved BLER curves to %s' %(args.output))
+
+if __name__ == '__main__':
+    main()
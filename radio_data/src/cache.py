@@ -0,0 +1,218 @@
+'''Persistent content-addressed cache of link simulation results.
+
+   An entry is the per-frame block success of one simulate call, keyed by the SHA-256 of everything the result
+   depends on: the arguments of the call, i.e. the channel as passed to simulate (its bytes), the SNR, the transport
+   block size, the modulation order and the codec backend, the seeds of the itpp and numpy generators, and the code
+   version, a hash of the sources of the simulation chain. How a caller derives these arguments, e.g. the column
+   layout and the seeds in generate.py, then enters the key through their values. Regenerating a dataset with overlapping configurations then only simulates the missing cells,
+   and any change to the simulation code invalidates all entries at once.
+
+   Entries are .npy files in a directory, sharded by the first two hex digits of the key and written through a
+   temporary file. The cache is bounded in size: when it grows beyond max_bytes the least recently used entries,
+   by modification time which a hit refreshes, are evicted.
+
+   Usage, from the radio_data directory:
+       python -m src.generate --cache sim_cache --snrs-db 5 --nrof-samples 1000 sim_data/sim_0001/dataset
+       python -m src.cache info sim_cache
+'''
+import argparse
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import itpp
+
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+'''Sources whose content defines the code version of cached results: every module whose code affects a simulate result'''
+_SIMULATION_SOURCES = ('codec.py',
+                       'conversion.py',
+                       'modem.py',
+                       'ofdm.py',
+                       'rate.py',
+                       'single_link_bicm_ofdm.py',
+                       'turbo.py')
+
+_ENTRY_SUFFIX = '.npy'
+
+class SimulationCache(object):
+    '''Size-bounded LRU cache of block success arrays in the directory path, with hit and miss counters'''
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.size = sum(entry_size for _, _, entry_size in self._entries())
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    '''Key of the block success of one simulate call. channel_digest is the channel_digest of the channel
+       realization and seeds are the itpp and numpy seeds the call runs with.
+    '''
+    def key(self, channel_digest, snr_db, block_size, modorder, seeds, codec_backend='itpp'):
+        description = {'channel': channel_digest,
+                       'snr_db': float(snr_db),
+                       'block_size': int(block_size),
+                       'modorder': int(modorder),
+                       'seeds': [int(seed) for seed in seeds],
+                       'codec_backend': codec_backend,
+                       'code_version': code_version()}
+
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    '''Cached block success of the key, or None'''
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            block_success = np.load(entry_path)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        # Refresh the modification time, which orders the eviction
+        os.utime(entry_path)
+        self.hits += 1
+
+        return block_success
+
+    def put(self, key, block_success):
+        entry_path = self._entry_path(key)
+        directory = os.path.dirname(entry_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        temporary_path = entry_path + '.tmp%d' %(os.getpid())
+        with open(temporary_path, 'wb') as entry_file:
+            np.save(entry_file, np.asarray(block_success, dtype=np.uint8))
+
+        replaced_size = os.path.getsize(entry_path) if os.path.exists(entry_path) else 0
+        os.replace(temporary_path, entry_path)
+
+        self.size += os.path.getsize(entry_path) - replaced_size
+        self.stores += 1
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    '''Remove the least recently used entries until the cache is within max_bytes'''
+    def evict(self):
+        entries = sorted(self._entries())
+        self.size = sum(entry_size for _, _, entry_size in entries)
+
+        for _, entry_path, entry_size in entries:
+            if self.size <= self.max_bytes:
+                break
+
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+
+            self.size -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        for _, entry_path, _ in self._entries():
+            os.remove(entry_path)
+
+        self.size = 0
+
+    def statistics(self):
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups > 0 else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'bytes': self.size,
+                'max_bytes': self.max_bytes}
+
+    def summary(self):
+        statistics = self.statistics()
+
+        return ('Cache %s: %d hits, %d misses (hit rate %0.1f%%), %d stored, %d evicted, %0.2f of %0.2f MB'
+                %(self.path,
+                  statistics['hits'],
+                  statistics['misses'],
+                  100.0 * statistics['hit_rate'],
+                  statistics['stores'],
+                  statistics['evictions'],
+                  1e-6 * statistics['bytes'],
+                  1e-6 * statistics['max_bytes']))
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + _ENTRY_SUFFIX)
+
+    '''(modification time, path, size) of all entries'''
+    def _entries(self):
+        entries = []
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    entry_stat = entry.stat()
+                    entries.append((entry_stat.st_mtime, entry.path, entry_stat.st_size))
+
+        return entries
+
+'''SHA-256 of a channel realization, e.g. the block fading channel of a dataset column as passed to simulate'''
+def channel_digest(channel):
+    channel = np.ascontiguousarray(channel)
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'shape': list(channel.shape), 'dtype': channel.dtype.str}).encode())
+    digest.update(channel.data)
+
+    return digest.hexdigest()
+
+'''SHA-256 of the sources of the simulation chain and the itpp version, computed once per process'''
+@functools.lru_cache(maxsize=None)
+def code_version():
+    digest = hashlib.sha256()
+    digest.update(str(getattr(itpp, '__version__', '')).encode())
+
+    source_directory = os.path.dirname(os.path.abspath(__file__))
+    for source in _SIMULATION_SOURCES:
+        with open(os.path.join(source_directory, source), 'rb') as source_file:
+            digest.update(source_file.read())
+
+    return digest.hexdigest()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulation cache tools.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    info_parser = subparsers.add_parser('info', help='print the number of entries and the size of a cache')
+    info_parser.add_argument('path')
+
+    clear_parser = subparsers.add_parser('clear', help='remove all entries of a cache')
+    clear_parser.add_argument('path')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        entries = SimulationCache(args.path, max_bytes=np.inf)._entries()
+        print('%s: %d entries, %0.2f MB, code version %s' %(args.path,
+                                                            len(entries),
+                                                            1e-6 * sum(entry_size for _, _, entry_size in entries),
+                                                            code_version()[:12]))
+    elif args.command == 'clear':
+        SimulationCache(args.path, max_bytes=np.inf).clear()
+        print('Cleared %s' %(args.path))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
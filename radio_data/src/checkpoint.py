@@ -0,0 +1,392 @@
+'''Checkpointed, resumable and extendable dataset generation.
+
+   The dataset is generated directly into a dataset directory (see dataset.py): the channel and block_success arrays
+   are preallocated .npy files written through memory maps, and progress.npy next to them records which (MCS,
+   column) work units are done. Every checkpoint_interval seconds the block success written so far is flushed
+   before the progress record is replaced, so after a crash or a kill generation resumes with the work units not
+   recorded as done, and at most those of the last interval are simulated again.
+
+   An existing dataset can be extended with SNRs, batches or relative speeds without simulating its columns again.
+   The columns of a dataset with S SNRs, V speeds and B batches are ordered
+       column = snr_index * V * B + speed_index * B + batch_index,
+   so every SNR keeps a contiguous block of columns, as training_data.py expects, and with a single speed the layout
+   is the one of generate.py. New SNRs and speeds are appended to snrs_db and relative_speeds. The existing columns
+   and their progress are copied to their positions in the new layout, which is written to a new directory and
+   swapped in when complete; only the new columns get channel realizations and are simulated.
+
+   Every column is described in the manifest metadata by its snr_db, relative_speed, batch_index and seed_key. The
+   columns added together at one speed get their channels from one seed, and the work units of a column are seeded
+   from its seed key, the MCS and the SNR. The columns created first at the first speed use the seed and the seeding
+   of generate.py, so a dataset created with a single speed equals the one generate.generate_dataset returns.
+
+   Usage, from the radio_data directory:
+       python -m src.checkpoint create --snrs-db 5 --nrof-samples 1000 --nrof-batches 210 --workers 8 sim_data/sim_0001/dataset
+       python -m src.checkpoint resume --workers 8 sim_data/sim_0001/dataset
+       python -m src.checkpoint extend --snrs-db 10 --relative-speeds 16.67 --nrof-batches 250 sim_data/sim_0001/dataset
+       python -m src.checkpoint status sim_data/sim_0001/dataset
+'''
+import argparse
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from . import codec, dataset, generate
+
+
+PROGRESS_FILENAME = 'progress.npy'
+
+'''Suffixes of the directory an extension is written to and of the replaced directory while it is swapped in'''
+_EXTENSION_SUFFIX = '.extending'
+_REPLACED_SUFFIX = '.replaced'
+
+'''Samples copied at a time when the columns of a dataset are moved to a new layout'''
+_COPY_SAMPLES = 1000
+
+'''Create a dataset directory with the channel realizations of all columns and no block success yet.
+   The block success is simulated by generate_missing.
+'''
+def create_dataset(path,
+                   channel_model='ITU_VEHICULAR_B',
+                   relative_speeds=(33.33,),
+                   snrs_db=(5,),
+                   nrof_samples=1000,
+                   nrof_batches=1,
+                   nrof_subcarriers=72,
+                   fft_size=128,
+                   seed=0,
+                   channel_generator='itpp',
+                   transport_block_sizes=generate.TRANSPORT_BLOCK_SIZES,
+                   modulation_orders=generate.MODULATION_ORDERS,
+                   codec_backend='itpp'):
+
+    if os.path.exists(path):
+        raise ValueError('Dataset %s exists already, resume or extend it' %(path))
+
+    generation = {'channel_model': channel_model,
+                  'nrof_samples': int(nrof_samples),
+                  'nrof_subcarriers': int(nrof_subcarriers),
+                  'fft_size': int(fft_size),
+                  'seed': int(seed),
+                  'channel_generator': channel_generator,
+                  'modulation_orders': [int(modorder) for modorder in modulation_orders],
+                  'codec_backend': codec_backend,
+                  'nrof_parts': 0}
+
+    _check_new_values('SNR', [], snrs_db)
+    _check_new_values('relative speed', [], relative_speeds)
+
+    # Written next to path and renamed into place when complete, so an interrupted create leaves no partial dataset
+    extension_path = path + _EXTENSION_SUFFIX
+    if os.path.exists(extension_path):
+        shutil.rmtree(extension_path)
+
+    _write_layout(extension_path, None, [int(block_size) for block_size in transport_block_sizes], generation,
+                  [float(snr_db) for snr_db in snrs_db],
+                  [float(relative_speed) for relative_speed in relative_speeds],
+                  nrof_batches)
+
+    os.rename(extension_path, path)
+
+'''Extend a dataset directory with new SNRs, new relative speeds and more batches. The existing columns keep their
+   channel realizations and block success, the new ones are simulated by generate_missing.
+'''
+def extend_dataset(path, snrs_db=(), relative_speeds=(), nrof_batches=None):
+    _recover(path)
+
+    manifest = dataset.read_manifest(path)
+    metadata = manifest['metadata']
+
+    old_nrof_batches = metadata['nrof_batches']
+    if nrof_batches is None:
+        nrof_batches = old_nrof_batches
+    if nrof_batches < old_nrof_batches:
+        raise ValueError('Dataset %s has %d batches, it cannot be extended to %d' %(path, old_nrof_batches, nrof_batches))
+
+    _check_new_values('SNR', manifest['snrs_db'], snrs_db)
+    _check_new_values('relative speed', metadata['relative_speeds'], relative_speeds)
+
+    if len(snrs_db) == 0 and len(relative_speeds) == 0 and nrof_batches == old_nrof_batches:
+        return
+
+    extension_path = path + _EXTENSION_SUFFIX
+    if os.path.exists(extension_path):
+        shutil.rmtree(extension_path)
+
+    _write_layout(extension_path, path, manifest['block_sizes'], metadata['generation'],
+                  manifest['snrs_db'] + [float(snr_db) for snr_db in snrs_db],
+                  metadata['relative_speeds'] + [float(relative_speed) for relative_speed in relative_speeds],
+                  nrof_batches)
+
+    # Swap the extension in; _recover completes the swap if it is interrupted
+    replaced_path = path + _REPLACED_SUFFIX
+    os.rename(path, replaced_path)
+    os.rename(extension_path, path)
+    shutil.rmtree(replaced_path)
+
+'''Simulate the work units of a dataset directory that are not done yet, checkpointing every checkpoint_interval
+   seconds. The work units are sharded over nrof_workers processes in chunks of chunk_size, as in generate.py.
+'''
+def generate_missing(path, nrof_workers=None, chunk_size=1, checkpoint_interval=60.0):
+    _recover(path)
+
+    manifest = dataset.read_manifest(path)
+    metadata = manifest['metadata']
+    generation = metadata['generation']
+
+    mcs_table = [(block_size + generate.CRC_SIZE, modorder)
+                 for block_size, modorder in zip(manifest['block_sizes'], generation['modulation_orders'])]
+
+    progress = np.load(os.path.join(path, PROGRESS_FILENAME))
+
+    work_units = [(mcs_index, column_index, block_size, modorder, column['snr_db'], column['seed_key'])
+                  for mcs_index, (block_size, modorder) in enumerate(mcs_table)
+                  for column_index, column in enumerate(metadata['columns'])
+                  if not progress[mcs_index, column_index]]
+
+    logging.info('Simulating %d of %d work units of %s' %(len(work_units), progress.size, path))
+
+    if len(work_units) > 0:
+        # The channel realizations are read by column, which touches every page of the file, so they are loaded
+        channel_coeff = np.load(os.path.join(path, 'channel.npy'))
+        block_success_dataset = np.load(os.path.join(path, 'block_success.npy'), mmap_mode='r+')
+
+        start = time.time()
+        last_checkpoint = start
+        try:
+            for mcs_index, column_index, block_success in generate._run(work_units,
+                                                                        channel_coeff,
+                                                                        set(block_size for block_size, _ in mcs_table),
+                                                                        metadata['nrof_batches'],
+                                                                        nrof_workers,
+                                                                        chunk_size,
+                                                                        generation['codec_backend'],
+                                                                        generate._run_column_work_units):
+
+                block_success_dataset[:, mcs_index, column_index] = block_success
+                progress[mcs_index, column_index] = 1
+
+                if time.time() - last_checkpoint >= checkpoint_interval:
+                    _checkpoint(path, block_success_dataset, progress)
+                    last_checkpoint = time.time()
+        finally:
+            _checkpoint(path, block_success_dataset, progress)
+
+        logging.info('Simulated %d work units in %0.2fs' %(len(work_units), time.time() - start))
+
+    metadata['complete'] = bool(np.all(progress))
+    dataset.write_manifest(path, manifest['block_sizes'], manifest['snrs_db'], metadata)
+
+'''Layout and progress of a dataset directory'''
+def status(path):
+    _recover(path)
+
+    manifest = dataset.read_manifest(path)
+    metadata = manifest['metadata']
+    progress = np.load(os.path.join(path, PROGRESS_FILENAME))
+
+    return {'snrs_db': manifest['snrs_db'],
+            'relative_speeds': metadata['relative_speeds'],
+            'nrof_batches': metadata['nrof_batches'],
+            'nrof_columns': len(metadata['columns']),
+            'nrof_mcss': len(manifest['block_sizes']),
+            'done': int(np.count_nonzero(progress)),
+            'total': int(progress.size)}
+
+'''Write a dataset directory with the given layout to path. The columns of the dataset directory source_path, if
+   any, are copied with their progress, the others get new channel realizations and are to be simulated.
+'''
+def _write_layout(path, source_path, block_sizes, generation, snrs_db, relative_speeds, nrof_batches):
+    nrof_speeds = len(relative_speeds)
+    nrof_columns = len(snrs_db) * nrof_speeds * nrof_batches
+    nrof_samples = generation['nrof_samples']
+
+    channel_coeff = dataset.create_mapped_array(path, 'channel', (nrof_samples, generation['nrof_subcarriers'], nrof_columns), np.complex128)
+    block_success_dataset = dataset.create_mapped_array(path, 'block_success', (nrof_samples, len(block_sizes), nrof_columns), np.float64)
+    progress = np.zeros((len(block_sizes), nrof_columns), dtype=np.uint8)
+    columns = [None] * nrof_columns
+
+    if source_path is not None:
+        source = dataset.load_dataset(source_path)
+        source_columns = source['columns']
+
+        positions = np.array([snrs_db.index(column['snr_db']) * nrof_speeds * nrof_batches
+                              + relative_speeds.index(column['relative_speed']) * nrof_batches
+                              + column['batch_index']
+                              for column in source_columns], dtype=np.int64)
+
+        for start in range(0, nrof_samples, _COPY_SAMPLES):
+            samples = slice(start, min(start + _COPY_SAMPLES, nrof_samples))
+            channel_coeff[samples][:, :, positions] = source['channel'][samples]
+            block_success_dataset[samples][:, :, positions] = source['block_success'][samples]
+
+        progress[:, positions] = np.load(os.path.join(source_path, PROGRESS_FILENAME))
+        for position, column in zip(positions, source_columns):
+            columns[position] = column
+
+    part = generation['nrof_parts']
+    for speed_index, relative_speed in enumerate(relative_speeds):
+        new_columns = [column_index for column_index in range(nrof_columns)
+                       if columns[column_index] is None and (column_index // nrof_batches) % nrof_speeds == speed_index]
+        if len(new_columns) == 0:
+            continue
+
+        part_seed = _part_seed(generation['seed'], part, speed_index)
+        channel_coeff[:, :, new_columns] = generate.generate_channels(generation['channel_model'],
+                                                                      relative_speed,
+                                                                      nrof_samples,
+                                                                      len(new_columns),
+                                                                      generation['nrof_subcarriers'],
+                                                                      generation['fft_size'],
+                                                                      part_seed,
+                                                                      generation['channel_generator'])
+
+        for column_index in new_columns:
+            snr_index = column_index // (nrof_speeds * nrof_batches)
+            batch_index = column_index % nrof_batches
+
+            columns[column_index] = {'snr_db': snrs_db[snr_index],
+                                     'relative_speed': relative_speed,
+                                     'batch_index': batch_index,
+                                     'seed_key': [part_seed, batch_index]}
+
+    generation = dict(generation, nrof_parts=part + 1)
+
+    channel_coeff.flush()
+    block_success_dataset.flush()
+    del channel_coeff, block_success_dataset
+
+    _save_progress(path, progress)
+
+    dataset.write_manifest(path, block_sizes, snrs_db, {'generation': generation,
+                                                        'relative_speeds': relative_speeds,
+                                                        'nrof_batches': nrof_batches,
+                                                        'columns': columns,
+                                                        'complete': bool(np.all(progress))})
+
+'''Seed of the columns added in one part at one speed; the first part at the first speed uses the seed itself'''
+def _part_seed(seed, part, speed_index):
+    if part == 0 and speed_index == 0:
+        return seed
+
+    return int(np.random.SeedSequence([seed, part, speed_index]).generate_state(1)[0])
+
+def _check_new_values(name, existing_values, new_values):
+    new_values = [float(value) for value in new_values]
+
+    if len(set(new_values)) != len(new_values):
+        raise ValueError('Duplicate %ss: %s' %(name, new_values))
+
+    for value in new_values:
+        if value in existing_values:
+            raise ValueError('The dataset has the %s %s already' %(name, value))
+
+'''Flush the block success written so far, then record the progress'''
+def _checkpoint(path, block_success_dataset, progress):
+    block_success_dataset.flush()
+    _save_progress(path, progress)
+
+    logging.info('Checkpoint: %d of %d work units done' %(np.count_nonzero(progress), progress.size))
+
+'''Write the progress record through a temporary file, so an interrupted write never leaves a truncated record'''
+def _save_progress(path, progress):
+    temporary_filename = os.path.join(path, PROGRESS_FILENAME + '.tmp')
+    with open(temporary_filename, 'wb') as progress_file:
+        np.save(progress_file, progress)
+
+    os.replace(temporary_filename, os.path.join(path, PROGRESS_FILENAME))
+
+'''Finish or discard an extension of the dataset directory that was interrupted'''
+def _recover(path):
+    extension_path = path + _EXTENSION_SUFFIX
+    replaced_path = path + _REPLACED_SUFFIX
+
+    if os.path.exists(replaced_path):
+        if not os.path.exists(path):
+            # Interrupted between the two renames: the extension is complete
+            os.rename(extension_path, path)
+        shutil.rmtree(replaced_path)
+    elif os.path.exists(extension_path):
+        # Interrupted while writing the extension, or the initial layout: the dataset is unchanged
+        shutil.rmtree(extension_path)
+
+    if not os.path.exists(os.path.join(path, PROGRESS_FILENAME)):
+        raise ValueError('%s is not a dataset directory created by checkpoint.py' %(path))
+
+def _add_run_arguments(parser):
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=1, help='work units sent to a worker at a time')
+    parser.add_argument('--checkpoint-interval', type=float, default=60.0, help='seconds between checkpoints')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checkpointed, resumable and extendable dataset generation.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    create_parser = subparsers.add_parser('create', help='create a dataset directory and generate it')
+    create_parser.add_argument('path')
+    create_parser.add_argument('--channel-model', default='ITU_VEHICULAR_B',
+                               choices=['ITU_PEDESTRIAN_A', 'ITU_PEDESTRIAN_B', 'ITU_VEHICULAR_A', 'ITU_VEHICULAR_B', 'AWGN'])
+    create_parser.add_argument('--relative-speeds', type=float, nargs='+', default=[33.33], help='relative speeds in m/s')
+    create_parser.add_argument('--snrs-db', type=float, nargs='+', default=[5])
+    create_parser.add_argument('--nrof-samples', type=int, default=1000)
+    create_parser.add_argument('--nrof-batches', type=int, default=1)
+    create_parser.add_argument('--nrof-subcarriers', type=int, default=72)
+    create_parser.add_argument('--fft-size', type=int, default=128)
+    create_parser.add_argument('--seed', type=int, default=0)
+    create_parser.add_argument('--channel-generator', default='itpp', choices=['itpp', 'numpy'])
+    codec.add_backend_arguments(create_parser)
+    _add_run_arguments(create_parser)
+
+    resume_parser = subparsers.add_parser('resume', help='generate the work units of a dataset directory that are not done')
+    resume_parser.add_argument('path')
+    _add_run_arguments(resume_parser)
+
+    extend_parser = subparsers.add_parser('extend', help='add SNRs, relative speeds or batches to a dataset directory and generate them')
+    extend_parser.add_argument('path')
+    extend_parser.add_argument('--snrs-db', type=float, nargs='+', default=[])
+    extend_parser.add_argument('--relative-speeds', type=float, nargs='+', default=[], help='relative speeds in m/s')
+    extend_parser.add_argument('--nrof-batches', type=int, help='new number of batches per SNR and speed')
+    _add_run_arguments(extend_parser)
+
+    status_parser = subparsers.add_parser('status', help='print the layout and progress of a dataset directory')
+    status_parser.add_argument('path')
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.command == 'create':
+        create_dataset(args.path,
+                       channel_model=args.channel_model,
+                       relative_speeds=args.relative_speeds,
+                       snrs_db=args.snrs_db,
+                       nrof_samples=args.nrof_samples,
+                       nrof_batches=args.nrof_batches,
+                       nrof_subcarriers=args.nrof_subcarriers,
+                       fft_size=args.fft_size,
+                       seed=args.seed,
+                       channel_generator=args.channel_generator,
+                       codec_backend=codec.backend_argument(create_parser, args))
+    elif args.command == 'extend':
+        extend_dataset(args.path, snrs_db=args.snrs_db, relative_speeds=args.relative_speeds, nrof_batches=args.nrof_batches)
+    elif args.command not in ('resume', 'status'):
+        parser.print_help()
+        return
+
+    if args.command != 'status':
+        generate_missing(args.path, nrof_workers=args.workers, chunk_size=args.chunk_size, checkpoint_interval=args.checkpoint_interval)
+
+    dataset_status = status(args.path)
+    print('%s: SNRs %s dB, relative speeds %s m/s, %d batches, %d columns, %d of %d work units done'
+          %(args.path,
+            ' '.join('%g' %(snr_db) for snr_db in dataset_status['snrs_db']),
+            ' '.join('%g' %(relative_speed) for relative_speed in dataset_status['relative_speeds']),
+            dataset_status['nrof_batches'],
+            dataset_status['nrof_columns'],
+            dataset_status['done'],
+            dataset_status['total']))
+
+if __name__ == '__main__':
+    main()
@@ -1,363 +1,447 @@
+import functools
 import logging
 
-from itpp.comm import turbo_codec
-from itpp import vec, ivec, bvec
-from itpp import zeros, zeros_b
-from itpp import imat
+import numpy as np
+
+try:
+    import itpp
+except ImportError:
+    # Only the itpp backend needs py-itpp, the numpy paths of this module run without it
+    itpp = None
+
+from . import conversion, instrumentation, turbo
 
 #from . import constants
     
-def encode( block_length, bits ):
-    '''Create the codec instance and set parameters'''
-    codec = turbo_codec()
-    
-    '''Prepare codec parameters'''
-    gen_sequence = '11,13'
-    gen = ivec( gen_sequence )
-    constraint_length = 4
-    
-    codec.set_parameters(gen, gen, constraint_length, ivec())
-    codec.set_interleaver(_interleaver_sequence(block_length))
-    
-    '''Encode with the given code rate and bitarray comprising uncoded bits'''
+_GENERATOR_SEQUENCE = '11,13'
+_CONSTRAINT_LENGTH = 4
+
+'''Turbo decoder iterations, the itpp turbo_codec default, which always runs all of them'''
+_DECODER_ITERATIONS = 8
+
+'''Codec backends: the itpp turbo_codec, or the numpy implementation of the same code in turbo.py, which encodes
+   and decodes all blocks of a call at once. The numpy backend takes and returns numpy arrays (itpp vectors are
+   accepted as input).
+'''
+BACKENDS = ('itpp', 'numpy')
+
+'''Backends whose parity with itpp has not been established (see benchmarks/codec_parity.py). The command line tools
+   only run them with --experimental-codec.
+'''
+EXPERIMENTAL_BACKENDS = ('numpy',)
+
+'''Add the --codec-backend option of the command line tools, and the --experimental-codec flag that the experimental
+   backends need
+'''
+def add_backend_arguments(parser):
+    parser.add_argument('--codec-backend', default='itpp', choices=list(BACKENDS),
+                        help='turbo codec backend; %s is experimental and needs --experimental-codec' %(', '.join(EXPERIMENTAL_BACKENDS)))
+    parser.add_argument('--experimental-codec', action='store_true',
+                        help='allow an experimental codec backend, whose parity with itpp is not established')
+
+'''The codec backend of the arguments parsed by parser. An experimental backend without --experimental-codec exits
+   through parser.error, with it a warning is logged.
+'''
+def backend_argument(parser, args):
+    if args.codec_backend in EXPERIMENTAL_BACKENDS:
+        if not args.experimental_codec:
+            parser.error('the %s codec backend is experimental, its parity with itpp is not established; '
+                         'pass --experimental-codec to use it anyway' %(args.codec_backend))
+
+        logging.warning('Using the experimental %s codec backend, its parity with itpp is not established' %(args.codec_backend))
+
+    return args.codec_backend
+
+def encode( block_length, bits, backend='itpp' ):
+    '''Encode with the cached codec for the block length and bitarray comprising uncoded bits'''
     '''Generate and return encoded bits'''
-    encoded_bits = bvec()
-    codec.encode(bits, encoded_bits)
+    if backend == 'numpy':
+        bits = conversion.to_numpy(bits)
+        with instrumentation.stage('encode', bits.size):
+            return get_numpy_turbo_code(block_length).encode(bits)
+
+    _check_backend(backend)
+
+    encoded_bits = itpp.bvec()
+    with instrumentation.stage('encode', bits.length()):
+        get_turbo_codec(block_length).encode(bits, encoded_bits)
     return encoded_bits        
 
-def decode( block_length, bits):
-    '''Create the codec instance and set parameters'''
-    codec = turbo_codec()
+def decode( block_length, bits, backend='itpp', metric='maxlog', early_termination=False ):
+    '''Decode with the cached codec for the block length'''
+    '''Generate and return decoded bits'''
+    '''metric ('maxlog' as itpp, or 'logmap') and early_termination only apply to the numpy backend'''
+    if backend == 'numpy':
+        bits = conversion.to_numpy(bits)
+        with instrumentation.stage('decode', bits.size):
+            decoded_bits, nrof_iterations = get_numpy_turbo_code(block_length, metric, early_termination).decode(bits)
+
+        instrumentation.count('decoded_blocks', nrof_iterations.size)
+        instrumentation.count('decoder_iterations', np.sum(nrof_iterations))
+        return decoded_bits
+
+    _check_backend(backend)
+
+    decoded_bits = itpp.bvec()
+    with instrumentation.stage('decode', bits.length()):
+        get_turbo_codec(block_length).decode(bits, decoded_bits, itpp.bvec())
+
+    nrof_blocks = int(decoded_bits.length() / block_length)
+    instrumentation.count('decoded_blocks', nrof_blocks)
+    instrumentation.count('decoder_iterations', nrof_blocks * _DECODER_ITERATIONS)
+    return decoded_bits 
+
+'''Return the turbo codec configured for the given block length.
+   Each block length is configured once, i.e. the generator is parsed and the QPP interleaver is built once,
+   and the same instance is reused by encode and decode.
+'''
+@functools.lru_cache(maxsize=None)
+def get_turbo_codec( block_length ):
+    codec = itpp.comm.turbo_codec()
     
     '''Prepare codec parameters'''
-    gen_sequence = '11,13'
-    gen = ivec( gen_sequence )
-    constraint_length = 4
+    gen = itpp.ivec( _GENERATOR_SEQUENCE )
     
-    codec.set_parameters(gen, gen, constraint_length, ivec())
+    codec.set_parameters(gen, gen, _CONSTRAINT_LENGTH, itpp.ivec())
     codec.set_interleaver(_interleaver_sequence(block_length))
     
-    '''Encode with the given code rate and bitarray comprising uncoded bits'''
-    '''Generate and return decoded bits'''
-    decoded_bits = bvec()
-    codec.decode(bits, decoded_bits, bvec())
-    return decoded_bits 
+    return codec
 
-def rate_match(rate_matched_block_size, input_block_size):
-    
-    def _rate_match_by_truncation(input_bits):
-        nrof_blocks = int(input_bits.length() / input_block_size)
-        rate_matched_bits = zeros_b(nrof_blocks * rate_matched_block_size)
-        
-        for block_index in range(nrof_blocks):
-            # Extract the current block bring rate matched
-            rate_matched_block = input_bits.mid(block_index * input_block_size, rate_matched_block_size) 
-            
-            # Truncate the rightmost bits and insert into the rate matched bits
-            rate_matched_bits.set_subvector(block_index * rate_matched_block_size, rate_matched_block)
+'''Return the numpy turbo code (see turbo.py) for the given block length and decoder settings, built once'''
+@functools.lru_cache(maxsize=None)
+def get_numpy_turbo_code( block_length, metric='maxlog', early_termination=False ):
+    generators = [int(generator) for generator in _GENERATOR_SEQUENCE.split(',')]
 
-        return rate_matched_bits
-    
-    def _rate_match_by_repetition(input_bits):
-        nrof_blocks = int(input_bits.length() / input_block_size)
-        rate_matched_bits = bvec(nrof_blocks * rate_matched_block_size)
-        rate_matched_bits.clear()
+    return turbo.TurboCode(generators,
+                           _CONSTRAINT_LENGTH,
+                           _interleaver_sequence_np(block_length),
+                           nrof_iterations=_DECODER_ITERATIONS,
+                           metric=metric,
+                           early_termination=early_termination)
 
-        # Determine the number of full repetitions of each input block        
-        nrof_repetitions = int(rate_matched_block_size / input_block_size)
-        
-        for block_index in range(nrof_blocks):
-            # Extract the current block being rate matched
-            current_input_block = input_bits.mid(block_index * input_block_size, input_block_size) 
-            
-            # Repeat the input bits and insert into the rate matched bits
-            for repetition_index in range(nrof_repetitions):
-                write_index = block_index * rate_matched_block_size + repetition_index * input_block_size
-                rate_matched_bits.set_subvector(write_index, current_input_block)
-            
-            # Fill in the remaining bits (if any) with leftmost bits of the input block
-            write_index = block_index * rate_matched_block_size + nrof_repetitions * input_block_size
-            rate_matched_bits.set_subvector(write_index, current_input_block.left(rate_matched_block_size - nrof_repetitions * input_block_size))
-            
-        return rate_matched_bits
+def _check_backend( backend ):
+    if backend not in BACKENDS:
+        raise ValueError('Unknown codec backend: ' + str(backend))
 
-        
-    if input_block_size >= rate_matched_block_size:
-        return _rate_match_by_truncation
-    else:
-        return _rate_match_by_repetition
+'''Build the codecs for all given block lengths up front, e.g. the transport block sizes of a whole MCS table,
+   so that a sweep over the table (or every worker forked after this call) shares them.
+'''
+def prepare_turbo_codecs( block_lengths ):
+    return [get_turbo_codec(block_length) for block_length in sorted(set(block_lengths))]
+
+'''Return a function that rate matches blocks of input_block_size bits into an itpp bvec with blocks of
+   rate_matched_block_size bits. Thin adapter around rate_match_np.
+'''
+def rate_match(rate_matched_block_size, input_block_size):
+    rate_match_bits = rate_match_np(rate_matched_block_size, input_block_size)
+    
+    def _rate_match(input_bits):
+        return conversion.to_bvec(rate_match_bits(input_bits))
+    
+    return _rate_match
     
     
+'''Return a function that de-rate matches soft values into an itpp vec with blocks of de_rate_matched_block_size
+   values. Thin adapter around de_rate_match_np.
+'''
 def de_rate_match(input_block_size, de_rate_matched_block_size):
+    de_rate_match_values = de_rate_match_np(input_block_size, de_rate_matched_block_size)
     
-    def _de_rate_match_by_zero_padding(input_values):
-        nrof_blocks = int(input_values.length() / input_block_size)
-        de_rate_matched_values = zeros(nrof_blocks * de_rate_matched_block_size)
-        
-        for block_index in range(nrof_blocks):
-            # Extract the current block bring rate matched
-            current_input_block = input_values.mid(block_index * input_block_size, input_block_size) 
-            
-            # Truncate the rightmost bits and insert into the rate matched bits
-            de_rate_matched_values.set_subvector(block_index * de_rate_matched_block_size, current_input_block)
+    def _de_rate_match(input_values):
+        return conversion.to_vec(de_rate_match_values(input_values))
+    
+    return _de_rate_match
 
-        return de_rate_matched_values
+'''Numpy version of rate_match: the returned function takes itpp or numpy bits and returns a numpy array'''
+def rate_match_np(rate_matched_block_size, input_block_size):
+    plan = rate_match_plan(input_block_size, rate_matched_block_size)
+    
+    def _rate_match(input_bits):
+        input_bits = conversion.to_numpy(input_bits)
+        with instrumentation.stage('rate_match', input_bits.size):
+            return plan.rate_match(input_bits)
+    
+    return _rate_match
+    
+    
+'''Numpy version of de_rate_match: the returned function takes itpp or numpy soft values and returns a numpy array'''
+def de_rate_match_np(input_block_size, de_rate_matched_block_size):
+    plan = rate_match_plan(de_rate_matched_block_size, input_block_size)
+    
+    def _de_rate_match(input_values):
+        input_values = conversion.to_numpy(input_values)
+        with instrumentation.stage('de_rate_match', input_values.size):
+            return plan.de_rate_match(input_values)
     
-    def _de_rate_match_by_accumulation(input_values):
-        nrof_blocks = int(input_values.length() / input_block_size)
-        de_rate_matched_values = vec(nrof_blocks * de_rate_matched_block_size)
-        de_rate_matched_values.clear()
-
-        # Determine the number of full repetitions of each input block        
-        nrof_repetitions = int(input_block_size / de_rate_matched_block_size)
-        nrof_extra_values = input_block_size - nrof_repetitions * de_rate_matched_block_size
+    return _de_rate_match
+
+'''Return the cached rate matching plan for the given block sizes. 
+   There are only as many distinct plans as MCS configurations, so plans are never evicted.
+'''
+@functools.lru_cache(maxsize=None)
+def rate_match_plan(input_block_size, rate_matched_block_size):
+    return RateMatchPlan(input_block_size, rate_matched_block_size)
+
+class RateMatchPlan(object):
+    '''Precomputed index maps for rate matching blocks of input_block_size bits into blocks of rate_matched_block_size bits.
+    
+       Rate matched bit j of a block is input bit (j mod input_block_size). This covers both truncation 
+       (the rightmost input bits are dropped) and repetition (the block is repeated and the remainder is filled 
+       with its leftmost bits). De-rate matching uses the same index to scatter-add the soft values back, 
+       which zero pads truncated positions and accumulates repeated ones.
+    '''
+    def __init__(self, input_block_size, rate_matched_block_size):
+        self.input_block_size = input_block_size
+        self.rate_matched_block_size = rate_matched_block_size
         
-        # Pre-allocate vector to store accumulated values for efficiency
-        current_de_rate_matched_block = vec(de_rate_matched_block_size)
-        for block_index in range(nrof_blocks):
-            current_de_rate_matched_block.clear()
-            
-            #First, accumulate the extra bits left over after complete block repeitions
-            read_index = block_index * input_block_size + nrof_repetitions * de_rate_matched_block_size
-            current_de_rate_matched_block.set_subvector(0, input_values.mid(read_index, nrof_extra_values))
-            
-            # Accumulate the input values into the de rate matched valuess
-            for repetition_index in range(nrof_repetitions):
-                read_index = block_index * input_block_size + repetition_index * de_rate_matched_block_size
-                current_de_rate_matched_block += input_values.mid(read_index, de_rate_matched_block_size)            
-            
-            de_rate_matched_values.set_subvector(block_index * de_rate_matched_block_size, current_de_rate_matched_block)
+        self.gather_index = np.arange(rate_matched_block_size) % input_block_size
         
-        return de_rate_matched_values
-
+        self._nrof_scatter_blocks = 0
+        self._scatter_index = None
         
-    if input_block_size <= de_rate_matched_block_size:
-        return _de_rate_match_by_zero_padding
-    else:
-        return _de_rate_match_by_accumulation
+    '''Rate match all blocks of a flat numpy bit array with one gather'''
+    def rate_match(self, input_bits):
+        nrof_blocks = int(input_bits.size / self.input_block_size)
+        input_blocks = np.reshape(input_bits[:nrof_blocks * self.input_block_size], (nrof_blocks, self.input_block_size))
+        
+        return np.reshape(input_blocks[:, self.gather_index], -1)
+    
+    '''De-rate match all blocks of a flat numpy array of soft values with one scatter-add'''
+    def de_rate_match(self, input_values):
+        nrof_blocks = int(input_values.size / self.rate_matched_block_size)
+        nrof_values = nrof_blocks * self.rate_matched_block_size
+        
+        return np.bincount(self.scatter_index(nrof_blocks), 
+                           weights=input_values[:nrof_values], 
+                           minlength=nrof_blocks * self.input_block_size)
+    
+    '''Flat scatter index into the de-rate matched values, cached for the most recent number of blocks'''
+    def scatter_index(self, nrof_blocks):
+        if nrof_blocks != self._nrof_scatter_blocks:
+            block_offsets = self.input_block_size * np.arange(nrof_blocks)
+            self._scatter_index = np.reshape(block_offsets[:, np.newaxis] + self.gather_index, -1)
+            self._nrof_scatter_blocks = nrof_blocks
+            
+        return self._scatter_index
 
 ''' Interleaver specification
     3GPP TS 36.212 v12.2.0 Table 5.1.3-3
 '''
 def _interleaver_sequence( block_size ):
+    return conversion.to_ivec(_interleaver_sequence_np(block_size))
+
+'''QPP permutation PI(i) = (f1 * i + f2 * i^2) mod K as a numpy array, computed for all i at once
+'''
+def _interleaver_sequence_np( block_size ):
 
     K = block_size
     
-    '''Get the index of parameters to be used from interleaver table
+    '''Get the row of parameters to be used from interleaver table. Valid sizes are exactly the sizes listed in the table.
     '''
-    index = 0
-    if (40 <= K and K <= 512 and (K % 8 == 0)):
-        index = (K - 40) / 8
-    elif (528 <= K and K <= 1024 and (K % 16 == 0)):
-        index = 60 + ((K - 528) / 16)
-    elif (1056 <= K and K <= 2048 and (K % 32 == 0)):
-        index = 92 + ((K - 1056) / 32)
-    elif (2112 <= K and K <= 6144 and (K % 64 == 0)):
-        index = 124 + ((K - 2112) / 64);
-    else:
-        error_str = 'Invalid interleaver size: ' + str(K) 
-        logging.error(error_str) 
-        #raise ValueError, error_str 
+    index = np.searchsorted(_TURBO_INTERNAL_INTERLEAVER_TABLE[:, 0], K)
+    if index >= _TURBO_INTERNAL_INTERLEAVER_TABLE.shape[0] or _TURBO_INTERNAL_INTERLEAVER_TABLE[index, 0] != K:
+        raise ValueError('Invalid interleaver size: ' + str(K))
     
     '''Get the parameters to generate the interleaver sequence
     '''
-    f1 = _TURBO_INTERNAL_INTERLEAVER_TABLE.get(int(index), 1);
-    f2 = _TURBO_INTERNAL_INTERLEAVER_TABLE.get(int(index), 2);
+    f1 = _TURBO_INTERNAL_INTERLEAVER_TABLE[index, 1]
+    f2 = _TURBO_INTERNAL_INTERLEAVER_TABLE[index, 2]
     
     '''Mapping from output index 'i' to input index 'PI_i'
     '''
-    PI_mapping = lambda i: (f1 * i + f2 * i * i) % K
-    PI = ivec(K) # Placeholder for input indices
-    for i in range(K):
-        PI[i] = PI_mapping(i)
+    i = np.arange(K, dtype=np.int64)
     
-    return PI
-
-_TURBO_INTERNAL_INTERLEAVER_TABLE = imat('40 3 10;'
-                                         '48 7 12;'
-                                         '56 19 42;'
-                                         '64 7 16;'
-                                         '72 7 18;'
-                                         '80 11 20;'
-                                         '88 5 22;'
-                                         '96 11 24;'
-                                         '104 7 26;'
-                                         '112 41 84;'
-                                         '120 103 90;'
-                                         '128 15 32;'
-                                         '136 9 34;'
-                                         '144 17 108;'
-                                         '152 9 38;'
-                                         '160 21 120;'
-                                         '168 101 84;'
-                                         '176 21 44;'
-                                         '184 57 46;'
-                                         '192 23 48;'
-                                         '200 13 50;'
-                                         '208 27 52;'
-                                         '216 11 36;'
-                                         '224 27 56;'
-                                         '232 85 58;'
-                                         '240 29 60;'
-                                         '248 33 62;'
-                                         '256 15 32;'
-                                         '264 17 198;'
-                                         '272 33 68;'
-                                         '280 103 210;'
-                                         '288 19 36;'
-                                         '296 19 74;'
-                                         '304 37 76;'
-                                         '312 19 78;'
-                                         '320 21 120;'
-                                         '328 21 82;'
-                                         '336 115 84;'
-                                         '344 193 86;'
-                                         '352 21 44;'
-                                         '360 133 90;'
-                                         '368 81 46;'
-                                         '376 45 94;'
-                                         '384 23 48;'
-                                         '392 243 98;'
-                                         '400 151 40;'
-                                         '408 155 102;'
-                                         '416 25 52;'
-                                         '424 51 106;'
-                                         '432 47 72;'
-                                         '440 91 110;'
-                                         '448 29 168;'
-                                         '456 29 114;'
-                                         '464 247 58;'
-                                         '472 29 118;'
-                                         '480 89 180;'
-                                         '488 91 122;'
-                                         '496 157 62;'
-                                         '504 55 84;'
-                                         '512 31 64;'
-                                         '528 17 66;'
-                                         '544 35 68;'
-                                         '560 227 420;'
-                                         '576 65 96;'
-                                         '592 19 74;'
-                                         '608 37 76;'
-                                         '624 41 234;'
-                                         '640 39 80;'
-                                         '656 185 82;'
-                                         '672 43 252;'
-                                         '688 21 86;'
-                                         '704 155 44;'
-                                         '720 79 120;'
-                                         '736 139 92;'
-                                         '752 23 94;'
-                                         '768 217 48;'
-                                         '784 25 98;'
-                                         '800 17 80;'
-                                         '816 127 102;'
-                                         '832 25 52;'
-                                         '848 239 106;'
-                                         '864 17 48;'
-                                         '880 137 110;'
-                                         '896 215 112;'
-                                         '912 29 114;'
-                                         '928 15 58;'
-                                         '944 147 118;'
-                                         '960 29 60;'
-                                         '976 59 122;'
-                                         '992 65 124;'
-                                         '1008 55 84;'
-                                         '1024 31 64;'
-                                         '1056 17 66;'
-                                         '1088 171 204;'
-                                         '1120 67 140;'
-                                         '1152 35 72;'
-                                         '1184 19 74;'
-                                         '1216 39 76;'
-                                         '1248 19 78;'
-                                         '1280 199 240;'
-                                         '1312 21 82;'
-                                         '1344 211 252;'
-                                         '1376 21 86;'
-                                         '1408 43 88;'
-                                         '1440 149 60;'
-                                         '1472 45 92;'
-                                         '1504 49 846;'
-                                         '1536 71 48;'
-                                         '1568 13 28;'
-                                         '1600 17 80;'
-                                         '1632 25 102;'
-                                         '1664 183 104;'
-                                         '1696 55 954;'
-                                         '1728 127 96;'
-                                         '1760 27 110;'
-                                         '1792 29 112;'
-                                         '1824 29 114;'
-                                         '1856 57 116;'
-                                         '1888 45 354;'
-                                         '1920 31 120;'
-                                         '1952 59 610;'
-                                         '1984 185 124;'
-                                         '2016 113 420;'
-                                         '2048 31 64;'
-                                         '2112 17 66;'
-                                         '2176 171 136;'
-                                         '2240 209 420;'
-                                         '2304 253 216;'
-                                         '2368 367 444;'
-                                         '2432 265 456;'
-                                         '2496 181 468;'
-                                         '2560 39 80;'
-                                         '2624 27 164;'
-                                         '2688 127 504;'
-                                         '2752 143 172;'
-                                         '2816 43 88;'
-                                         '2880 29 300;'
-                                         '2944 45 92;'
-                                         '3008 157 188;'
-                                         '3072 47 96;'
-                                         '3136 13 28;'
-                                         '3200 111 240;'
-                                         '3264 443 204;'
-                                         '3328 51 104;'
-                                         '3392 51 212;'
-                                         '3456 451 192;'
-                                         '3520 257 220;'
-                                         '3584 57 336;'
-                                         '3648 313 228;'
-                                         '3712 271 232;'
-                                         '3776 179 236;'
-                                         '3840 331 120;'
-                                         '3904 363 244;'
-                                         '3968 375 248;'
-                                         '4032 127 168;'
-                                         '4096 31 64;'
-                                         '4160 33 130;'
-                                         '4224 43 264;'
-                                         '4288 33 134;'
-                                         '4352 477 408;'
-                                         '4416 35 138;'
-                                         '4480 233 280;'
-                                         '4544 357 142;'
-                                         '4608 337 480;'
-                                         '4672 37 146;'
-                                         '4736 71 444;'
-                                         '4800 71 120;'
-                                         '4864 37 152;'
-                                         '4928 39 462;'
-                                         '4992 127 234;'
-                                         '5056 39 158;'
-                                         '5120 39 80;'
-                                         '5184 31 96;'
-                                         '5248 113 902;'
-                                         '5312 41 166;'
-                                         '5376 251 336;'
-                                         '5440 43 170;'
-                                         '5504 21 86;'
-                                         '5568 43 174;'
-                                         '5632 45 176;'
-                                         '5696 45 178;'
-                                         '5760 161 120;'
-                                         '5824 89 182;'
-                                         '5888 323 184;'
-                                         '5952 47 186;'
-                                         '6016 23 94;'
-                                         '6080 47 190;'
-                                         '6144 263 480')
\ No newline at end of file
+    return (f1 * i + f2 * i * i) % K
+
+'''Parse a table given as rows separated by ';' into a 2D numpy integer array'''
+def _int_table( table_string ):
+    return np.array([row.split() for row in table_string.split(';')], dtype=np.int64)
+
+_TURBO_INTERNAL_INTERLEAVER_TABLE = _int_table('40 3 10;'
+                                               '48 7 12;'
+                                               '56 19 42;'
+                                               '64 7 16;'
+                                               '72 7 18;'
+                                               '80 11 20;'
+                                               '88 5 22;'
+                                               '96 11 24;'
+                                               '104 7 26;'
+                                               '112 41 84;'
+                                               '120 103 90;'
+                                               '128 15 32;'
+                                               '136 9 34;'
+                                               '144 17 108;'
+                                               '152 9 38;'
+                                               '160 21 120;'
+                                               '168 101 84;'
+                                               '176 21 44;'
+                                               '184 57 46;'
+                                               '192 23 48;'
+                                               '200 13 50;'
+                                               '208 27 52;'
+                                               '216 11 36;'
+                                               '224 27 56;'
+                                               '232 85 58;'
+                                               '240 29 60;'
+                                               '248 33 62;'
+                                               '256 15 32;'
+                                               '264 17 198;'
+                                               '272 33 68;'
+                                               '280 103 210;'
+                                               '288 19 36;'
+                                               '296 19 74;'
+                                               '304 37 76;'
+                                               '312 19 78;'
+                                               '320 21 120;'
+                                               '328 21 82;'
+                                               '336 115 84;'
+                                               '344 193 86;'
+                                               '352 21 44;'
+                                               '360 133 90;'
+                                               '368 81 46;'
+                                               '376 45 94;'
+                                               '384 23 48;'
+                                               '392 243 98;'
+                                               '400 151 40;'
+                                               '408 155 102;'
+                                               '416 25 52;'
+                                               '424 51 106;'
+                                               '432 47 72;'
+                                               '440 91 110;'
+                                               '448 29 168;'
+                                               '456 29 114;'
+                                               '464 247 58;'
+                                               '472 29 118;'
+                                               '480 89 180;'
+                                               '488 91 122;'
+                                               '496 157 62;'
+                                               '504 55 84;'
+                                               '512 31 64;'
+                                               '528 17 66;'
+                                               '544 35 68;'
+                                               '560 227 420;'
+                                               '576 65 96;'
+                                               '592 19 74;'
+                                               '608 37 76;'
+                                               '624 41 234;'
+                                               '640 39 80;'
+                                               '656 185 82;'
+                                               '672 43 252;'
+                                               '688 21 86;'
+                                               '704 155 44;'
+                                               '720 79 120;'
+                                               '736 139 92;'
+                                               '752 23 94;'
+                                               '768 217 48;'
+                                               '784 25 98;'
+                                               '800 17 80;'
+                                               '816 127 102;'
+                                               '832 25 52;'
+                                               '848 239 106;'
+                                               '864 17 48;'
+                                               '880 137 110;'
+                                               '896 215 112;'
+                                               '912 29 114;'
+                                               '928 15 58;'
+                                               '944 147 118;'
+                                               '960 29 60;'
+                                               '976 59 122;'
+                                               '992 65 124;'
+                                               '1008 55 84;'
+                                               '1024 31 64;'
+                                               '1056 17 66;'
+                                               '1088 171 204;'
+                                               '1120 67 140;'
+                                               '1152 35 72;'
+                                               '1184 19 74;'
+                                               '1216 39 76;'
+                                               '1248 19 78;'
+                                               '1280 199 240;'
+                                               '1312 21 82;'
+                                               '1344 211 252;'
+                                               '1376 21 86;'
+                                               '1408 43 88;'
+                                               '1440 149 60;'
+                                               '1472 45 92;'
+                                               '1504 49 846;'
+                                               '1536 71 48;'
+                                               '1568 13 28;'
+                                               '1600 17 80;'
+                                               '1632 25 102;'
+                                               '1664 183 104;'
+                                               '1696 55 954;'
+                                               '1728 127 96;'
+                                               '1760 27 110;'
+                                               '1792 29 112;'
+                                               '1824 29 114;'
+                                               '1856 57 116;'
+                                               '1888 45 354;'
+                                               '1920 31 120;'
+                                               '1952 59 610;'
+                                               '1984 185 124;'
+                                               '2016 113 420;'
+                                               '2048 31 64;'
+                                               '2112 17 66;'
+                                               '2176 171 136;'
+                                               '2240 209 420;'
+                                               '2304 253 216;'
+                                               '2368 367 444;'
+                                               '2432 265 456;'
+                                               '2496 181 468;'
+                                               '2560 39 80;'
+                                               '2624 27 164;'
+                                               '2688 127 504;'
+                                               '2752 143 172;'
+                                               '2816 43 88;'
+                                               '2880 29 300;'
+                                               '2944 45 92;'
+                                               '3008 157 188;'
+                                               '3072 47 96;'
+                                               '3136 13 28;'
+                                               '3200 111 240;'
+                                               '3264 443 204;'
+                                               '3328 51 104;'
+                                               '3392 51 212;'
+                                               '3456 451 192;'
+                                               '3520 257 220;'
+                                               '3584 57 336;'
+                                               '3648 313 228;'
+                                               '3712 271 232;'
+                                               '3776 179 236;'
+                                               '3840 331 120;'
+                                               '3904 363 244;'
+                                               '3968 375 248;'
+                                               '4032 127 168;'
+                                               '4096 31 64;'
+                                               '4160 33 130;'
+                                               '4224 43 264;'
+                                               '4288 33 134;'
+                                               '4352 477 408;'
+                                               '4416 35 138;'
+                                               '4480 233 280;'
+                                               '4544 357 142;'
+                                               '4608 337 480;'
+                                               '4672 37 146;'
+                                               '4736 71 444;'
+                                               '4800 71 120;'
+                                               '4864 37 152;'
+                                               '4928 39 462;'
+                                               '4992 127 234;'
+                                               '5056 39 158;'
+                                               '5120 39 80;'
+                                               '5184 31 96;'
+                                               '5248 113 902;'
+                                               '5312 41 166;'
+                                               '5376 251 336;'
+                                               '5440 43 170;'
+                                               '5504 21 86;'
+                                               '5568 43 174;'
+                                               '5632 45 176;'
+                                               '5696 45 178;'
+                                               '5760 161 120;'
+                                               '5824 89 182;'
+                                               '5888 323 184;'
+                                               '5952 47 186;'
+                                               '6016 23 94;'
+                                               '6080 47 190;'
+                                               '6144 263 480')
\ No newline at end of file
@@ -0,0 +1,88 @@
+import numpy as np
+
+try:
+    import itpp
+except ImportError:
+    # Only the conversions to itpp types need py-itpp, to_numpy runs without it
+    itpp = None
+
+
+'''Numpy dtype of the elements of the itpp vector and matrix types, by class name'''
+_NUMPY_DTYPES = {'bvec': np.uint8,
+                 'bmat': np.uint8,
+                 'ivec': np.int32,
+                 'imat': np.int32,
+                 'vec': np.float64,
+                 'mat': np.float64,
+                 'cvec': np.complex128,
+                 'cmat': np.complex128}
+
+'''View an itpp vector or matrix as a numpy array. Numpy arrays are returned unchanged.
+   Objects exporting the buffer protocol are wrapped without copying, the view keeps the itpp object alive and 
+   follows its (column-major for matrices) strides. Pass copy=True when the itpp object is modified afterwards.
+   The view is reinterpreted as the dtype of the itpp type (e.g. a bvec's bin elements as uint8) when the buffer
+   format differs but the element size matches; otherwise the data is moved with one bulk copy.
+'''
+def to_numpy(values, copy=False):
+    if isinstance(values, np.ndarray):
+        return np.array(values) if copy else values
+
+    try:
+        array = np.asarray(memoryview(values))
+    except (TypeError, ValueError, NotImplementedError):
+        return _bulk_copy(values)
+
+    dtype = _numpy_dtype(values)
+    if dtype is not None and array.dtype != dtype:
+        if array.dtype.itemsize != dtype.itemsize:
+            return _bulk_copy(values)
+
+        array = array.view(dtype)
+
+    return np.array(array) if copy else array
+
+'''Fallback conversion for objects without a usable buffer: one bulk copy through to_numpy_ndarray where 
+   available, element-wise iteration otherwise. Both give the dtype of the itpp type.
+'''
+def _bulk_copy(values):
+    dtype = _numpy_dtype(values)
+
+    if hasattr(values, 'to_numpy_ndarray'):
+        return np.asarray(values.to_numpy_ndarray(), dtype=dtype)
+
+    return np.array([int(value) for value in values] if dtype == np.uint8 else values, dtype=dtype)
+
+'''Numpy dtype of an itpp vector or matrix, or None for other types'''
+def _numpy_dtype(values):
+    dtype = _NUMPY_DTYPES.get(type(values).__name__)
+
+    return None if dtype is None else np.dtype(dtype)
+
+'''Copy a 2D numpy array into an itpp matrix (mat or cmat depending on the dtype)'''
+def to_mat(values):
+    return itpp.numpy_array_to_mat(np.ascontiguousarray(values))
+
+'''Copy a numpy array into an itpp vector (vec or cvec depending on the dtype)'''
+def to_vec(values):
+    return to_mat(np.reshape(values, (-1, 1))).get_col(0)
+
+'''Copy a numpy array of bits into an itpp bvec, through a vec and the itpp vec to bvec converter'''
+def to_bvec(bits):
+    return _convert_vec(bits, 'to_bvec', itpp.bvec)
+
+'''Copy a numpy array of integers into an itpp ivec, through a vec and the itpp vec to ivec converter'''
+def to_ivec(values):
+    return _convert_vec(values, 'to_ivec', itpp.ivec)
+
+'''Copy integer values into the itpp vector type of the converter named converter_name, e.g. to_bvec.
+   The values go through numpy_array_to_mat as a vec, which holds integers up to 2^53 exactly. Bindings that do
+   not expose the converter get the vector parsed from its string form by vector_type instead.
+'''
+def _convert_vec(values, converter_name, vector_type):
+    values = np.reshape(values, -1)
+
+    converter = getattr(itpp, converter_name, None)
+    if converter is not None:
+        return converter(to_vec(values.astype(np.float64)))
+
+    return vector_type(' '.join(map(str, values.astype(np.int64).tolist())))
@@ -0,0 +1,134 @@
+'''On-disk dataset format without pickling.
+
+   A dataset is a directory with one raw .npy file per array of the dataset schema
+       channel        (samples, subcarriers, columns)
+       block_success  (samples, MCSs, columns)
+       block_sizes    (MCSs,)
+       snrs_db        (SNRs,)
+   and a JSON manifest describing them. load_dataset memory-maps the large arrays, so slicing by sample, MCS,
+   SNR or batch only reads the pages it touches.
+
+   Usage, from the radio_data directory, to convert a dataset saved by the notebooks:
+       python -m src.dataset convert Datasets/ITU_VEHICULAR_B_5000_60kmph.npy Datasets/ITU_VEHICULAR_B_5000_60kmph
+'''
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+MANIFEST_FILENAME = 'manifest.json'
+
+'''Arrays of the dataset schema; the first two are memory-mapped on load, the others are small and read into memory'''
+MAPPED_ARRAYS = ('channel', 'block_success')
+SMALL_ARRAYS = ('block_sizes', 'snrs_db')
+
+'''Write a dataset dict with the channel / block_success / block_sizes / snrs_db schema to a dataset directory.
+   Other JSON serializable entries of the dict are stored in the manifest.
+'''
+def save_dataset(path, dataset):
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    for key in MAPPED_ARRAYS:
+        np.save(os.path.join(path, key + '.npy'), np.asarray(dataset[key]))
+
+    metadata = {key: value for key, value in dataset.items() if key not in MAPPED_ARRAYS + SMALL_ARRAYS}
+
+    write_manifest(path, dataset['block_sizes'], dataset['snrs_db'], metadata)
+
+'''Create a zero-filled array of the dataset schema in a dataset directory, memory-mapped for writing.
+   The dataset is loadable once write_manifest has described it.
+'''
+def create_mapped_array(path, key, shape, dtype):
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    return np.lib.format.open_memmap(os.path.join(path, key + '.npy'), mode='w+', dtype=dtype, shape=tuple(shape))
+
+'''Write the small arrays and the manifest of a dataset directory whose mapped arrays are on disk.
+   metadata holds the other, JSON serializable entries of the dataset.
+'''
+def write_manifest(path, block_sizes, snrs_db, metadata):
+    arrays = {}
+    for key in MAPPED_ARRAYS:
+        arrays[key] = _array_entry(key, np.load(os.path.join(path, key + '.npy'), mmap_mode='r'))
+
+    for key, values in (('block_sizes', block_sizes), ('snrs_db', snrs_db)):
+        array = np.asarray(values)
+        np.save(os.path.join(path, key + '.npy'), array)
+
+        arrays[key] = _array_entry(key, array)
+
+    _write_manifest(path, {'format_version': FORMAT_VERSION,
+                           'arrays': arrays,
+                           'block_sizes': np.asarray(block_sizes).tolist(),
+                           'snrs_db': np.asarray(snrs_db).tolist(),
+                           'metadata': metadata})
+
+'''Load a dataset as a dict with the channel / block_success / block_sizes / snrs_db schema.
+   A dataset directory is memory-mapped with the given mmap_mode ('r' by default, None reads everything into memory).
+   A pickled .npy file written by the notebooks is read completely, as np.load(path, allow_pickle=True)[()] did.
+'''
+def load_dataset(path, mmap_mode='r'):
+    if not os.path.isdir(path):
+        return np.load(path, allow_pickle=True)[()]
+
+    manifest = read_manifest(path)
+
+    dataset = dict(manifest['metadata'])
+    for key in MAPPED_ARRAYS:
+        dataset[key] = np.load(os.path.join(path, manifest['arrays'][key]['file']), mmap_mode=mmap_mode)
+    for key in SMALL_ARRAYS:
+        dataset[key] = np.load(os.path.join(path, manifest['arrays'][key]['file']))
+
+    return dataset
+
+'''Convert a pickled .npy dataset written by the notebooks into a dataset directory'''
+def convert_pickled_dataset(source, destination):
+    save_dataset(destination, np.load(source, allow_pickle=True)[()])
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILENAME)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest['format_version'] > FORMAT_VERSION:
+        raise ValueError('Dataset %s has format version %d, newer than the supported version %d'
+                         %(path, manifest['format_version'], FORMAT_VERSION))
+
+    return manifest
+
+'''Write the manifest through a temporary file, so an interrupted write never leaves a truncated manifest'''
+def _write_manifest(path, manifest):
+    temporary_filename = os.path.join(path, MANIFEST_FILENAME + '.tmp')
+    with open(temporary_filename, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    os.replace(temporary_filename, os.path.join(path, MANIFEST_FILENAME))
+
+def _array_entry(key, array):
+    return {'file': key + '.npy',
+            'shape': list(array.shape),
+            'dtype': array.dtype.str}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dataset format tools.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    convert_parser = subparsers.add_parser('convert', help='convert a pickled .npy dataset into a dataset directory')
+    convert_parser.add_argument('source')
+    convert_parser.add_argument('destination')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        convert_pickled_dataset(args.source, args.destination)
+        print('Converted %s to %s' %(args.source, args.destination))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
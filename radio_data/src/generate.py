@@ -0,0 +1,454 @@
+'''Dataset generation on the local machine.
+
+   Usage, from the radio_data directory:
+       python -m src.generate --channel-model ITU_VEHICULAR_B --relative-speed 33.33 --snrs-db 5 \
+                              --nrof-samples 1000 --nrof-batches 210 --workers 8 sim_data/sim_0001/dataset
+
+   The output is written as a memory-mappable dataset directory (see dataset.py), or as the pickled .npy file
+   the notebooks write when the output name ends in .npy.
+
+   The dataset has the schema written by the Generate_Data notebooks:
+       channel        (samples, subcarriers, columns)
+       block_success  (samples, MCSs, columns)
+       block_sizes    transport block sizes, without CRC
+       snrs_db        SNRs in dB
+   Every column has its own channel realization. Column snr_index * nrof_batches + batch_index holds batch
+   batch_index at SNR snrs_db[snr_index], so a single batch gives the Generate_Data layout (one column per SNR)
+   and a single SNR gives the Generate_Data_Batch layout (one column per batch).
+'''
+import argparse
+import concurrent.futures
+import logging
+import os
+import time
+
+import numpy as np
+
+import itpp
+
+from . import abstraction as link_abstraction, cache as simulation_cache, codec, dataset, instrumentation, pruning, single_link_bicm_ofdm, TDL_channel
+
+
+TRANSPORT_BLOCK_SIZES = [152, 200, 248, 320, 408, 504, 600, 712, 808, 936,
+                         936, 1032, 1192, 1352, 1544, 1736, 1800,
+                         1800, 1928, 2152, 2344, 2600, 2792, 2984, 3240, 3496, 3624, 3752, 4008]
+MODULATION_ORDERS     = [2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+                         4, 4, 4, 4, 4, 4, 4,
+                         6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6]
+
+CRC_SIZE = 24
+
+'''Channel realizations and codec backend of the current worker process, set once by _initialize_worker'''
+_worker_channel_coeff = None
+_worker_codec_backend = 'itpp'
+
+'''Generate a dataset, sharding (MCS, SNR, batch) work units over a local process pool.
+   Each work unit seeds itpp and numpy from its content, (seed, block size, modulation order, SNR, batch), so the
+   result does not depend on the number of workers, the chunk size or the completion order, nor on the position of
+   the MCS in the table. With nrof_workers=1 the units run in-process.
+   chunk_size is the number of work units sent to a worker at a time.
+   channel_generator selects the itpp TDL_Channel ('itpp') or the vectorized sum-of-sinusoids generator ('numpy').
+   codec_backend selects the turbo codec of the simulation, see codec.BACKENDS.
+   With an abstraction (see abstraction.py) the block success is drawn from its effective-SNR model instead of
+   being simulated; its MCS table has to be the one of the dataset.
+   With prune the MCSs of every frame are decoded by binary search per modulation order and the other outcomes are
+   inferred from monotonicity (see pruning.py). The work units are then (SNR, batch) columns, each seeded from
+   (seed, 0, 0, SNR, batch), and all MCSs of the prune_validation_fraction validation frames are decoded
+   to measure the approximation error. The pruning statistics are stored under 'pruning' in the dataset.
+   With a cache (a cache.SimulationCache) the block success of every work unit is looked up by the arguments of its
+   simulate call, i.e. the block fading channel, SNR and MCS, and its seeds and codec backend before the work units are sharded, only the missing ones
+   are simulated and their results are stored. It does not apply to pruned or abstracted generation.
+   With instrument the simulation chain is instrumented in every worker and the statistics of all workers are
+   added to those of this process, see instrumentation.py.
+'''
+def generate_dataset(channel_model='ITU_VEHICULAR_B',
+                     relative_speed=33.33,
+                     snrs_db=(5,),
+                     nrof_samples=1000,
+                     nrof_batches=1,
+                     nrof_subcarriers=72,
+                     fft_size=128,
+                     seed=0,
+                     nrof_workers=None,
+                     chunk_size=1,
+                     channel_generator='itpp',
+                     transport_block_sizes=TRANSPORT_BLOCK_SIZES,
+                     modulation_orders=MODULATION_ORDERS,
+                     instrument=False,
+                     codec_backend='itpp',
+                     abstraction=None,
+                     prune=False,
+                     prune_validation_fraction=0.0,
+                     cache=None):
+
+    if instrument:
+        instrumentation.enable()
+
+    snrs_db = list(snrs_db)
+    nrof_columns = len(snrs_db) * nrof_batches
+
+    channel_coeff = generate_channels(channel_model,
+                                      relative_speed,
+                                      nrof_samples,
+                                      nrof_columns,
+                                      nrof_subcarriers,
+                                      fft_size,
+                                      seed,
+                                      channel_generator)
+
+    if cache is not None and (prune or abstraction is not None):
+        raise ValueError('The cache applies to simulated work units only, not to pruned or abstracted generation')
+
+    mcs_table = [(block_size + CRC_SIZE, modorder) for block_size, modorder in zip(transport_block_sizes, modulation_orders)]
+    block_sizes = set(block_size for block_size, _ in mcs_table)
+
+    if abstraction is not None:
+        if abstraction.mcs_table != mcs_table:
+            raise ValueError('The MCS table of the abstraction differs from the one of the dataset')
+
+        start = time.time()
+        # A child stream of the seed, the numpy channel generator uses the seed itself
+        block_success_dataset = abstraction.generate_block_success(channel_coeff,
+                                                                   np.repeat(snrs_db, nrof_batches),
+                                                                   np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,))))
+
+        logging.info('Drew block success of %d columns with the abstraction in %0.2fs' %(nrof_columns, time.time() - start))
+
+        return {'channel': channel_coeff,
+                'block_success': block_success_dataset,
+                'block_sizes': list(transport_block_sizes),
+                'snrs_db': snrs_db}
+
+    block_success_dataset = np.zeros((nrof_samples, len(transport_block_sizes), nrof_columns))
+
+    if prune:
+        work_units = [(snr_index, batch_index, mcs_table, snrs_db[snr_index], seed, prune_validation_fraction)
+                      for snr_index in range(len(snrs_db))
+                      for batch_index in range(nrof_batches)]
+
+        start = time.time()
+        pruning_statistics = []
+        for column_index, block_success, statistics in _run(work_units, channel_coeff, block_sizes, nrof_batches, nrof_workers,
+                                                            chunk_size, codec_backend, _run_pruned_work_units):
+            block_success_dataset[:, :, column_index] = block_success
+            pruning_statistics.append(statistics)
+
+        pruning_statistics = pruning.merge_statistics(pruning_statistics)
+        logging.info('Simulated %d pruned work units in %0.2fs' %(len(work_units), time.time() - start))
+        logging.info(pruning.statistics_summary(pruning_statistics, len(mcs_table)))
+
+        return {'channel': channel_coeff,
+                'block_success': block_success_dataset,
+                'block_sizes': list(transport_block_sizes),
+                'snrs_db': snrs_db,
+                'pruning': pruning_statistics}
+
+    work_units = [(mcs_index,
+                   snr_index,
+                   batch_index,
+                   transport_block_sizes[mcs_index] + CRC_SIZE,
+                   modulation_orders[mcs_index],
+                   snrs_db[snr_index],
+                   seed)
+                  for mcs_index in range(len(transport_block_sizes))
+                  for snr_index in range(len(snrs_db))
+                  for batch_index in range(nrof_batches)]
+
+    cache_keys = {}
+    if cache is not None:
+        work_units, cache_keys = _lookup_cached_work_units(cache, work_units, channel_coeff, nrof_batches, codec_backend, block_success_dataset)
+
+    start = time.time()
+    for mcs_index, column_index, block_success in _run(work_units, channel_coeff, block_sizes, nrof_batches, nrof_workers, chunk_size, codec_backend):
+        block_success_dataset[:, mcs_index, column_index] = block_success
+
+        if cache is not None:
+            cache.put(cache_keys[(mcs_index, column_index)], block_success)
+
+    logging.info('Simulated %d work units in %0.2fs' %(len(work_units), time.time() - start))
+
+    if cache is not None:
+        logging.info(cache.summary())
+
+    return {'channel': channel_coeff,
+            'block_success': block_success_dataset,
+            'block_sizes': list(transport_block_sizes),
+            'snrs_db': snrs_db}
+
+'''Generate one channel realization per column, as (samples, subcarriers, columns)'''
+def generate_channels(channel_model,
+                      relative_speed,
+                      nrof_samples,
+                      nrof_columns,
+                      nrof_subcarriers=72,
+                      fft_size=128,
+                      seed=0,
+                      channel_generator='itpp'):
+
+    channel_coeff = np.ndarray((nrof_samples, nrof_subcarriers, nrof_columns), dtype=np.complex128)
+
+    if channel_model == 'AWGN':
+        channel_coeff[:, :, :] = 1
+        return channel_coeff
+
+    if channel_generator == 'numpy':
+        channel_response = TDL_channel.channel_frequency_response_np(fft_size,
+                                                                     relative_speed,
+                                                                     channel_model,
+                                                                     nrof_samples,
+                                                                     nrof_realizations=nrof_columns,
+                                                                     nrof_subcarriers=nrof_subcarriers,
+                                                                     rng=np.random.SeedSequence(seed))
+
+        channel_coeff[:, :, :] = np.transpose(channel_response, (1, 2, 0))
+        return channel_coeff
+
+    itpp.random.RNG_reset(int(np.random.SeedSequence(seed).generate_state(1)[0]))
+
+    for column_index in range(nrof_columns):
+        channel_response = TDL_channel.channel_frequency_response(fft_size,
+                                                                  relative_speed,
+                                                                  channel_model,
+                                                                  nrof_samples)
+
+        channel_coeff[:, :, column_index] = channel_response.T().to_numpy_ndarray()[:, :nrof_subcarriers]
+
+    return channel_coeff
+
+'''Fill the block success of the work units found in the cache into block_success_dataset. Returns the work units
+   still to simulate and their cache keys by (MCS index, column index).
+'''
+def _lookup_cached_work_units(cache, work_units, channel_coeff, nrof_batches, codec_backend, block_success_dataset):
+    # Key the channel as passed to simulate, so that the layout of the column is part of the key
+    channel_digests = [simulation_cache.channel_digest(single_link_bicm_ofdm.block_fading_channel(channel_coeff[:, :, column_index]))
+                       for column_index in range(channel_coeff.shape[2])]
+
+    missing_work_units = []
+    cache_keys = {}
+    for work_unit in work_units:
+        mcs_index, snr_index, batch_index, block_size, modorder, snr_db, seed = work_unit
+        column_index = snr_index * nrof_batches + batch_index
+
+        key = cache.key(channel_digests[column_index],
+                        snr_db,
+                        block_size,
+                        modorder,
+                        work_unit_seeds(seed, block_size, modorder, snr_db, batch_index),
+                        codec_backend)
+
+        block_success = cache.get(key)
+        if block_success is None:
+            missing_work_units.append(work_unit)
+            cache_keys[(mcs_index, column_index)] = key
+        else:
+            block_success_dataset[:, mcs_index, column_index] = block_success
+
+    logging.info('Found %d of %d work units in the cache' %(len(work_units) - len(missing_work_units), len(work_units)))
+
+    return (missing_work_units, cache_keys)
+
+'''Yield the results of every work unit as they come in: (MCS index, column index, block success) of
+   _run_work_units, or (column index, block success, pruning statistics) of _run_pruned_work_units
+'''
+def _run(work_units, channel_coeff, block_sizes, nrof_batches, nrof_workers, chunk_size, codec_backend='itpp', run_work_units=None):
+    if run_work_units is None:
+        run_work_units = _run_work_units
+
+    chunks = [work_units[i:i + chunk_size] for i in range(0, len(work_units), chunk_size)]
+
+    if nrof_workers == 1:
+        _initialize_worker(channel_coeff, block_sizes, codec_backend=codec_backend)
+        for chunk in chunks:
+            for result in run_work_units(chunk, nrof_batches):
+                yield result
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nrof_workers,
+                                                initializer=_initialize_worker,
+                                                initargs=(channel_coeff, block_sizes, instrumentation.is_enabled(), codec_backend)) as executor:
+
+        futures = [executor.submit(_run_worker_chunk, chunk, nrof_batches, run_work_units) for chunk in chunks]
+
+        try:
+            for nrof_completed, future in enumerate(concurrent.futures.as_completed(futures)):
+                results, statistics = future.result()
+                if statistics is not None:
+                    instrumentation.absorb(statistics)
+
+                for result in results:
+                    yield result
+
+                logging.info('Completed %d of %d chunks' %(nrof_completed + 1, len(futures)))
+        except (GeneratorExit, KeyboardInterrupt):
+            # Do not wait for the chunks that have not started when the results are abandoned
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+'''Store the channel realizations in the worker once and build the turbo codecs before the first work unit'''
+def _initialize_worker(channel_coeff, block_sizes, instrument=False, codec_backend='itpp'):
+    global _worker_channel_coeff, _worker_codec_backend
+    _worker_channel_coeff = channel_coeff
+    _worker_codec_backend = codec_backend
+
+    if codec_backend == 'numpy':
+        for block_size in block_sizes:
+            codec.get_numpy_turbo_code(block_size)
+    else:
+        codec.prepare_turbo_codecs(block_sizes)
+
+    if instrument:
+        instrumentation.enable()
+
+'''Run a chunk in a worker process, returning its results and the instrumentation statistics of the chunk'''
+def _run_worker_chunk(work_units, nrof_batches, run_work_units):
+    results = run_work_units(work_units, nrof_batches)
+
+    return (results, instrumentation.drain() if instrumentation.is_enabled() else None)
+
+def _run_work_units(work_units, nrof_batches):
+    results = []
+    for mcs_index, snr_index, batch_index, block_size, modorder, snr_db, seed in work_units:
+        column_index = snr_index * nrof_batches + batch_index
+
+        seed_work_unit(seed, block_size, modorder, snr_db, batch_index)
+
+        results.append((mcs_index, column_index, _simulate_column(column_index, block_size, modorder, snr_db)))
+
+    return results
+
+'''Run work units (MCS index, column index, block size, modulation order, SNR, seed key) of explicit columns,
+   seeded from (seed key[0], block size, modulation order, SNR, seed key[1]), see checkpoint.py
+'''
+def _run_column_work_units(work_units, nrof_batches):
+    results = []
+    for mcs_index, column_index, block_size, modorder, snr_db, seed_key in work_units:
+        seed_work_unit(seed_key[0], block_size, modorder, snr_db, seed_key[1])
+
+        results.append((mcs_index, column_index, _simulate_column(column_index, block_size, modorder, snr_db)))
+
+    return results
+
+'''Block success of the frames of one column of the worker's channel realizations'''
+def _simulate_column(column_index, block_size, modorder, snr_db):
+    channel_coeff = _worker_channel_coeff[:, :, column_index]
+    nrof_subcarriers = channel_coeff.shape[1]
+    channel_block_fading = single_link_bicm_ofdm.block_fading_channel(channel_coeff)
+
+    _, block_success = single_link_bicm_ofdm.simulate(block_size,
+                                                      modorder,
+                                                      nrof_subcarriers,
+                                                      snr_db,
+                                                      channel_block_fading,
+                                                      codec_backend=_worker_codec_backend)
+
+    return block_success
+
+def _run_pruned_work_units(work_units, nrof_batches):
+    results = []
+    for snr_index, batch_index, mcs_table, snr_db, seed, validation_fraction in work_units:
+        column_index = snr_index * nrof_batches + batch_index
+
+        # Block size and modulation order 0 stand for all MCSs of the column
+        seed_work_unit(seed, 0, 0, snr_db, batch_index)
+
+        channel_block_fading = single_link_bicm_ofdm.block_fading_channel(_worker_channel_coeff[:, :, column_index])
+
+        block_success, statistics = pruning.simulate_pruned(channel_block_fading,
+                                                            snr_db,
+                                                            mcs_table,
+                                                            validation_fraction,
+                                                            codec_backend=_worker_codec_backend)
+
+        results.append((column_index, block_success, statistics))
+
+    return results
+
+'''The itpp and numpy seeds of one work unit, derived from its content rather than from its position in the MCS
+   and SNR tables, so adding an MCS or an SNR leaves the seeds of the other work units unchanged
+'''
+def work_unit_seeds(seed, block_size, modorder, snr_db, batch_index):
+    # The SNR enters through the bits of its float64 representation
+    snr_key = int(np.float64(snr_db).view(np.uint64))
+
+    return np.random.SeedSequence([seed, int(block_size), int(modorder), snr_key, int(batch_index)]).generate_state(2)
+
+'''Seed the itpp and numpy generators deterministically for one work unit'''
+def seed_work_unit(seed, block_size, modorder, snr_db, batch_index):
+    itpp_seed, numpy_seed = work_unit_seeds(seed, block_size, modorder, snr_db, batch_index)
+
+    itpp.random.RNG_reset(int(itpp_seed))
+    np.random.seed(int(numpy_seed))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a link adaptation dataset on the local machine.')
+    parser.add_argument('output', help='dataset directory to write, or a pickled .npy file if the name ends in .npy')
+    parser.add_argument('--channel-model', default='ITU_VEHICULAR_B',
+                        choices=['ITU_PEDESTRIAN_A', 'ITU_PEDESTRIAN_B', 'ITU_VEHICULAR_A', 'ITU_VEHICULAR_B', 'AWGN'])
+    parser.add_argument('--relative-speed', type=float, default=33.33, help='relative speed in m/s')
+    parser.add_argument('--snrs-db', type=float, nargs='+', default=[5])
+    parser.add_argument('--nrof-samples', type=int, default=1000)
+    parser.add_argument('--nrof-batches', type=int, default=1)
+    parser.add_argument('--nrof-subcarriers', type=int, default=72)
+    parser.add_argument('--fft-size', type=int, default=128)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=1, help='work units sent to a worker at a time')
+    parser.add_argument('--channel-generator', default='itpp', choices=['itpp', 'numpy'])
+    codec.add_backend_arguments(parser)
+    parser.add_argument('--prune', action='store_true', help='decode MCSs by binary search per modulation order and infer the rest')
+    parser.add_argument('--prune-validation-fraction', type=float, default=0.0,
+                        help='fraction of frames decoded at all MCSs to measure the pruning error')
+    parser.add_argument('--abstraction', help='draw block success from this calibrated abstraction (.npz) instead of simulating')
+    parser.add_argument('--cache', help='look up and store the block success of work units in this cache directory')
+    parser.add_argument('--cache-max-mb', type=float, default=simulation_cache.DEFAULT_MAX_BYTES / 1e6,
+                        help='evict the least recently used cache entries beyond this size')
+    parser.add_argument('--instrument', action='store_true', help='print per-stage timings of the simulation chain')
+    parser.add_argument('--instrumentation-json', help='also write the per-stage timings to this JSON file')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    codec_backend = codec.backend_argument(parser, args)
+
+    cache = simulation_cache.SimulationCache(args.cache, max_bytes=int(args.cache_max_mb * 1e6)) if args.cache else None
+
+    generated_dataset = generate_dataset(channel_model=args.channel_model,
+                               relative_speed=args.relative_speed,
+                               snrs_db=args.snrs_db,
+                               nrof_samples=args.nrof_samples,
+                               nrof_batches=args.nrof_batches,
+                               nrof_subcarriers=args.nrof_subcarriers,
+                               fft_size=args.fft_size,
+                               seed=args.seed,
+                               nrof_workers=args.workers,
+                               chunk_size=args.chunk_size,
+                               channel_generator=args.channel_generator,
+                               instrument=args.instrument or args.instrumentation_json is not None,
+                               codec_backend=codec_backend,
+                               abstraction=link_abstraction.load_abstraction(args.abstraction) if args.abstraction else None,
+                               prune=args.prune,
+                               prune_validation_fraction=args.prune_validation_fraction,
+                               cache=cache)
+
+    if args.output.endswith('.npy'):
+        data_filepath = os.path.dirname(args.output)
+        if data_filepath and not os.path.exists(data_filepath):
+            os.makedirs(data_filepath)
+
+        np.save(args.output, generated_dataset)
+    else:
+        dataset.save_dataset(args.output, generated_dataset)
+
+    print('Saved generated dataset to %s' %(args.output))
+
+    if cache is not None:
+        print(cache.summary())
+
+    if instrumentation.is_enabled():
+        print(instrumentation.summary_table())
+
+        if args.instrumentation_json:
+            instrumentation.save_json(args.instrumentation_json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+'''Optional per-stage instrumentation of the simulation chain.
+
+   The codec, modem, ofdm and single_link_bicm_ofdm functions report their wall time, number of calls and number of
+   bits processed per stage, and the decoder its number of iterations, e.g.
+
+       from src import instrumentation
+       instrumentation.enable()
+       single_link_bicm_ofdm.simulate_all_mcs(...)
+       print(instrumentation.summary_table())
+
+   Instrumentation is off by default. Then stage() returns a shared no-op context manager and count() returns at
+   once, so the hooks only cost a global flag check.
+
+   The statistics are per process. Worker processes return snapshot() / drain() and the parent adds them with
+   absorb(), see generate.py. Stages do not nest, except the 'simulate' stage which covers a whole
+   simulate / simulate_all_mcs call and is used as the total in the summary.
+'''
+import functools
+import json
+import time
+
+
+TOTAL_STAGE = 'simulate'
+
+_enabled = False
+
+'''stage name -> [seconds, calls, bits]'''
+_stages = {}
+
+'''counter name -> value'''
+_counters = {}
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+
+class _NullTimer(object):
+    '''Context manager that does nothing, returned by stage() when instrumentation is off'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer(object):
+    '''Adds the wall time of the with block, one call and the given bits to a stage'''
+    __slots__ = ('name', 'bits', 'start')
+
+    def __init__(self, name, bits):
+        self.name = name
+        self.bits = bits
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+
+        statistics = _stages.get(self.name)
+        if statistics is None:
+            statistics = _stages[self.name] = [0.0, 0, 0]
+
+        statistics[0] += seconds
+        statistics[1] += 1
+        statistics[2] += int(self.bits)
+        return False
+
+'''Time a with block as one call of the named stage, processing the given number of bits'''
+def stage(name, bits=0):
+    if not _enabled:
+        return _NULL_TIMER
+
+    return _StageTimer(name, bits)
+
+'''Decorator timing every call of a function as one call of the named stage'''
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            with _StageTimer(name, 0):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+'''Add value to the named counter, e.g. decoder iterations'''
+def count(name, value=1):
+    if not _enabled:
+        return
+
+    _counters[name] = _counters.get(name, 0) + int(value)
+
+'''JSON serializable copy of the statistics of this process'''
+def snapshot():
+    return {'stages': {name: {'seconds': seconds, 'calls': calls, 'bits': bits}
+                       for name, (seconds, calls, bits) in _stages.items()},
+            'counters': dict(_counters)}
+
+'''Snapshot and reset, e.g. at the end of a work unit in a worker process'''
+def drain():
+    statistics = snapshot()
+    reset()
+
+    return statistics
+
+'''Sum snapshots, e.g. of all worker processes'''
+def merge(snapshots):
+    merged = {'stages': {}, 'counters': {}}
+    for statistics in snapshots:
+        for name, stage_statistics in statistics['stages'].items():
+            merged_stage = merged['stages'].setdefault(name, {'seconds': 0.0, 'calls': 0, 'bits': 0})
+            for key in merged_stage:
+                merged_stage[key] += stage_statistics[key]
+
+        for name, value in statistics['counters'].items():
+            merged['counters'][name] = merged['counters'].get(name, 0) + value
+
+    return merged
+
+'''Add a snapshot, e.g. returned by a worker process, to the statistics of this process'''
+def absorb(statistics):
+    for name, stage_statistics in statistics['stages'].items():
+        current = _stages.setdefault(name, [0.0, 0, 0])
+        current[0] += stage_statistics['seconds']
+        current[1] += stage_statistics['calls']
+        current[2] += stage_statistics['bits']
+
+    for name, value in statistics['counters'].items():
+        _counters[name] = _counters.get(name, 0) + value
+
+'''Summary table of a snapshot (by default of this process), stages sorted by time.
+   The share column is relative to the 'simulate' total when it was recorded, otherwise to the sum of all stages.
+'''
+def summary_table(statistics=None):
+    if statistics is None:
+        statistics = snapshot()
+
+    stages = statistics['stages']
+    if TOTAL_STAGE in stages:
+        total_seconds = stages[TOTAL_STAGE]['seconds']
+    else:
+        total_seconds = sum(stage_statistics['seconds'] for stage_statistics in stages.values())
+
+    lines = ['%-16s %10s %12s %8s %14s %12s' %('stage', 'calls', 'seconds', 'share', 'bits', 'Mbit/s')]
+    for name, stage_statistics in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        seconds = stage_statistics['seconds']
+        bits = stage_statistics['bits']
+
+        lines.append('%-16s %10d %12.4f %7.1f%% %14s %12s' %(name,
+                                                             stage_statistics['calls'],
+                                                             seconds,
+                                                             100.0 * seconds / total_seconds if total_seconds > 0 else 0.0,
+                                                             bits if bits else '-',
+                                                             '%0.2f' %(1e-6 * bits / seconds) if bits and seconds > 0 else '-'))
+
+    for name, value in sorted(statistics['counters'].items()):
+        lines.append('%-16s %10d' %(name, value))
+
+    return '\n'.join(lines)
+
+'''Write a snapshot (by default of this process) as JSON'''
+def save_json(path, statistics=None):
+    if statistics is None:
+        statistics = snapshot()
+
+    with open(path, 'w') as statistics_file:
+        json.dump(statistics, statistics_file, indent=2)
@@ -1,23 +1,106 @@
+import functools
+
+import numpy as np
+
 from itpp import cvec, ivec
 from itpp.comm import QAM, modulator_2d, Soft_Method
 
-'''Create and return 2D modulator instance'''    
+from . import conversion, instrumentation
+
+'''Number of symbols demodulated per chunk by the numpy demodulator, bounds the (symbols x constellation points) metric array'''
+DEMODULATION_CHUNK_SIZE = 16384
+
+'''Create and return 2D modulator instance'''
 def modulate_bits(modulation_order, bits):
-    symbols, bits2symbols = _constellation(modulation_order)
-    modulator_ = modulator_2d(symbols, bits2symbols)
-    
-    return modulator_.modulate_bits(bits)
+    with instrumentation.stage('modulate', bits.length()):
+        return _modulator(modulation_order).modulate_bits(bits)
 
-'''Create and return 2D demodulator instance'''    
+'''Create and return 2D demodulator instance'''
 def demodulate_soft_values(modulation_order, noise_variance, soft_values):
+    with instrumentation.stage('demodulate', soft_values.length() * modulation_order):
+        return _modulator(modulation_order).demodulate_soft_bits(soft_values, noise_variance, Soft_Method.LOGMAP)
+
+'''Map a numpy bit array onto constellation symbols, with the same bit labelling as modulate_bits'''
+def modulate_bits_np(modulation_order, bits):
+    points, label_bits = constellation_np(modulation_order)
+
+    with instrumentation.stage('modulate', bits.size):
+        bit_groups = np.reshape(bits[:int(bits.size / modulation_order) * modulation_order], (-1, modulation_order))
+        labels = np.dot(bit_groups.astype(np.int64), 1 << np.arange(modulation_order - 1, -1, -1))
+
+        return points[labels]
+
+'''Soft demodulate a numpy symbol stream into bit LLRs log(P(b=0)/P(b=1)), ordered as in demodulate_soft_values.
+   method is 'logmap' (exact, same metric as itpp Soft_Method.LOGMAP) or 'maxlog'.
+   noise_variance is the complex noise variance, either a scalar or one value per symbol (e.g. the post-equalization
+   noise variance of each symbol). The symbols are processed in chunks of chunk_size, each as one broadcasted
+   (symbols x constellation points) operation.
+'''
+def demodulate_soft_values_np(modulation_order, noise_variance, symbols, method='logmap', chunk_size=DEMODULATION_CHUNK_SIZE):
+    points, label_bits = constellation_np(modulation_order)
+    zero_indices, one_indices = _label_partition(modulation_order)
+
+    if method == 'logmap':
+        reduce_metric = _log_sum_exp
+    elif method == 'maxlog':
+        reduce_metric = functools.partial(np.max, axis=-1)
+    else:
+        raise ValueError('Unknown soft demodulation method: ' + str(method))
+
+    symbols = np.reshape(symbols, -1)
+    noise_variance = np.broadcast_to(noise_variance, symbols.shape)
+
+    soft_values = np.empty((symbols.size, modulation_order))
+    with instrumentation.stage('demodulate', soft_values.size):
+        for start in range(0, symbols.size, chunk_size):
+            stop = min(start + chunk_size, symbols.size)
+
+            metric = np.abs(symbols[start:stop, np.newaxis] - points) ** 2
+            metric /= -noise_variance[start:stop, np.newaxis]
+
+            soft_values[start:stop] = reduce_metric(metric[:, zero_indices]) - reduce_metric(metric[:, one_indices])
+
+    return np.reshape(soft_values, -1)
+
+'''Cached numpy copy of the constellation: the symbol for every bit label and the (labels x bits) label bits, MSB first'''
+@functools.lru_cache(maxsize=None)
+def constellation_np(modulation_order):
     symbols, bits2symbols = _constellation(modulation_order)
-    modulator_ = modulator_2d(symbols, bits2symbols)
-    
-    return modulator_.demodulate_soft_bits(soft_values, noise_variance, Soft_Method.LOGMAP)
+
+    points = conversion.to_numpy(symbols)[conversion.to_numpy(bits2symbols)]
+
+    labels = np.arange(2 ** modulation_order)
+    label_bits = (labels[:, np.newaxis] >> np.arange(modulation_order - 1, -1, -1)) & 1
+
+    return (points, label_bits)
+
+'''Per bit position, the labels whose bit is 0 and the labels whose bit is 1, as (bits x labels / 2) index arrays'''
+@functools.lru_cache(maxsize=None)
+def _label_partition(modulation_order):
+    _, label_bits = constellation_np(modulation_order)
+
+    zero_indices = np.array([np.flatnonzero(label_bits[:, k] == 0) for k in range(modulation_order)])
+    one_indices = np.array([np.flatnonzero(label_bits[:, k] == 1) for k in range(modulation_order)])
+
+    return (zero_indices, one_indices)
+
+'''Numerically stable log(sum(exp(x))) over the last axis'''
+def _log_sum_exp(x):
+    x_max = np.max(x, axis=-1)
+
+    return x_max + np.log(np.sum(np.exp(x - x_max[..., np.newaxis]), axis=-1))
+
+'''Cached 2D modulator per modulation order'''
+@functools.lru_cache(maxsize=None)
+def _modulator(modulation_order):
+    symbols, bits2symbols = _constellation(modulation_order)
+
+    return modulator_2d(symbols, bits2symbols)
 
 '''2D constellations for complex signals'''
 def _constellation(modulation_order):
-    symbols = QAM(2 ** modulation_order).get_symbols()
-    bits2symbols = QAM(2 ** modulation_order).get_bits2symbols()
+    qam = QAM(2 ** modulation_order)
+    symbols = qam.get_symbols()
+    bits2symbols = qam.get_bits2symbols()
 
-    return (symbols, bits2symbols)
\ No newline at end of file
+    return (symbols, bits2symbols)
@@ -1,41 +1,68 @@
 # COPYRIGHT_NOTICE
 
-from itpp.signal import ifft, fft
-from itpp import cmat
-from itpp import cvec
+import numpy as np
 
+from . import conversion, instrumentation
+
+'''Multiplex an itpp cvec of constellation symbols into an itpp cmat with one column per frame.
+   Thin adapter around multiplex_symbols_np.
+'''
 def multiplex_symbols(nrof_ofdm_symbols_per_frame,
                       nrof_subcarriers,
                       constellation_symbols):
     
-    nrof_frames = int(constellation_symbols.length() / (nrof_subcarriers * nrof_ofdm_symbols_per_frame))
-    frame_symbols = cmat(nrof_subcarriers * nrof_ofdm_symbols_per_frame, nrof_frames)
-    frame_symbols.clear()
-    
-    # Pre-allocate vector to store frame symbols for efficiency
-    current_frame_symbols = cvec(nrof_subcarriers * nrof_ofdm_symbols_per_frame)
-    for frame_index in range(nrof_frames):
-        current_frame_symbols.clear()
-        for ofdm_symbol_index in range(nrof_ofdm_symbols_per_frame):
-            read_index = frame_index * nrof_subcarriers * nrof_ofdm_symbols_per_frame + ofdm_symbol_index * nrof_subcarriers
-            current_frame_symbols.set_subvector(ofdm_symbol_index * nrof_subcarriers, (nrof_subcarriers ** 0.5) * ifft(constellation_symbols.mid(read_index, nrof_subcarriers)))
-            
-        frame_symbols.set_col(frame_index, current_frame_symbols)
+    frame_symbols = multiplex_symbols_np(nrof_ofdm_symbols_per_frame,
+                                         nrof_subcarriers,
+                                         conversion.to_numpy(constellation_symbols))
         
-    return frame_symbols
+    return conversion.to_mat(frame_symbols)
         
         
+'''De-multiplex an itpp cmat with one column per frame into an itpp cvec of constellation symbols.
+   Thin adapter around de_multiplex_symbols_np.
+'''
 def de_multiplex_symbols(nrof_ofdm_symbols_per_frame,
                          nrof_subcarriers,
                          frame_symbols):
     
-    nrof_frames = frame_symbols.cols()
-    constellation_symbols = cvec(nrof_subcarriers * nrof_ofdm_symbols_per_frame * nrof_frames)
-    constellation_symbols.clear()
-    
-    for frame_index in range(nrof_frames):
-        for ofdm_symbol_index in range(nrof_ofdm_symbols_per_frame):
-            write_index = frame_index * nrof_subcarriers * nrof_ofdm_symbols_per_frame + ofdm_symbol_index * nrof_subcarriers
-            constellation_symbols.set_subvector(write_index, (1.0 / (nrof_subcarriers ** 0.5)) * fft(frame_symbols.get_col(frame_index).mid(ofdm_symbol_index * nrof_subcarriers, nrof_subcarriers)))
+    constellation_symbols = de_multiplex_symbols_np(nrof_ofdm_symbols_per_frame,
+                                                    nrof_subcarriers,
+                                                    conversion.to_numpy(frame_symbols))
             
-    return constellation_symbols
+    return conversion.to_vec(constellation_symbols)
+
+'''Multiplex a numpy stream of constellation symbols into OFDM frames.
+   The stream is viewed as a (frames, symbols, subcarriers) array and a single batched IFFT is taken along 
+   the subcarrier axis. The unitary scaling matches sqrt(N) * itpp.signal.ifft. 
+   The result has the same layout as the itpp version, i.e. (subcarriers * symbols, frames).
+'''
+@instrumentation.timed('ofdm_multiplex')
+def multiplex_symbols_np(nrof_ofdm_symbols_per_frame,
+                         nrof_subcarriers,
+                         constellation_symbols):
+
+    frame_size = nrof_subcarriers * nrof_ofdm_symbols_per_frame
+    nrof_frames = int(constellation_symbols.size / frame_size)
+
+    ofdm_symbols = np.reshape(constellation_symbols[:nrof_frames * frame_size], 
+                              (nrof_frames, nrof_ofdm_symbols_per_frame, nrof_subcarriers))
+    
+    frame_symbols = np.fft.ifft(ofdm_symbols, axis=-1, norm='ortho')
+
+    return np.reshape(frame_symbols, (nrof_frames, frame_size)).T
+
+'''De-multiplex numpy OFDM frames of layout (subcarriers * symbols, frames) into a flat stream of constellation symbols.
+   A single batched FFT is taken along the subcarrier axis. The unitary scaling matches itpp.signal.fft / sqrt(N).
+'''
+@instrumentation.timed('ofdm_demultiplex')
+def de_multiplex_symbols_np(nrof_ofdm_symbols_per_frame,
+                            nrof_subcarriers,
+                            frame_symbols):
+
+    nrof_frames = frame_symbols.shape[1]
+
+    ofdm_symbols = np.reshape(frame_symbols.T, (nrof_frames, nrof_ofdm_symbols_per_frame, nrof_subcarriers))
+
+    constellation_symbols = np.fft.fft(ofdm_symbols, axis=-1, norm='ortho')
+
+    return np.reshape(constellation_symbols, -1)
@@ -0,0 +1,179 @@
+'''Monotone MCS pruning of block success generation.
+
+   For a given frame and SNR, block success is almost always monotone in the MCS within a modulation order: if an
+   MCS fails, every MCS of the same order with a larger transport block fails as well, and if it succeeds, every
+   smaller one succeeds. Instead of decoding all MCSs of a frame, the largest successful MCS of every modulation
+   order is found by a binary search over its MCSs sorted by block size, and the other outcomes are inferred.
+   That decodes about log2(MCSs per order) instead of all MCSs per order and frame.
+
+   Every search step decodes the middle MCS of the remaining interval of each frame, and all frames that need the
+   same MCS are simulated together with single_link_bicm_ofdm.simulate on their columns of the channel.
+
+   The inference is exact only where block success is monotone. On a validation subset of the frames all MCSs are
+   decoded: those outcomes are stored as decoded, monotonicity violations are counted, and the binary search is
+   replayed on the decoded outcomes to count the entries the pruning would have inferred wrongly.
+'''
+import numpy as np
+
+from . import single_link_bicm_ofdm
+
+
+'''MCS indices per modulation order, sorted by block size, as a list of arrays'''
+def monotone_groups(mcs_table):
+    groups = []
+    for modorder in sorted(set(modorder for _, modorder in mcs_table)):
+        mcs_indices = [mcs_index for mcs_index, (_, mcs_modorder) in enumerate(mcs_table) if mcs_modorder == modorder]
+        groups.append(np.array(sorted(mcs_indices, key=lambda mcs_index: mcs_table[mcs_index][0])))
+
+    return groups
+
+'''Block success (frames, MCSs) of nrof_frames frames by binary search per modulation order.
+   decode(mcs_index, frame_indices) returns the block success of the MCS for the given frames as a boolean array.
+   Returns the block success as uint8 and the number of decoded (frame, MCS) pairs.
+'''
+def infer_block_success(nrof_frames, mcs_table, decode):
+    block_success = np.zeros((nrof_frames, len(mcs_table)), dtype=np.uint8)
+    nrof_decodes = 0
+
+    for group in monotone_groups(mcs_table):
+        # Positions below lower are known to succeed and positions from upper on are known to fail
+        lower = np.zeros(nrof_frames, dtype=np.int64)
+        upper = np.full(nrof_frames, group.size, dtype=np.int64)
+
+        undecided = lower < upper
+        while np.any(undecided):
+            middle = (lower + upper) // 2
+
+            for position in np.unique(middle[undecided]):
+                frame_indices = np.flatnonzero(undecided & (middle == position))
+
+                success = decode(group[position], frame_indices)
+                nrof_decodes += frame_indices.size
+
+                lower[frame_indices[success]] = position + 1
+                upper[frame_indices[~success]] = position
+
+            undecided = lower < upper
+
+        block_success[:, group] = np.arange(group.size) < lower[:, np.newaxis]
+
+    return (block_success, nrof_decodes)
+
+'''Number of monotonicity violations per frame of decoded block success (frames, MCSs): pairs of MCSs of the same
+   modulation order where the one with the larger block succeeds and the one with the smaller block fails
+'''
+def monotonicity_violations(block_success, mcs_table):
+    violations = np.zeros(block_success.shape[0], dtype=np.int64)
+
+    for group in monotone_groups(mcs_table):
+        failures = block_success[:, group] == 0
+        successes = block_success[:, group] != 0
+
+        # Failures at or below each position, paired with a success at the position
+        failures_below = np.cumsum(failures, axis=1)
+        violations += np.sum(successes * failures_below, axis=1)
+
+    return violations
+
+'''Evenly spaced validation frames, a fraction of nrof_frames'''
+def validation_frames(nrof_frames, validation_fraction):
+    nrof_validation_frames = int(np.ceil(validation_fraction * nrof_frames))
+    if nrof_validation_frames == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.unique(np.linspace(0, nrof_frames - 1, nrof_validation_frames).astype(np.int64))
+
+'''Block success (frames, MCSs) of the block fading channel (subcarriers * 12, frames) at snr_db with monotone
+   pruning. All MCSs of the validation_fraction validation frames are decoded. Returns the block success and the
+   pruning statistics of the call.
+'''
+def simulate_pruned(channel_coeff_freq_domain_np, snr_db, mcs_table, validation_fraction=0.0, codec_backend='itpp'):
+    nrof_rows, nrof_frames = channel_coeff_freq_domain_np.shape
+    nrof_subcarriers = int(nrof_rows / single_link_bicm_ofdm.NROF_SUBFRAME_OFDM_SYMBOLS)
+
+    block_success = np.zeros((nrof_frames, len(mcs_table)), dtype=np.uint8)
+
+    validation = validation_frames(nrof_frames, validation_fraction)
+    pruned = np.setdiff1d(np.arange(nrof_frames), validation)
+
+    def decode(mcs_index, frame_indices):
+        block_size, modorder = mcs_table[mcs_index]
+        _, success = single_link_bicm_ofdm.simulate(block_size,
+                                                    modorder,
+                                                    nrof_subcarriers,
+                                                    snr_db,
+                                                    channel_coeff_freq_domain_np[:, pruned[frame_indices]],
+                                                    codec_backend=codec_backend)
+        return success != 0
+
+    block_success[pruned], nrof_decodes = infer_block_success(pruned.size, mcs_table, decode)
+
+    # The validation frames are decoded at all MCSs, which counts in decodes as well as in full_decodes
+    nrof_validation_decodes = validation.size * len(mcs_table)
+
+    statistics = {'frames': int(nrof_frames),
+                  'decodes': int(nrof_decodes + nrof_validation_decodes),
+                  'full_decodes': int(nrof_frames * len(mcs_table)),
+                  'validation_frames': int(validation.size),
+                  'validation_decodes': int(nrof_validation_decodes),
+                  'validation_violations': 0,
+                  'validation_violating_frames': 0,
+                  'validation_mismatches': 0,
+                  'validation_pruned_decodes': 0}
+
+    if validation.size > 0:
+        _, decoded = single_link_bicm_ofdm.simulate_all_mcs(channel_coeff_freq_domain_np[:, validation],
+                                                            snr_db,
+                                                            mcs_table,
+                                                            codec_backend=codec_backend)
+        block_success[validation] = decoded
+
+        violations = monotonicity_violations(decoded, mcs_table)
+
+        # The binary search replayed on the decoded outcomes
+        inferred, nrof_validation_pruned_decodes = infer_block_success(validation.size,
+                                                                mcs_table,
+                                                                lambda mcs_index, frame_indices: decoded[frame_indices, mcs_index] != 0)
+
+        statistics.update({'validation_violations': int(np.sum(violations)),
+                           'validation_violating_frames': int(np.count_nonzero(violations)),
+                           'validation_mismatches': int(np.count_nonzero(inferred != decoded)),
+                           'validation_pruned_decodes': int(nrof_validation_pruned_decodes)})
+
+    return (block_success, statistics)
+
+'''Sum pruning statistics, e.g. of all work units'''
+def merge_statistics(statistics_list):
+    merged = {}
+    for statistics in statistics_list:
+        for key, value in statistics.items():
+            merged[key] = merged.get(key, 0) + value
+
+    return merged
+
+'''One-line summary of pruning statistics: decodes saved, in total and on the pruned frames alone, and the
+   approximation error on the validation frames
+'''
+def statistics_summary(statistics, nrof_mcss):
+    pruned_decodes = statistics['decodes'] - statistics['validation_decodes']
+    pruned_full_decodes = statistics['full_decodes'] - statistics['validation_decodes']
+
+    summary = ('Decoded %d of %d (frame, MCS) pairs (%0.1f%%), %d of %d on the pruned frames (%0.1f%%)'
+               %(statistics['decodes'],
+                 statistics['full_decodes'],
+                 100.0 * statistics['decodes'] / max(statistics['full_decodes'], 1),
+                 pruned_decodes,
+                 pruned_full_decodes,
+                 100.0 * pruned_decodes / max(pruned_full_decodes, 1)))
+
+    nrof_validation_entries = statistics['validation_frames'] * nrof_mcss
+    if nrof_validation_entries > 0:
+        summary += ('; validation: %d frames, %d violating frames, %d violating pairs, '
+                    '%d of %d outcomes inferred wrongly (%0.3f%%)' %(statistics['validation_frames'],
+                                                                     statistics['validation_violating_frames'],
+                                                                     statistics['validation_violations'],
+                                                                     statistics['validation_mismatches'],
+                                                                     nrof_validation_entries,
+                                                                     100.0 * statistics['validation_mismatches'] / nrof_validation_entries))
+
+    return summary
@@ -1,117 +1,338 @@
+import collections
 import logging
 import numpy as np
 
 import itpp
 
-from . import codec, modem, ofdm
+from . import codec, conversion, instrumentation, modem, ofdm
 
 
+NROF_SUBFRAME_OFDM_SYMBOLS = 12
+
+'''State of the transmitter chain that the receiver needs to undo it'''
+_Transmission = collections.namedtuple('_Transmission', ['transport_block_size',
+                                                         'modorder',
+                                                         'info_bits_uncoded',
+                                                         'encoded_block_size',
+                                                         'transmit_block_size',
+                                                         'interleaver_double',
+                                                         'interleaver_sequence',
+                                                         'codec_backend',
+                                                         'symbols'])
+
 '''Simulate block transmission and reception over a single link and given channel coefficients and configuration parameters.
    The transmission steps are:
    1. Generate random info bits
    2. Encode info bits
    3. Interleave encoded bits
+
+   snr_db may be a scalar or a sequence of SNRs. The transmitter chain up to the channel does not depend on the SNR
+   and runs once; only noise addition and the receiver chain are repeated per SNR. With common_random_numbers the
+   same unit-variance noise realization is scaled to every SNR, which lowers the variance of BLER-vs-SNR curves.
+
+   With per_symbol_noise_variance the demodulator uses the post-equalization noise variance of every symbol
+   instead of the scalar receiver noise variance. Only the numpy demodulator supports this.
+
+   codec_backend selects the turbo codec, see codec.BACKENDS. The default 'itpp' backend runs the itpp interleaver,
+   modulator_2d and its LOGMAP demodulator as before. The 'numpy' backend encodes and decodes all frames at once and
+   also keeps the interleaving and the (de)modulation in numpy (modem.modulate_bits_np, demodulate_soft_values_np).
+
+   For a scalar SNR (bler, block_success) is returned as before. For a sequence of SNRs bler has one entry per SNR
+   and block_success has shape (frames, SNRs).
 '''
-def simulate(transport_block_size, 
+@instrumentation.timed(instrumentation.TOTAL_STAGE)
+def simulate(transport_block_size,
              modorder,
              nrof_subcarriers,
-             snr_db, 
-             channel_coeff_freq_domain_np):
+             snr_db,
+             channel_coeff_freq_domain_np,
+             common_random_numbers=False,
+             per_symbol_noise_variance=False,
+             codec_backend='itpp'):
 
     #channel_coeff_freq_domain_str = ';'.join([' '.join([str(c).replace('j','i').replace('(','').replace(')','') for c in r]) for r in channel_coeff_freq_domain_np])
     #channel_coeff_freq_domain = itpp.cmat(channel_coeff_freq_domain_str)
-    
-    channel_coeff_freq_domain = itpp.numpy_array_to_mat( channel_coeff_freq_domain_np )
 
-    nrof_subframe_ofdm_symbols = 12
-    
+    nrof_subframe_ofdm_symbols = NROF_SUBFRAME_OFDM_SYMBOLS
+
+    snrs_db = np.atleast_1d(snr_db)
+
     #--------- TRANSMITTER PROCESSING ----------
-    
+
+    nrof_frames = channel_coeff_freq_domain_np.shape[1]
+    transmission = _transmit(transport_block_size, modorder, nrof_subcarriers, nrof_frames, codec_backend)
+
+    # Obtain the OFDM frequency-domain signal (the frame layout stays in numpy until demodulation)
+    transmit_signal_freq_domain = ofdm.multiplex_symbols_np(nrof_subframe_ofdm_symbols,
+                                                            nrof_subcarriers,
+                                                            transmission.symbols)
+
+    #--------- CHANNEL EFFECTS ----------
+    # Apply the channel to the transmitted signal
+    with instrumentation.stage('channel'):
+        received_signal_freq_domain = transmit_signal_freq_domain * channel_coeff_freq_domain_np
+
+    unit_noise_variance = _unit_noise_variance(channel_coeff_freq_domain_np, nrof_subcarriers, per_symbol_noise_variance, codec_backend)
+
+    bler = np.zeros(snrs_db.size)
+    block_success = np.zeros((nrof_frames, snrs_db.size), dtype=np.uint8)
+
+    noise = None
+    for snr_index, snr in enumerate(snrs_db):
+
+        with instrumentation.stage('channel'):
+            # Add receiver noise
+            if noise is None or not common_random_numbers:
+                noise = _randn_c(received_signal_freq_domain.shape)
+
+            noise_std_dev = np.sqrt(1.0 / pow(10, 0.1 * snr)) # Signal and channel power is normalized to 1
+            received_signal_freq_domain_noisy = received_signal_freq_domain + noise_std_dev * noise
+
+            #--------- RECEIVER PROCESSING ----------
+
+            # Remove the effect of channel
+            received_signal_freq_domain_compensated = received_signal_freq_domain_noisy / channel_coeff_freq_domain_np
+
+        # Obtain the time-domain symbols
+        received_symbols_modulated = ofdm.de_multiplex_symbols_np(nrof_subframe_ofdm_symbols,
+                                                                  nrof_subcarriers,
+                                                                  received_signal_freq_domain_compensated)
+
+        bler[snr_index], block_success[:, snr_index] = _receive(transmission,
+                                                               noise_std_dev * noise_std_dev * unit_noise_variance,
+                                                               received_symbols_modulated)
+
+#         print 'bler', bler
+        logging.info('SNR:%0.2f dB, BLER: %0.4f' %(snr, bler[snr_index]))
+
+#     channel_to_noise_ratio = channel_coeff_freq_domain.elem_div(noise_realization)
+
+    if np.ndim(snr_db) == 0:
+        return (bler[0], block_success[:, 0])
+
+    return (bler, block_success)
+
+'''Simulate all MCSs of an MCS table over the same channel realization in one call.
+   mcs_table is a sequence of (transport_block_size, modulation_order) pairs, with transport block sizes as
+   passed to simulate. The channel has the same layout as in simulate, i.e. (subcarriers * 12, frames).
+
+   Channel application, equalization and OFDM de-multiplexing are linear, so the de-multiplexed received
+   symbols are the transmitted symbols plus the de-multiplexed equalized noise. That noise term is computed
+   once per modulation order and SNR and shared by all MCSs of the order. As in simulate, snr_db may be a
+   sequence, in which case each MCS runs its transmitter chain once for all SNRs, and common_random_numbers
+   scales one noise realization per modulation order to every SNR. per_symbol_noise_variance and codec_backend
+   are as in simulate.
+
+   Returns the BLER per MCS and the block success matrix of shape (frames, MCSs), i.e. the
+   block_success[:, :, snr_index] slice stored by the Generate_Data notebooks. For a sequence of SNRs the
+   shapes are (MCSs, SNRs) and (frames, MCSs, SNRs), the layout of the stored block_success array.
+'''
+@instrumentation.timed(instrumentation.TOTAL_STAGE)
+def simulate_all_mcs(channel_coeff_freq_domain_np,
+                     snr_db,
+                     mcs_table,
+                     common_random_numbers=False,
+                     per_symbol_noise_variance=False,
+                     codec_backend='itpp'):
+
+    nrof_subframe_ofdm_symbols = NROF_SUBFRAME_OFDM_SYMBOLS
+
+    nrof_rows, nrof_frames = channel_coeff_freq_domain_np.shape
+    nrof_subcarriers = int(nrof_rows / nrof_subframe_ofdm_symbols)
+
+    snrs_db = np.atleast_1d(snr_db)
+    noise_std_devs = np.sqrt(1.0 / np.power(10, 0.1 * snrs_db)) # Signal and channel power is normalized to 1
+
+    unit_noise_variance = _unit_noise_variance(channel_coeff_freq_domain_np, nrof_subcarriers, per_symbol_noise_variance, codec_backend)
+
+    bler = np.zeros((len(mcs_table), snrs_db.size))
+    block_success = np.zeros((nrof_frames, len(mcs_table), snrs_db.size), dtype=np.uint8)
+
+    modorders = [modorder for _, modorder in mcs_table]
+    for modorder in sorted(set(modorders)):
+
+        #--------- CHANNEL EFFECTS AND EQUALIZATION, ONCE PER MODULATION ORDER ----------
+        noise_de_multiplexed = []
+        for noise_std_dev in noise_std_devs:
+            if not common_random_numbers or not noise_de_multiplexed:
+                with instrumentation.stage('channel'):
+                    noise_compensated = _randn_c(channel_coeff_freq_domain_np.shape) / channel_coeff_freq_domain_np
+
+                unit_noise_de_multiplexed = ofdm.de_multiplex_symbols_np(nrof_subframe_ofdm_symbols,
+                                                                         nrof_subcarriers,
+                                                                         noise_compensated)
+
+            noise_de_multiplexed.append(noise_std_dev * unit_noise_de_multiplexed)
+
+        for mcs_index, (transport_block_size, mcs_modorder) in enumerate(mcs_table):
+            if mcs_modorder != modorder:
+                continue
+
+            transmission = _transmit(transport_block_size, modorder, nrof_subcarriers, nrof_frames, codec_backend)
+
+            for snr_index, noise_std_dev in enumerate(noise_std_devs):
+                bler[mcs_index, snr_index], block_success[:, mcs_index, snr_index] = _receive(transmission,
+                                                                                             noise_std_dev * noise_std_dev * unit_noise_variance,
+                                                                                             transmission.symbols + noise_de_multiplexed[snr_index])
+
+                logging.info('SNR:%0.2f dB, TBS: %d, BLER: %0.4f' %(snrs_db[snr_index], transport_block_size, bler[mcs_index, snr_index]))
+
+    if np.ndim(snr_db) == 0:
+        return (bler[:, 0], block_success[:, :, 0])
+
+    return (bler, block_success)
+
+'''Transmitter chain up to the modulated symbols:
+   random info bits, channel encoding, random interleaving, rate matching and modulation
+'''
+def _transmit(transport_block_size, modorder, nrof_subcarriers, nrof_frames, codec_backend='itpp'):
+
     # Generate random transmit bits for subframe
-    nrof_frames = channel_coeff_freq_domain.cols()
-    info_bits_uncoded = itpp.random.randb(transport_block_size * nrof_frames) # bmat[block_size, nrof_samples]
-    
+    with instrumentation.stage('random_bits', transport_block_size * nrof_frames):
+        info_bits_uncoded = itpp.random.randb(transport_block_size * nrof_frames) # bmat[block_size, nrof_samples]
+
     # Channel encode the transmit data bits
-    info_bits_encoded = codec.encode( transport_block_size, info_bits_uncoded )
-
-    encoded_block_size = int(info_bits_encoded.length() / nrof_frames)
-    
-    interleaver_bin = itpp.comm.sequence_interleaver_bin(encoded_block_size)
-    interleaver_bin.randomize_interleaver_sequence()
-    
-    interleaver_double = itpp.comm.sequence_interleaver_double(encoded_block_size)
-    interleaver_double.set_interleaver_sequence(interleaver_bin.get_interleaver_sequence())
-    
-    info_bits_interleaved = interleaver_bin.interleave(info_bits_encoded)
-    
+    info_bits_encoded = codec.encode( transport_block_size, info_bits_uncoded, codec_backend )
+
+    nrof_encoded_bits = info_bits_encoded.size if codec_backend == 'numpy' else info_bits_encoded.length()
+    encoded_block_size = int(nrof_encoded_bits / nrof_frames)
+
+    with instrumentation.stage('interleave', nrof_encoded_bits):
+        # The itpp interleaver draws the sequence for both backends, so they consume the same random numbers
+        interleaver_bin = itpp.comm.sequence_interleaver_bin(encoded_block_size)
+        interleaver_bin.randomize_interleaver_sequence()
+
+        if codec_backend == 'numpy':
+            # Interleaved bit i of a block is encoded bit interleaver_sequence[i], as in itpp
+            interleaver_double = None
+            interleaver_sequence = conversion.to_numpy(interleaver_bin.get_interleaver_sequence(), copy=True)
+
+            info_bits_interleaved = np.reshape(np.reshape(info_bits_encoded, (-1, encoded_block_size))[:, interleaver_sequence], -1)
+        else:
+            interleaver_double = itpp.comm.sequence_interleaver_double(encoded_block_size)
+            interleaver_double.set_interleaver_sequence(interleaver_bin.get_interleaver_sequence())
+            interleaver_sequence = None
+
+            info_bits_interleaved = interleaver_bin.interleave(info_bits_encoded)
+
     # Rate match the encoded bits
-    transmit_block_size = int(nrof_subcarriers * nrof_subframe_ofdm_symbols * modorder)
-    info_bits_rate_matched = codec.rate_match(transmit_block_size, encoded_block_size)(info_bits_interleaved)
-    
+    transmit_block_size = int(nrof_subcarriers * NROF_SUBFRAME_OFDM_SYMBOLS * modorder)
+    info_bits_rate_matched = codec.rate_match_np(transmit_block_size, encoded_block_size)(info_bits_interleaved)
+
     # Modulate the rate matched bits
-    info_symbols_modulated = modem.modulate_bits( modorder, info_bits_rate_matched )
-    
-    # Obtain the OFDM frequency-domain signal
-    transmit_signal_freq_domain = ofdm.multiplex_symbols(nrof_subframe_ofdm_symbols,
-                                                         nrof_subcarriers,
-                                                         info_symbols_modulated)
+    if codec_backend == 'numpy':
+        info_symbols_modulated = modem.modulate_bits_np( modorder, info_bits_rate_matched )
+    else:
+        with instrumentation.stage('conversion', info_bits_rate_matched.size):
+            info_bits_rate_matched = conversion.to_bvec(info_bits_rate_matched)
 
-    #--------- CHANNEL EFFECTS ----------
-    # Apply the channel to the transmitted signal
-    received_signal_freq_domain = itpp.elem_mult_mat(transmit_signal_freq_domain, channel_coeff_freq_domain)
-       
-    # Add receiver noise
-    noise_std_dev = itpp.math.sqrt(1.0 / pow(10, 0.1 * snr_db)) # Signal and channel power is normalized to 1 
-    received_signal_freq_domain_noisy = received_signal_freq_domain + noise_std_dev * itpp.randn_c(received_signal_freq_domain.rows(), received_signal_freq_domain.cols())
-    
-    #--------- RECEIVER PROCESSING ----------
-    
-    # Remove the effect of channel
-    received_signal_freq_domain_compensated = itpp.elem_div_mat(received_signal_freq_domain_noisy, channel_coeff_freq_domain) 
-        
-    # Obtain the time-domain symbols
-    received_symbols_modulated = ofdm.de_multiplex_symbols(nrof_subframe_ofdm_symbols,
-                                                           nrof_subcarriers,
-                                                           received_signal_freq_domain_compensated)
+        info_symbols_modulated = modem.modulate_bits( modorder, info_bits_rate_matched )
+
+        with instrumentation.stage('conversion', info_bits_rate_matched.length()):
+            info_symbols_modulated = conversion.to_numpy(info_symbols_modulated, copy=True)
+
+    with instrumentation.stage('conversion', transport_block_size * nrof_frames):
+        info_bits_uncoded_np = conversion.to_numpy(info_bits_uncoded, copy=True)
+
+    return _Transmission(transport_block_size,
+                         modorder,
+                         info_bits_uncoded_np,
+                         encoded_block_size,
+                         transmit_block_size,
+                         interleaver_double,
+                         interleaver_sequence,
+                         codec_backend,
+                         info_symbols_modulated)
+
+'''Receiver chain from the equalized, de-multiplexed symbols:
+   demodulation, de-rate matching, de-interleaving, decoding and block error counting.
+   noise_variance is a scalar or one value per received symbol.
+'''
+def _receive(transmission, noise_variance, received_symbols_modulated):
 
     # Demodulate the received symbols according to the modulation order
-    received_soft_values = modem.demodulate_soft_values(modorder, 
-                                                        noise_std_dev * noise_std_dev, 
-                                                        received_symbols_modulated)
+    if transmission.codec_backend == 'numpy':
+        received_soft_values = modem.demodulate_soft_values_np(transmission.modorder,
+                                                               noise_variance,
+                                                               received_symbols_modulated)
+    else:
+        with instrumentation.stage('conversion', received_symbols_modulated.size):
+            received_symbols_modulated = conversion.to_vec(received_symbols_modulated)
+
+        received_soft_values = modem.demodulate_soft_values(transmission.modorder,
+                                                            noise_variance,
+                                                            received_symbols_modulated)
 
     # De-rate match the received soft values
-    received_soft_values_de_rate_matched = codec.de_rate_match(transmit_block_size, encoded_block_size)(received_soft_values)
-    
-    received_soft_values_deinterleaved = interleaver_double.deinterleave(received_soft_values_de_rate_matched, 0)
-    
+    received_soft_values_de_rate_matched = codec.de_rate_match_np(transmission.transmit_block_size, transmission.encoded_block_size)(received_soft_values)
+
+    if transmission.codec_backend == 'numpy':
+        with instrumentation.stage('deinterleave', received_soft_values_de_rate_matched.size):
+            received_soft_values_deinterleaved = np.empty_like(received_soft_values_de_rate_matched)
+            np.reshape(received_soft_values_deinterleaved, (-1, transmission.encoded_block_size))[:, transmission.interleaver_sequence] = \
+                np.reshape(received_soft_values_de_rate_matched, (-1, transmission.encoded_block_size))
+    else:
+        with instrumentation.stage('conversion', received_soft_values_de_rate_matched.size):
+            received_soft_values_de_rate_matched = conversion.to_vec(received_soft_values_de_rate_matched)
+
+        with instrumentation.stage('deinterleave', received_soft_values_de_rate_matched.length()):
+            received_soft_values_deinterleaved = transmission.interleaver_double.deinterleave(received_soft_values_de_rate_matched, 0)
+
     # Channel decode the data bits according to the code rate
-    received_bits_decoded = codec.decode( transport_block_size, received_soft_values_deinterleaved )
+    received_bits_decoded = codec.decode( transmission.transport_block_size, received_soft_values_deinterleaved, transmission.codec_backend )
 
     # Count block errors
-    bler, block_success = error_counter(info_bits_uncoded, received_bits_decoded, transport_block_size)
+    return error_counter(transmission.info_bits_uncoded, received_bits_decoded, transmission.transport_block_size)
 
-#     print 'bler', bler
-    logging.info('SNR:%0.2f dB, BLER: %0.4f' %(snr_db, bler))
-    
-#     channel_to_noise_ratio = channel_coeff_freq_domain.elem_div(noise_realization)
-    
-    return (bler, block_success)
+'''Channel in the layout of simulate for one (frames, subcarriers) realization with block fading over the subframe:
+   the transpose, repeated for every OFDM symbol of the subframe
+'''
+def block_fading_channel(channel_coeff):
+    return np.tile(np.transpose(channel_coeff), (NROF_SUBFRAME_OFDM_SYMBOLS, 1))
+
+'''Receiver noise variance per de-multiplexed symbol for unit receiver noise variance.
+   The channel multiplies every OFDM sample after the IFFT, so after zero forcing and the FFT each symbol of an
+   OFDM symbol sees the mean of 1 / |h|^2 over the samples of that OFDM symbol. Returns 1.0 when disabled.
+   The itpp demodulator takes a scalar noise variance, so per-symbol variances need the numpy backend.
+'''
+def _unit_noise_variance(channel_coeff_freq_domain_np, nrof_subcarriers, per_symbol_noise_variance, codec_backend='itpp'):
+    if not per_symbol_noise_variance:
+        return 1.0
+
+    if codec_backend != 'numpy':
+        raise ValueError('per_symbol_noise_variance requires the numpy demodulator, i.e. codec_backend numpy')
 
+    nrof_frames = channel_coeff_freq_domain_np.shape[1]
+    inverse_gain = np.reshape((1.0 / np.abs(channel_coeff_freq_domain_np) ** 2).T,
+                              (nrof_frames, NROF_SUBFRAME_OFDM_SYMBOLS, nrof_subcarriers))
+
+    inverse_gain_per_ofdm_symbol = np.mean(inverse_gain, axis=-1, keepdims=True)
+
+    return np.reshape(np.broadcast_to(inverse_gain_per_ofdm_symbol, inverse_gain.shape), -1)
+
+'''Unit-variance circularly symmetric complex Gaussian samples of a 2D shape, drawn with itpp.randn_c in one call
+   and converted once, so that itpp.RNG_reset alone determines the noise as before
+'''
+def _randn_c(shape):
+    nrof_rows, nrof_columns = shape
+
+    return conversion.to_numpy(itpp.randn_c(nrof_rows, nrof_columns), copy=True)
+
+'''Count block errors between transmitted and decoded bits, given as itpp vectors or numpy arrays.
+   The bits are viewed as (blocks x block size) arrays and compared in one vectorized operation.
+   Returns the block error ratio and the per-block success flags as a numpy array.
+'''
+@instrumentation.timed('error_count')
 def error_counter(blocks_in, blocks_out, blocksize):
-    nrof_blocks = int(blocks_in.length() / blocksize)
-    block_success = itpp.zeros_b(nrof_blocks)
-    nrof_errors = 0
-    
-    for block_index in range(nrof_blocks):
-        if (blocks_in.mid(block_index * blocksize, blocksize) != blocks_out.mid(block_index * blocksize, blocksize)):
-            block_success[block_index] = itpp.bin(0)
-            nrof_errors += 1
-        else:
-            block_success[block_index] = itpp.bin(1)
+    bits_in = conversion.to_numpy(blocks_in)
+    bits_out = conversion.to_numpy(blocks_out)
+
+    nrof_blocks = int(bits_in.size / blocksize)
+    nrof_bits = nrof_blocks * blocksize
+
+    block_success_np = np.all(np.reshape(bits_in[:nrof_bits], (nrof_blocks, blocksize)) ==
+                              np.reshape(bits_out[:nrof_bits], (nrof_blocks, blocksize)), axis=1).astype(np.uint8)
+
+    block_error_ratio = float(nrof_blocks - np.count_nonzero(block_success_np)) / float(nrof_blocks)
 
-            
-    block_error_ratio = float(nrof_errors) / float(nrof_blocks)
-    
-    block_success_np = np.array( block_success )
-    
     return (block_error_ratio, block_success_np)
@@ -0,0 +1,301 @@
+'''Batched numpy turbo encoder and decoder.
+
+   A parallel concatenated code of two recursive systematic convolutional (RSC) codes with the conventions of the
+   itpp Turbo_Codec / Rec_Syst_Conv_Code, so that it can replace the itpp codec in the simulation chain:
+     - generators are given as in itpp, one integer per polynomial, the most significant of the constraint_length
+       bits being the coefficient of D^0. The first generator is the feedback polynomial, e.g. 11, 13 is the LTE
+       code with feedback 1 + D^2 + D^3 and parity 1 + D + D^3.
+     - both encoders start in the zero state and are terminated with constraint_length - 1 tail bits each.
+     - the second encoder encodes the interleaved block, with interleaved bit i = bit interleaver_sequence[i].
+     - an encoded block of K bits is laid out as (systematic, parity 1, parity 2) for every bit, followed by the
+       (systematic, parity 1) pairs of the first tail and the (systematic, parity 2) pairs of the second tail,
+       3 * K + 4 * (constraint_length - 1) bits in total.
+     - soft values are LLRs log(P(b=0) / P(b=1)), bits with a negative a posteriori LLR are decoded as 1.
+
+   All blocks of a call are encoded and decoded together as (blocks x K) arrays. The RSC encoder uses the periodic
+   impulse response of the feedback polynomial, so encoding needs no loop over the bits. The BCJR decoder loops
+   over the trellis sections, with every section processed for all blocks at once.
+'''
+import numpy as np
+
+
+'''Upper bound on the number of elements of the stored trellis metrics, blocks are decoded in chunks below it'''
+_MAX_TRELLIS_ELEMENTS = 1 << 23
+
+'''The path metrics are renormalized every this many trellis sections, which leaves the LLRs unchanged'''
+_NORMALIZATION_INTERVAL = 32
+
+class TurboCode(object):
+    '''Turbo code of block length K with the given RSC generators and internal interleaver sequence.
+
+       metric is 'maxlog' (max-log-MAP, the itpp default 'LOGMAX') or 'logmap' (exact log-MAP). With
+       early_termination a block stops iterating as soon as its hard decisions do not change from one
+       iteration to the next; the other blocks continue until nrof_iterations.
+    '''
+    def __init__(self, generators, constraint_length, interleaver_sequence,
+                 nrof_iterations=8, metric='maxlog', early_termination=False, extrinsic_scaling=1.0):
+
+        if metric not in ('maxlog', 'logmap'):
+            raise ValueError('Unknown turbo decoder metric: ' + str(metric))
+
+        self.feedback = _polynomial_coefficients(generators[0], constraint_length)
+        self.parity = _polynomial_coefficients(generators[1], constraint_length)
+        if not self.feedback[0] or not self.feedback[-1]:
+            raise ValueError('The feedback polynomial needs a D^0 and a D^%d term' %(constraint_length - 1))
+
+        self.memory = constraint_length - 1
+        self.interleaver_sequence = np.asarray(interleaver_sequence, dtype=np.int64)
+        self.block_length = self.interleaver_sequence.size
+        self.encoded_block_length = 3 * self.block_length + 4 * self.memory
+
+        self.nrof_iterations = nrof_iterations
+        self.metric = metric
+        self.early_termination = early_termination
+        self.extrinsic_scaling = extrinsic_scaling
+
+        self._impulse_response = _feedback_impulse_response(self.feedback)
+        self._trellis = _Trellis(self.feedback, self.parity)
+
+    '''Encode a flat bit array of whole blocks, returning the flat encoded bits as uint8'''
+    def encode(self, bits):
+        info_bits = np.reshape(np.asarray(bits, dtype=np.uint8), (-1, self.block_length))
+
+        systematic_1, parity_1, tail_1 = self._encode_rsc(info_bits)
+        systematic_2, parity_2, tail_2 = self._encode_rsc(info_bits[:, self.interleaver_sequence])
+
+        nrof_blocks = info_bits.shape[0]
+        encoded = np.empty((nrof_blocks, self.encoded_block_length), dtype=np.uint8)
+
+        data = encoded[:, :3 * self.block_length]
+        data[:, 0::3] = systematic_1
+        data[:, 1::3] = parity_1
+        data[:, 2::3] = parity_2
+
+        encoded[:, 3 * self.block_length:] = np.concatenate((np.reshape(tail_1, (nrof_blocks, -1)),
+                                                             np.reshape(tail_2, (nrof_blocks, -1))), axis=1)
+
+        return np.reshape(encoded, -1)
+
+    '''Decode a flat array of LLRs of whole encoded blocks.
+       Returns the flat decoded bits as uint8 and the number of iterations run by every block.
+    '''
+    def decode(self, soft_values):
+        received = np.reshape(np.asarray(soft_values, dtype=np.float64), (-1, self.encoded_block_length))
+        nrof_blocks = received.shape[0]
+
+        decoded_bits = np.empty((nrof_blocks, self.block_length), dtype=np.uint8)
+        nrof_iterations = np.empty(nrof_blocks, dtype=np.int64)
+
+        # The forward and backward metrics and the branch metrics gathered per state take 4 (sections, states, blocks) arrays
+        chunk_size = max(1, int(_MAX_TRELLIS_ELEMENTS / (4 * (self.block_length + self.memory + 1) * self._trellis.nrof_states)))
+        for start in range(0, nrof_blocks, chunk_size):
+            stop = min(start + chunk_size, nrof_blocks)
+
+            decoded_bits[start:stop], nrof_iterations[start:stop] = self._decode_blocks(received[start:stop])
+
+        return (np.reshape(decoded_bits, -1), nrof_iterations)
+
+    '''Systematic bits with tail, parity bits with tail, and the tail as (blocks, tail bits, 2) (systematic, parity)'''
+    def _encode_rsc(self, info_bits):
+        nrof_blocks, K = info_bits.shape
+        period = self._impulse_response.size
+
+        # State sequence a_t = u_t + sum_j feedback_j a_(t-j), written as the convolution of u with the periodic
+        # impulse response h of 1 / feedback: a_t = sum over residues c of h_((t - c) mod P) times the parity of
+        # the bits u_j, j <= t, j = c mod P
+        nrof_periods = -(-K // period)
+        padded = np.zeros((nrof_blocks, nrof_periods, period), dtype=np.int64)
+        np.reshape(padded, (nrof_blocks, -1))[:, :K] = info_bits
+
+        residue_parities = np.cumsum(padded, axis=1)
+        previous_residue_parities = residue_parities - padded
+
+        # gain[r, c] = h_((r - c) mod P), split by whether the bit of residue c at or before t is in the same period
+        residues = np.arange(period)
+        gain = self._impulse_response[(residues[:, np.newaxis] - residues) % period]
+        same_period = residues[np.newaxis, :] <= residues[:, np.newaxis]
+
+        states = (np.matmul(residue_parities, np.where(same_period, gain, 0).T) +
+                  np.matmul(previous_residue_parities, np.where(same_period, 0, gain).T))
+        states = np.reshape(states & 1, (nrof_blocks, -1))[:, :K]
+
+        # Tail: the input cancels the feedback so that the state sequence continues with zeros
+        states = np.concatenate((np.zeros((nrof_blocks, self.memory), dtype=np.int64), states,
+                                 np.zeros((nrof_blocks, self.memory), dtype=np.int64)), axis=1)
+
+        delayed = [states[:, self.memory - j:states.shape[1] - j] for j in range(self.memory + 1)]
+
+        parity = np.zeros_like(delayed[0])
+        for j in np.flatnonzero(self.parity):
+            parity ^= delayed[j]
+
+        tail_input = np.zeros((nrof_blocks, self.memory), dtype=np.int64)
+        for j in np.flatnonzero(self.feedback[1:]) + 1:
+            tail_input ^= delayed[j][:, K:]
+
+        tail = np.stack((tail_input, parity[:, K:]), axis=2)
+
+        return (info_bits, parity[:, :K], tail)
+
+    def _decode_blocks(self, received):
+        nrof_blocks = received.shape[0]
+        K = self.block_length
+        m = self.memory
+
+        data = np.reshape(received[:, :3 * K], (nrof_blocks, K, 3))
+        tails = np.reshape(received[:, 3 * K:], (nrof_blocks, 2, m, 2))
+
+        systematic_1 = np.concatenate((data[:, :, 0], tails[:, 0, :, 0]), axis=1)
+        parity_1 = np.concatenate((data[:, :, 1], tails[:, 0, :, 1]), axis=1)
+        systematic_2 = np.concatenate((data[:, self.interleaver_sequence, 0], tails[:, 1, :, 0]), axis=1)
+        parity_2 = np.concatenate((data[:, :, 2], tails[:, 1, :, 1]), axis=1)
+
+        a_priori = np.zeros((nrof_blocks, K + m))
+        hard_decisions = np.zeros((nrof_blocks, K), dtype=np.uint8)
+        nrof_iterations = np.zeros(nrof_blocks, dtype=np.int64)
+
+        active = np.arange(nrof_blocks)
+        for iteration in range(self.nrof_iterations):
+            nrof_iterations[active] += 1
+
+            # First decoder, natural order
+            llr_1 = self._trellis.bcjr(systematic_1[active] + a_priori[active], parity_1[active], K, self.metric)
+            extrinsic_1 = self.extrinsic_scaling * (llr_1 - systematic_1[active, :K] - a_priori[active, :K])
+
+            # Second decoder, interleaved order
+            a_priori_2 = np.zeros((active.size, K + m))
+            a_priori_2[:, :K] = extrinsic_1[:, self.interleaver_sequence]
+
+            llr_2 = self._trellis.bcjr(systematic_2[active] + a_priori_2, parity_2[active], K, self.metric)
+            extrinsic_2 = self.extrinsic_scaling * (llr_2 - systematic_2[active, :K] - a_priori_2[:, :K])
+
+            a_priori[active[:, np.newaxis], self.interleaver_sequence] = extrinsic_2
+
+            a_posteriori = np.empty_like(llr_2)
+            a_posteriori[:, self.interleaver_sequence] = llr_2
+            decisions = (a_posteriori < 0).astype(np.uint8)
+
+            if self.early_termination:
+                converged = np.all(decisions == hard_decisions[active], axis=1) if iteration > 0 else np.zeros(active.size, dtype=bool)
+                hard_decisions[active] = decisions
+
+                active = active[~converged]
+                if active.size == 0:
+                    break
+            else:
+                hard_decisions[active] = decisions
+
+        return (hard_decisions, nrof_iterations)
+
+class _Trellis(object):
+    '''Trellis of an RSC code with the state of itpp Rec_Syst_Conv_Code: bit j - 1 of the state is a_(t-j)'''
+    def __init__(self, feedback, parity):
+        memory = feedback.size - 1
+        self.nrof_states = 1 << memory
+
+        states = np.arange(self.nrof_states)
+        state_bits = (states[:, np.newaxis] >> np.arange(memory)) & 1 # state_bits[s, j - 1] = a_(t-j)
+
+        feedback_bit = np.dot(state_bits, feedback[1:]) & 1
+
+        self.next_state = np.empty((self.nrof_states, 2), dtype=np.int64)
+        self.output = np.empty((self.nrof_states, 2), dtype=np.int64) # 2 * input + parity, the branch metric index
+        for input_bit in (0, 1):
+            a = input_bit ^ feedback_bit
+            self.next_state[:, input_bit] = ((states << 1) | a) & (self.nrof_states - 1)
+
+            parity_bit = (a * parity[0] + np.dot(state_bits, parity[1:])) & 1
+            self.output[:, input_bit] = 2 * input_bit + parity_bit
+
+        # Every state has one predecessor per input bit
+        self.previous_state = np.empty((self.nrof_states, 2), dtype=np.int64)
+        self.previous_output = np.empty((self.nrof_states, 2), dtype=np.int64)
+        for input_bit in (0, 1):
+            self.previous_state[self.next_state[:, input_bit], input_bit] = states
+            self.previous_output[self.next_state[:, input_bit], input_bit] = self.output[:, input_bit]
+
+    '''A posteriori LLRs of the first nrof_info_bits inputs for (blocks, sections) systematic LLRs, including the
+       a priori information, and parity LLRs. The trellis starts and ends in the zero state.
+    '''
+    def bcjr(self, systematic, parity, nrof_info_bits, metric):
+        nrof_blocks, nrof_sections = systematic.shape
+
+        if metric == 'maxlog':
+            pair_reduce, state_reduce = np.maximum, _max_over_states
+        else:
+            pair_reduce, state_reduce = np.logaddexp, _log_sum_exp_over_states
+
+        # Branch metrics (sections, 2 * input + parity, blocks) for bits mapped to +1 / -1. The metrics are kept
+        # state major, so that gathering the metrics of the predecessor or successor states copies whole rows.
+        branch_metrics = np.empty((nrof_sections, 4, nrof_blocks))
+        half_systematic = 0.5 * systematic.T
+        half_parity = 0.5 * parity.T
+        branch_metrics[:, 0, :] = half_systematic + half_parity
+        branch_metrics[:, 1, :] = half_systematic - half_parity
+        branch_metrics[:, 2, :] = -branch_metrics[:, 1, :]
+        branch_metrics[:, 3, :] = -branch_metrics[:, 0, :]
+
+        initial = np.full((self.nrof_states, nrof_blocks), -np.inf)
+        initial[0, :] = 0.0
+
+        # Forward recursion over the two incoming branches of every state
+        incoming_0 = branch_metrics[:, self.previous_output[:, 0], :]
+        incoming_1 = branch_metrics[:, self.previous_output[:, 1], :]
+
+        forward = np.empty((nrof_sections + 1, self.nrof_states, nrof_blocks))
+        forward[0] = initial
+        for t in range(nrof_sections):
+            pair_reduce(forward[t][self.previous_state[:, 0]] + incoming_0[t],
+                        forward[t][self.previous_state[:, 1]] + incoming_1[t], out=forward[t + 1])
+
+            if t % _NORMALIZATION_INTERVAL == 0:
+                forward[t + 1] -= np.max(forward[t + 1], axis=0)
+
+        del incoming_0, incoming_1
+
+        # Backward recursion over the two outgoing branches of every state
+        outgoing_0 = branch_metrics[:, self.output[:, 0], :]
+        outgoing_1 = branch_metrics[:, self.output[:, 1], :]
+
+        backward = np.empty((nrof_sections + 1, self.nrof_states, nrof_blocks))
+        backward[nrof_sections] = initial
+        for t in range(nrof_sections - 1, -1, -1):
+            pair_reduce(outgoing_0[t] + backward[t + 1][self.next_state[:, 0]],
+                        outgoing_1[t] + backward[t + 1][self.next_state[:, 1]], out=backward[t])
+
+            if t % _NORMALIZATION_INTERVAL == 0:
+                backward[t] -= np.max(backward[t], axis=0)
+
+        # LLRs of the info bits over all sections at once
+        forward = forward[:nrof_info_bits]
+        next_backward = backward[1:nrof_info_bits + 1]
+        llr = state_reduce(forward + outgoing_0[:nrof_info_bits] + next_backward[:, self.next_state[:, 0]])
+        llr -= state_reduce(forward + outgoing_1[:nrof_info_bits] + next_backward[:, self.next_state[:, 1]])
+
+        return llr.T
+
+'''Coefficients of D^0 ... D^(constraint_length - 1) of an itpp generator, most significant bit first'''
+def _polynomial_coefficients(generator, constraint_length):
+    return (int(generator) >> np.arange(constraint_length - 1, -1, -1)) & 1
+
+'''One period of the impulse response of 1 / feedback(D) over GF(2)'''
+def _feedback_impulse_response(feedback):
+    memory = feedback.size - 1
+
+    response = [1]
+    history = [1] + [0] * (memory - 1) # a_(t-1), ..., a_(t-m) after the impulse
+    while True:
+        a = int(np.dot(history, feedback[1:]) & 1)
+        history = [a] + history[:-1]
+        if history == [1] + [0] * (memory - 1):
+            return np.array(response, dtype=np.int64)
+        response.append(a)
+
+'''Reduce (sections, states, blocks) metrics over the states'''
+def _max_over_states(metrics):
+    return np.max(metrics, axis=1)
+
+def _log_sum_exp_over_states(metrics):
+    metrics_max = np.max(metrics, axis=1)
+
+    return metrics_max + np.log(np.sum(np.exp(metrics - metrics_max[:, np.newaxis]), axis=1))
@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import numpy as np
+
+import utilities as utils
+
+# Online counterpart of the hybrid approach: for every UE a ring buffer keeps the last N CSI reports, the Wiener
+# prediction is updated with one dot product per subcarrier when a report arrives, and the MCS is selected from the
+# acknowledgement probabilities of the predicted channel with the determine_best_mcs rule. Decisions are batched
+# over all UEs reporting in the same subframe.
+#
+# 'ack_model' maps features ( UEs, 2 * subcarriers ), the real and imaginary parts of the predicted channel as in
+# the hybrid notebooks, to acknowledgement probabilities ( UEs, MCSs ), e.g. the 'predict' method of a trained model.
+class StreamingLinkAdapter( object ):
+
+    def __init__( self, nrof_ues, Wiener_coeff, block_sizes, ack_model, nrof_subcarriers = 72, target_error_rate = 1.0, dtype = np.complex64 ):
+        self.Wiener_coeff = np.asarray( Wiener_coeff )
+        self.block_sizes = np.asarray( block_sizes )
+        self.ack_model = ack_model
+        self.target_error_rate = target_error_rate
+
+        nrof_taps = self.Wiener_coeff.size
+        self.history = np.zeros( ( nrof_ues, nrof_taps, nrof_subcarriers ), dtype = dtype )
+
+        # Slot of the ring buffer the next report of each UE is written to
+        self.write_index = np.zeros( nrof_ues, dtype = np.int64 )
+
+        # Coefficient applied to every slot, rotated along with the write index so that the latest report always
+        # meets Wiener_coeff[ 0 ]
+        self.slot_coeff = np.tile( self._rotated_coeff( 0 ), ( nrof_ues, 1 ) ).astype( dtype )
+
+        # Buffers of predict, allocated once: the gathered history and coefficients of the UEs of a tick and the
+        # predicted channel
+        self._history_rows = np.empty_like( self.history )
+        self._coeff_rows = np.empty_like( self.slot_coeff )
+        self._prediction = np.empty( ( nrof_ues, nrof_subcarriers ), dtype = dtype )
+
+    # Store the CSI reports ( UEs, subcarriers ) of the given UEs
+    def report( self, ue_ids, csi ):
+        ue_ids = np.asarray( ue_ids )
+
+        self.history[ ue_ids, self.write_index[ ue_ids ], : ] = csi
+
+        self.write_index[ ue_ids ] = ( self.write_index[ ue_ids ] + 1 ) % self.Wiener_coeff.size
+        self.slot_coeff[ ue_ids, : ] = self._rotated_coeff( self.write_index[ ue_ids ] )
+
+    # Wiener prediction of the channel ( UEs, subcarriers ) of the given UEs from their buffered reports. The result is
+    # a buffer that the next call overwrites, copy it to keep it. When all UEs report in order ( as in replay ) the
+    # rotated coefficients are applied to the history in place, otherwise the rows of the given UEs are gathered into
+    # preallocated buffers first ( without a range check, the UE ids are 0 ... nrof_ues - 1 as in report ). The
+    # product is one batched ( 1, taps ) x ( taps, subcarriers ) matrix product per UE.
+    def predict( self, ue_ids ):
+        ue_ids = np.asarray( ue_ids )
+        nrof_ues = ue_ids.size
+
+        if nrof_ues == self.history.shape[ 0 ] and np.array_equal( ue_ids, np.arange( nrof_ues ) ):
+            coeff_rows, history_rows = self.slot_coeff, self.history
+        else:
+            coeff_rows = np.take( self.slot_coeff, ue_ids, axis = 0, out = self._coeff_rows[ : nrof_ues ], mode = 'clip' )
+            history_rows = np.take( self.history, ue_ids, axis = 0, out = self._history_rows[ : nrof_ues ], mode = 'clip' )
+
+        prediction = self._prediction[ : nrof_ues ]
+        np.matmul( coeff_rows[ :, np.newaxis, : ], history_rows, out = prediction[ :, np.newaxis, : ] )
+
+        return prediction
+
+    # Select the MCS of the given UEs from their predicted channel
+    def select_mcs( self, ue_ids ):
+        predicted_channel = self.predict( ue_ids )
+
+        features = np.concatenate( ( np.real( predicted_channel ), np.imag( predicted_channel ) ), axis = 1 )
+        ack_probabilities = np.asarray( self.ack_model( features ) )
+
+        return utils.determine_best_mcs( ack_probabilities[ :, :, np.newaxis ], self.block_sizes, self.target_error_rate )[ :, 0 ]
+
+    # One subframe: store the reports of the given UEs and return their MCSs
+    def tick( self, ue_ids, csi ):
+        self.report( ue_ids, csi )
+
+        return self.select_mcs( ue_ids )
+
+    # Coefficient per ring buffer slot for the given write index ( scalar or one per UE ). The latest report is in slot
+    # write_index - 1 and is lag 0, the one before is lag 1, and so on.
+    def _rotated_coeff( self, write_index ):
+        nrof_taps = self.Wiener_coeff.size
+        lag_slots = ( np.expand_dims( write_index, -1 ) - 1 - np.arange( nrof_taps ) ) % nrof_taps
+
+        slot_coeff = np.empty( lag_slots.shape, dtype = self.Wiener_coeff.dtype )
+        np.put_along_axis( slot_coeff, lag_slots, np.broadcast_to( self.Wiener_coeff, lag_slots.shape ), axis = -1 )
+
+        return slot_coeff
+################################################################################
+
+# Replay a stored channel at real-time cadence: every 'tti' seconds the reports of all UEs for the next frame are
+# released and the adapter has to return the MCSs before 'deadline' seconds ( one TTI by default ) after the release.
+# 'channel' has shape ( frames, subcarriers, UEs ), e.g. DATASET['channel'] with its snr / batch axis used as UEs.
+# Returns the decision latency percentiles ( p50, p99, max, in seconds ) measured from the moment the reports are
+# handed to the adapter, the same percentiles measured from the scheduled release ( which include the event loop
+# wake-up jitter ), the number of deadline misses ( counted from the release ) and the selected MCSs ( frames, UEs ).
+async def replay( adapter, channel, tti = 1e-3, deadline = None, nrof_frames = None ):
+
+    if deadline is None:
+        deadline = tti
+    if nrof_frames is None:
+        nrof_frames = channel.shape[ 0 ]
+
+    nrof_ues = channel.shape[ 2 ]
+    ue_ids = np.arange( nrof_ues )
+
+    latencies = np.ndarray( nrof_frames )
+    release_latencies = np.ndarray( nrof_frames )
+    selected_mcs = np.ndarray( ( nrof_frames, nrof_ues ), dtype = np.int32 )
+
+    start = time.perf_counter()
+    for frame_index in range( nrof_frames ):
+        release = start + frame_index * tti
+
+        delay = release - time.perf_counter()
+        await asyncio.sleep( delay if delay > 0 else 0 )
+
+        handed_over = time.perf_counter()
+        selected_mcs[ frame_index, : ] = adapter.tick( ue_ids, np.transpose( channel[ frame_index, :, : ] ) )
+        decided = time.perf_counter()
+
+        latencies[ frame_index ] = decided - handed_over
+        release_latencies[ frame_index ] = decided - release
+
+    return { 'p50_latency': np.percentile( latencies, 50 ),
+             'p99_latency': np.percentile( latencies, 99 ),
+             'max_latency': np.max( latencies ),
+             'p50_release_latency': np.percentile( release_latencies, 50 ),
+             'p99_release_latency': np.percentile( release_latencies, 99 ),
+             'max_release_latency': np.max( release_latencies ),
+             'deadline_misses': int( np.count_nonzero( release_latencies > deadline ) ),
+             'nrof_frames': nrof_frames,
+             'selected_mcs': selected_mcs }
+
+# Synchronous entry point for replay
+def run_replay( adapter, channel, tti = 1e-3, deadline = None, nrof_frames = None ):
+    return asyncio.run( replay( adapter, channel, tti, deadline, nrof_frames ) )
@@ -0,0 +1,172 @@
+import concurrent.futures
+import threading
+
+import numpy as np
+
+import utilities as utils
+
+try:
+    from keras.utils import Sequence
+except ImportError:
+    Sequence = object
+
+# Out-of-core training data for the delay-blind and E2E networks. The samples of all dataset files are indexed without
+# loading or concatenating the files: a sample is a ( file, column, frame ) triplet, where a column is one SNR ( or
+# SNR and batch ) of the file. Every mini-batch is gathered from the ( memory-mapped ) files on the fly, scaled to its
+# SNR, optionally made noisy, and turned into the same features as
+#     utils.stack_features( utils.flatten_snr_axis( channel_coeff_concat[ :-delay ] ), mem )
+# i.e. the real and imaginary parts of the last 'mem' CSI reports, most recent first, with the history taken from the
+# same column and zero before its first frame. The target is the block success 'delay' frames later.
+#
+# Shuffling permutes sample indices only. With 'prefetch' the next mini-batch is gathered in a background thread
+# while the current one is used for training, as long as the mini-batches are requested in order. The class is a
+# keras.utils.Sequence when keras is installed, so it can be passed to model.fit directly, with shuffle = False since
+# the samples are already shuffled here ( keras would otherwise request the mini-batches in random order, and nothing
+# could be prefetched ); iterating over it yields the ( features, targets ) mini-batches of one epoch.
+#
+# 'sample_fraction' is the ( start, stop ) fraction of the frames of every file that is used, e.g. ( 0.0, 0.2 ) for
+# the TRAINING_FRACTION of the notebooks and ( 0.18, 0.2 ) for a validation set taken from its end.
+class LinkAdaptationSequence( Sequence ):
+
+    def __init__( self, dataset_files, batch_size = 32, mem = 1, delay = 0, sample_fraction = ( 0.0, 1.0 ),
+                  channel_estimation_noise = False, shuffle = True, seed = 0, prefetch = True, dtype = np.float32 ):
+        self.batch_size = batch_size
+        self.mem = mem
+        self.delay = delay
+        self.channel_estimation_noise = channel_estimation_noise
+        self.shuffle = shuffle
+        self.seed = seed
+        self.prefetch = prefetch
+        self.dtype = dtype
+
+        self.datasets = [ utils.load_dataset( dataset_file ) for dataset_file in dataset_files ]
+
+        self.first_frames = []
+        self.nrof_targets = []  # Frames with a target per column
+        self.nrof_columns = []
+        for dataset in self.datasets:
+            nrof_frames, _, nrof_columns = dataset[ 'channel' ].shape
+            first_frame, last_frame = ( int( fraction * nrof_frames ) for fraction in sample_fraction )
+
+            self.first_frames.append( first_frame )
+            self.nrof_targets.append( max( last_frame - first_frame - delay, 0 ) )
+            self.nrof_columns.append( nrof_columns )
+
+        file_sizes = np.multiply( self.nrof_targets, self.nrof_columns )
+        self.file_offsets = np.concatenate( ( [ 0 ], np.cumsum( file_sizes ) ) )
+        self.nrof_samples = int( self.file_offsets[ -1 ] )
+
+        self.epoch = 0
+        self.order = self._sample_order()
+
+        self._executor = concurrent.futures.ThreadPoolExecutor( max_workers = 1 ) if prefetch else None
+        self._prefetched = {}
+        self._last_batch_index = -1
+        self._lock = threading.Lock()  # keras may request mini-batches from several threads
+
+    def __len__( self ):
+        return int( np.ceil( self.nrof_samples / self.batch_size ) )
+
+    # Mini-batch ( features, targets ) number 'batch_index' of the current epoch
+    def __getitem__( self, batch_index ):
+        with self._lock:
+            future = self._prefetched.pop( batch_index, None )
+
+            # Prefetch only while the mini-batches are requested in order, otherwise the next request is unknown
+            in_order = batch_index == self._last_batch_index + 1
+            self._last_batch_index = batch_index
+
+            if self._executor is not None and in_order and batch_index + 1 < len( self ):
+                if batch_index + 1 not in self._prefetched:
+                    self._cancel_prefetch()
+                    next_indices = self.order[ ( batch_index + 1 ) * self.batch_size : ( batch_index + 2 ) * self.batch_size ]
+                    self._prefetched[ batch_index + 1 ] = self._executor.submit( self._gather, next_indices )
+            elif not in_order:
+                self._cancel_prefetch()
+
+        if future is not None:
+            return future.result()
+
+        return self._gather( self.order[ batch_index * self.batch_size : ( batch_index + 1 ) * self.batch_size ] )
+
+    def __iter__( self ):
+        for batch_index in range( len( self ) ):
+            yield self[ batch_index ]
+
+    # Draw a new sample order for the next epoch
+    def on_epoch_end( self ):
+        with self._lock:
+            self._cancel_prefetch()
+            self._last_batch_index = -1
+
+        self.epoch += 1
+        self.order = self._sample_order()
+
+    def close( self ):
+        with self._lock:
+            self._cancel_prefetch()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # Cancel the prefetched mini-batches, with the lock held
+    def _cancel_prefetch( self ):
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched.clear()
+
+    def _sample_order( self ):
+        if not self.shuffle:
+            return np.arange( self.nrof_samples )
+
+        return np.random.default_rng( [ self.seed, self.epoch ] ).permutation( self.nrof_samples )
+
+    # Features ( samples, mem * 2 * subcarriers ) and targets ( samples, MCSs ) of the given sample indices
+    def _gather( self, sample_indices ):
+        # Sorted indices read the files in order; the order inside a mini-batch does not matter for training
+        sample_indices = np.sort( sample_indices )
+
+        file_indices = np.searchsorted( self.file_offsets, sample_indices, side = 'right' ) - 1
+
+        features = []
+        targets = []
+        for file_index in np.unique( file_indices ):
+            local_indices = sample_indices[ file_indices == file_index ] - self.file_offsets[ file_index ]
+            columns, target_frames = np.divmod( local_indices, self.nrof_targets[ file_index ] )
+            target_frames += self.first_frames[ file_index ] + self.delay
+
+            file_features, file_targets = self._gather_file( file_index, columns, target_frames, int( sample_indices[ 0 ] ) )
+            features.append( file_features )
+            targets.append( file_targets )
+
+        return ( np.concatenate( features ), np.concatenate( targets ) )
+
+    # The estimation noise of a mini-batch is drawn from its own stream, keyed by its first sample index
+    def _gather_file( self, file_index, columns, target_frames, stream_key ):
+        dataset = self.datasets[ file_index ]
+        nrof_subcarriers = dataset[ 'channel' ].shape[ 1 ]
+
+        # Frames of the CSI history ( samples, mem ), most recent first; frames before the first one are zero
+        history_frames = ( target_frames - self.delay )[ :, np.newaxis ] - np.arange( self.mem )
+        valid = history_frames >= 0
+        history_columns = np.broadcast_to( columns[ :, np.newaxis ], history_frames.shape )
+
+        channel = dataset[ 'channel' ][ np.where( valid, history_frames, 0 ), :, history_columns ]
+
+        snrs_db = np.asarray( dataset[ 'snrs_db' ], dtype = np.float64 )
+        nrof_columns_per_snr = self.nrof_columns[ file_index ] // snrs_db.size
+        snr_db = snrs_db[ history_columns // nrof_columns_per_snr ]
+
+        rng = utils.channel_noise_generator( self.seed, self.epoch, stream_key, file_index )
+        channel = utils.calculate_channel_coefficients_scaled( channel, snr_db[ :, :, np.newaxis ], self.channel_estimation_noise,
+                                                               rng = rng, dtype = np.complex64 if self.dtype == np.float32 else np.complex128 )
+        channel[ ~valid, : ] = 0
+
+        features = np.empty( ( columns.size, self.mem, 2 * nrof_subcarriers ), dtype = self.dtype )
+        features[ :, :, : nrof_subcarriers ] = np.real( channel )
+        features[ :, :, nrof_subcarriers : ] = np.imag( channel )
+
+        targets = dataset[ 'block_success' ][ target_frames, :, columns ].astype( self.dtype )
+
+        return ( np.reshape( features, ( columns.size, -1 ) ), targets )
+################################################################################
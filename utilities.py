@@ -1,115 +1,156 @@
+import os
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import scipy
 from scipy import special
+import scipy.linalg
 import matplotlib.pyplot as plt
 
-# Stack the channel snr-per-subcarrier vectors for the previous 'mem' frames
-def stack_features( features, mem = 1 ):
+# Load a dataset directory (memory-mapped) or a pickled .npy dataset file
+def load_dataset( path, mmap_mode = 'r' ):
+    from radio_data.src import dataset
+    
+    return dataset.load_dataset( path, mmap_mode = mmap_mode )
+##################################################################################
+
+# Stack the channel snr-per-subcarrier vectors for the previous 'mem' frames, most recent frame first.
+# Frames before the first sample are zero. The output has the given dtype ( float64 by default, float32 for training ).
+def stack_features( features, mem = 1, dtype = np.float64 ):
     nrof_samples, input_dim = features.shape
     stacked_feature_size = int( input_dim * mem )
     
-    stacked_features = np.ndarray( ( nrof_samples, stacked_feature_size ) )
-    for i in range( nrof_samples ):
-        if i < mem:
-            stacked_features[ i, :  int( input_dim * ( i + 1 ) ) ] = np.ndarray.flatten( features[ : i + 1, : ] )
-        else:
-            stacked_features[ i, : ]   = np.ndarray.flatten( features[ i : i - mem : -1, : ] )
+    stacked_features = np.empty( ( nrof_samples, mem, input_dim ), dtype = dtype )
+    
+    # Samples with a full history are copied from the window view in one go
+    if nrof_samples >= mem:
+        stacked_features[ mem - 1 :, :, : ] = feature_windows( features, mem )
+    
+    # Only the first mem - 1 samples miss history; their windows are taken from an explicitly zero padded head
+    nrof_head_samples = min( mem - 1, nrof_samples )
+    if nrof_head_samples > 0:
+        padded_head = np.concatenate( ( np.zeros( ( mem - 1, input_dim ), dtype = features.dtype ), features[ : nrof_head_samples, : ] ) )
+        stacked_features[ : nrof_head_samples, :, : ] = feature_windows( padded_head, mem )
             
-    return stacked_features
+    return np.reshape( stacked_features, ( nrof_samples, stacked_feature_size ) )
+##################################################################################
+
+# Read-only view of the windows of the previous 'mem' frames, most recent frame first, for the samples with a full
+# history, i.e. window i holds features[ i + mem - 1 ], features[ i + mem - 2 ], ..., features[ i ]. No data is copied.
+def feature_windows( features, mem = 1 ):
+    
+    windows = sliding_window_view( features, mem, axis = 0 ) # ( samples - mem + 1, input_dim, mem ), oldest frame first
+    
+    return np.swapaxes( windows[ :, :, ::-1 ], 1, 2 )
 ##################################################################################
     
+# Independent, reproducible random stream for the channel estimation noise of one piece of data, e.g.
+# channel_noise_generator( seed, file_index, batch_index, snr_index ). Streams with different keys are independent
+# whatever process or thread draws them, as with SeedSequence.spawn.
+def channel_noise_generator( seed, *stream_key ):
+    
+    return np.random.Generator( np.random.PCG64( np.random.SeedSequence( seed, spawn_key = stream_key ) ) )
+################################################################################
+
 # Scale the channel coefficients from dataset and add channel estimation noise if required.
-def calculate_channel_coefficients_scaled_fixed_snr( channel_coeff, snrs_db, channel_estimation_noise ):
+# Without 'rng' the global NumPy RNG is reseeded from the data as before; pass a generator from
+# channel_noise_generator for noise that does not depend on the data. 'dtype' is complex128 or complex64.
+def calculate_channel_coefficients_scaled_fixed_snr( channel_coeff, snrs_db, channel_estimation_noise, rng = None, dtype = np.complex128 ):
     
     # random seed
-    np.random.seed( int(100*abs(channel_coeff[0][0] + channel_coeff[100][5])) )
+    if rng is None:
+        np.random.seed( int(100*abs(channel_coeff[0][0] + channel_coeff[100][5])) )
     
-    channel_coeff_scaled = np.ndarray( channel_coeff.shape, dtype=np.complex128 )
-
     signal_mag = np.sqrt( 10 ** ( 0.1 * snrs_db ) )
-    channel_coeff_scaled[:, :] = channel_coeff[:, :] * signal_mag
+    channel_coeff_scaled = np.multiply( channel_coeff, signal_mag, dtype = dtype )
         
     if channel_estimation_noise:
-        noise_real = np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
-        noise_imag = np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
-        
-        channel_coeff_scaled = channel_coeff_scaled + noise_real + 1j * noise_imag
+        _add_channel_estimation_noise( channel_coeff_scaled, rng )
         
     return channel_coeff_scaled
 ################################################################################
 
-# Scale the channel coefficients from dataset and add channel estimation noise if required.
-def calculate_channel_coefficients_scaled( channel_coeff, snrs_db, channel_estimation_noise ):
-    
+# Scale the channel coefficients ( samples, subcarriers, SNRs ) from dataset and add channel estimation noise if required.
+# Without 'rng' the noise is drawn from the global NumPy RNG as before; pass a generator from channel_noise_generator
+# for reproducible noise under threads or processes. 'dtype' is complex128 or complex64.
+def calculate_channel_coefficients_scaled( channel_coeff, snrs_db, channel_estimation_noise, rng = None, dtype = np.complex128 ):
     
-    nrof_samples, nrof_subcarriers, _ = channel_coeff.shape
-    
-    channel_coeff_scaled = np.ndarray( channel_coeff.shape, dtype=np.complex128 )
-    for snr_index, snr_db in enumerate( snrs_db ):
-        signal_mag = np.sqrt( 10 ** ( 0.1 * snr_db ) )
-        channel_coeff_scaled[:, :, snr_index] = channel_coeff[:, :, snr_index] * signal_mag
+    signal_mag = np.sqrt( 10 ** ( 0.1 * np.asarray( snrs_db ) ) )
+    channel_coeff_scaled = np.multiply( channel_coeff, signal_mag, dtype = dtype )
         
     if channel_estimation_noise:
-        noise_real = np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
-        noise_imag = np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
-        
-        channel_coeff_scaled = channel_coeff_scaled + noise_real + 1j * noise_imag
+        _add_channel_estimation_noise( channel_coeff_scaled, rng )
         
     return channel_coeff_scaled
 ################################################################################
 
-# Determine the MCS that maximizes the expected throughput
+# Add unit variance complex Gaussian noise in place, real parts first and then imaginary parts.
+# With a generator the normal samples are drawn into one reused buffer of the real dtype.
+def _add_channel_estimation_noise( channel_coeff_scaled, rng = None ):
+    
+    if rng is None:
+        channel_coeff_scaled.real += np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
+        channel_coeff_scaled.imag += np.sqrt(0.5) * np.random.normal( size = channel_coeff_scaled.shape )
+        return
+    
+    noise = np.empty( channel_coeff_scaled.shape, dtype = channel_coeff_scaled.real.dtype )
+    for part in ( channel_coeff_scaled.real, channel_coeff_scaled.imag ):
+        rng.standard_normal( out = noise, dtype = noise.dtype )
+        noise *= np.sqrt(0.5)
+        part += noise
+################################################################################
+
+# Determine the MCS that maximizes the expected throughput.
+# ack_probabilities has shape ( ..., samples, MCSs, SNRs ), e.g. with a leading axis of delays; the result has shape
+# ( ..., samples, SNRs ). The probabilities are not copied, only the expected throughputs are allocated.
 def determine_best_mcs( ack_probabilities, block_sizes, target_error_rate = 1.0 ):
     
-    ack_prob = np.copy( ack_probabilities )
-    nrof_samples, _, nrof_snrs = ack_prob.shape
+    block_sizes = np.asarray( block_sizes )
+    expected_tputs = np.multiply( ack_probabilities, block_sizes[ :, np.newaxis ] )
         
     # Suppress the MCS values with a ack probility above the target error rate
-    ack_prob[ ack_prob < ( 1.0 - target_error_rate ) ] = 0
-    
-    best_mcs = np.ndarray( ( nrof_samples, nrof_snrs ), dtype=np.int32 )
-    for snr_index in range( nrof_snrs ):
-        expected_tputs = np.multiply( ack_prob[:, :, snr_index], block_sizes )
-        best_mcs[:, snr_index] = np.argmax( expected_tputs, axis=1 )
+    if target_error_rate < 1.0:
+        expected_tputs[ ack_probabilities < ( 1.0 - target_error_rate ) ] = 0
 
-    return best_mcs
+    return np.argmax( expected_tputs, axis = -2 ).astype( np.int32 )
+################################################################################
+
+# Acknowledgements ( ..., samples, SNRs ) realized with the selected MCSs ( ..., samples, SNRs )
+def realized_ack_of_selected_mcs( selected_mcs, realized_ack ):
+    
+    return np.take_along_axis( realized_ack, np.expand_dims( selected_mcs, -2 ), axis = -2 )[ ..., 0, : ]
 ################################################################################
 
 # Calculate the average realized throughput for the selected MCSs
-def calculate_average_throughput( selected_mcs, realized_ack, block_sizes ):
+def calculate_average_throughput( selected_mcs, realized_ack, block_sizes, frame_duration = 1e-3 ):
     
-    nrof_samples, nrof_snrs = selected_mcs.shape
+    realized_tputs = realized_ack_of_selected_mcs( selected_mcs, realized_ack ) * np.asarray( block_sizes )[ selected_mcs ]
     
-    avg_tput_vs_snr = []
-    for snr_index in range( nrof_snrs ):
-        realized_tputs = np.multiply( realized_ack[:, :, snr_index], block_sizes )
-
-        # Evaluate and store the achieved overall throughput
-        total_tput = 0
-        for i in range( nrof_samples ):
-            mcs = selected_mcs[ i, snr_index ]
-            total_tput = total_tput + realized_tputs[ i,  mcs ]
-        
-        avg_tput_vs_snr.append( ( total_tput /  nrof_samples ) / 1e-3 )  # 1 ms frame duration
-
-    return np.array(avg_tput_vs_snr)
+    return np.mean( realized_tputs, axis = -2 ) / frame_duration  # 1 ms frame duration
 ################################################################################
 
 # Calculate the average realized error rate for the selected MCSs
 def calculate_error_rate( selected_mcs, realized_ack ):
-    nrof_samples, nrof_snrs = selected_mcs.shape
     
-    error_rate_vs_snr = []
-    for snr_index in range( nrof_snrs ):
-
-        total_acks = 0
-        for i in range( nrof_samples ):
-            mcs = selected_mcs[ i, snr_index ]
-            total_acks = total_acks + realized_ack[i, mcs, snr_index]
-        
-        error_rate_vs_snr.append( 1.0 - ( total_acks /  nrof_samples ) )  # 1 ms frame duration
+    return 1.0 - np.mean( realized_ack_of_selected_mcs( selected_mcs, realized_ack ), axis = -2 )
+################################################################################
 
-    return np.array(error_rate_vs_snr)
+# Evaluate a link adaptation approach over the whole ( ..., samples, MCSs, SNRs ) tensor in one call: select the MCS
+# from the ( predicted ) ack probabilities and evaluate it on the realized acks. Leading axes, e.g. a stack of delays,
+# are kept and shared by both tensors through broadcasting, so the realized acks of one delay can be reused for all.
+# Returns the best MCSs ( ..., samples, SNRs ) and the throughput, error rate and spectral efficiency ( ..., SNRs ).
+def evaluate_link_adaptation( ack_probabilities, realized_ack, block_sizes, target_error_rate = 1.0,
+                              frame_duration = 1e-3, tx_bw = 15e3 * 72 ):
+    
+    best_mcs = determine_best_mcs( ack_probabilities, block_sizes, target_error_rate )
+    
+    realized_ack = np.broadcast_to( realized_ack, np.broadcast_shapes( realized_ack.shape, ack_probabilities.shape ) )
+    selected_ack = realized_ack_of_selected_mcs( best_mcs, realized_ack )
+    
+    tput = np.mean( selected_ack * np.asarray( block_sizes )[ best_mcs ], axis = -2 ) / frame_duration
+    error_rate = 1.0 - np.mean( selected_ack, axis = -2 )
+    
+    return ( best_mcs, tput, error_rate, tput / tx_bw )
 ################################################################################
 
 # Shuffle data for training
@@ -146,50 +187,145 @@ def create_lower_matrix(values, size):
     return(lower)
 ################################################################################
 
-# This function computes the Wiener coefficients scaled according to the snr
+# This function computes the Wiener coefficients scaled according to the snr.
+# The autocorrelation matrix is Hermitian Toeplitz and is solved with Levinson-Durbin ( O(N^2) ); the inputs are not modified.
 def Wiener_filter_coeff_scaled(autocorrelation_of_reference,crosscorrelation,delta,N,snr,noise,f_d,sampling_interval):
     
-    b = autocorrelation_of_reference
-    for i in range(1,len(autocorrelation_of_reference)):
-        b = np.concatenate((b,autocorrelation_of_reference[:-i]))
-        
-    upper_half = create_upper_matrix(np.conj(b), len(autocorrelation_of_reference))
-    lower_half = create_lower_matrix(np.flip(b,axis = 0), len(autocorrelation_of_reference))
-    T = lower_half+upper_half
-
+    crosscorrelation = np.array( crosscorrelation )
+    if noise == True and delta == 0:
+        crosscorrelation[0] = crosscorrelation[0]*(( 1 + snr) / snr)
   
-    for i in range(0, len(autocorrelation_of_reference)):
-        
-        if noise == True:
-        
-            T[i,i] = autocorrelation_of_reference[0]* ( 1 + snr) / snr
+    return _solve_Wiener_Toeplitz( autocorrelation_of_reference, crosscorrelation, snr, noise )
+
+################################################################################
+
+# Solve T a* = v for the Hermitian Toeplitz autocorrelation matrix T with first column 'autocorrelation_of_reference'
+# ( diagonal scaled by ( 1 + snr ) / snr for noisy channels ). v may hold one right-hand side per column.
+def _solve_Wiener_Toeplitz( autocorrelation_of_reference, crosscorrelation, snr, noise ):
+    
+    first_column = np.array( autocorrelation_of_reference )
+    if noise == True:
+        first_column[0] = first_column[0] * ( 1 + snr ) / snr
         
-        else:
+    first_row = np.conj( first_column )
+    first_row[0] = first_column[0]
+    
+    return np.conj( scipy.linalg.solve_toeplitz( ( first_column, first_row ), crosscorrelation ) )
+
+################################################################################
+
+# In-memory copy of the Wiener coefficient bank cache, per ( taps, noise, sampling_interval, cache_dir )
+_Wiener_coeff_cache = {}
+
+# Compute the Wiener coefficients for every ( delay, doppler, snr ) combination at once, with linear snrs.
+# Returns an array of shape ( delays, dopplers, snrs, taps ). The autocorrelation is evaluated once per doppler and
+# all delays are solved together per ( doppler, snr ). Coefficients are memoized, keyed by
+# ( taps, delay, doppler, snr, noise, sampling_interval ), in memory and on disk in 'cache_dir' if given.
+def Wiener_filter_coeff_bank( taps, delays, dopplers, snrs, noise, sampling_interval, cache_dir = None ):
+    
+    delays   = np.atleast_1d( delays ).astype( int )
+    dopplers = np.atleast_1d( dopplers ).astype( float )
+    snrs     = np.atleast_1d( snrs ).astype( float )
+    
+    cache = _load_Wiener_coeff_cache( taps, noise, sampling_interval, cache_dir )
+    nrof_cached = len( cache )
+    
+    coeff_bank = np.ndarray( ( len( delays ), len( dopplers ), len( snrs ), taps ) )
+    for doppler_index, doppler_freq in enumerate( dopplers ):
         
-            T[i,i]=autocorrelation_of_reference[0]
+        correlation = None
+        for snr_index, snr in enumerate( snrs ):
+            
+            keys = [ ( int( delay ), float( doppler_freq ), float( snr ) ) for delay in delays ]
+            
+            if not all( key in cache for key in keys ):
+                if correlation is None:
+                    correlation = autocorrelation( np.arange( 0, taps + np.max( delays ), 1 ), doppler_freq, sampling_interval )
+                
+                # One crosscorrelation vector per delay, as columns
+                crosscorrelation = np.stack( [ correlation[ delay : delay + taps ] for delay in delays ], axis = 1 )
+                if noise == True:
+                    crosscorrelation[ 0, delays == 0 ] = crosscorrelation[ 0, delays == 0 ] * ( 1 + snr ) / snr
+                
+                coeff = _solve_Wiener_Toeplitz( correlation[ : taps ], crosscorrelation, snr, noise )
+                for delay_index, key in enumerate( keys ):
+                    cache[ key ] = coeff[ :, delay_index ]
+            
+            for delay_index, key in enumerate( keys ):
+                coeff_bank[ delay_index, doppler_index, snr_index, : ] = cache[ key ]
+    
+    if cache_dir is not None and len( cache ) > nrof_cached:
+        _save_Wiener_coeff_cache( cache, taps, noise, sampling_interval, cache_dir )
+    
+    return coeff_bank
 
-    if noise == True and delta == 0:
-        crosscorrelation[0] = crosscorrelation[0]*(( 1 + snr) / snr)
+def _Wiener_coeff_cache_file( taps, noise, sampling_interval, cache_dir ):
+    return os.path.join( cache_dir, 'wiener_coeff_taps_%d_noise_%d_ts_%r.npz' % ( taps, int( noise ), float( sampling_interval ) ) )
 
-    v = np.transpose( crosscorrelation )
-    a = np.conj(np.dot(np.linalg.inv(T),v))
-  
-    return a
+def _load_Wiener_coeff_cache( taps, noise, sampling_interval, cache_dir ):
+    cache_key = ( taps, bool( noise ), float( sampling_interval ), cache_dir )
+    if cache_key not in _Wiener_coeff_cache:
+        cache = {}
+        if cache_dir is not None and os.path.exists( _Wiener_coeff_cache_file( taps, noise, sampling_interval, cache_dir ) ):
+            stored = np.load( _Wiener_coeff_cache_file( taps, noise, sampling_interval, cache_dir ) )
+            for ( delay, doppler_freq, snr ), coeff in zip( stored[ 'keys' ], stored[ 'coeffs' ] ):
+                cache[ ( int( delay ), float( doppler_freq ), float( snr ) ) ] = coeff
+        _Wiener_coeff_cache[ cache_key ] = cache
+    return _Wiener_coeff_cache[ cache_key ]
+
+def _save_Wiener_coeff_cache( cache, taps, noise, sampling_interval, cache_dir ):
+    if not os.path.exists( cache_dir ):
+        os.makedirs( cache_dir )
+    keys = list( cache.keys() )
+    np.savez( _Wiener_coeff_cache_file( taps, noise, sampling_interval, cache_dir ),
+              keys = np.array( keys, dtype = np.float64 ),
+              coeffs = np.array( [ cache[ key ] for key in keys ] ) )
 
 ################################################################################
 
-# This function reshapes the data
-def flatten_axis( data ):
-    N, M, P = data.shape
-    reshaped_data  = np.ndarray( [ N * P, M ],dtype = data.dtype )
-    for p in range( P ):
-        reshaped_data[ N * p : N * ( p + 1 ), :] = data[:, :, p] 
-    return reshaped_data
+# Apply a Wiener filter along the time axis of a ( frames, subcarriers, snrs ) channel tensor, i.e. for every subcarrier
+# and snr the output equals np.convolve( coeff, channel[:, k, s], 'full' )[ : frames ].
+# 'Wiener_coeff' is one coefficient set ( taps, ) or a per-snr coefficient bank ( snrs, taps ). The filter is computed as
+# one shifted multiply-accumulate over the whole tensor per tap, written into 'out' if given ( otherwise allocated with
+# 'dtype', by default the channel dtype; complex64 halves the memory traffic ).
+def Wiener_predict( Wiener_coeff, channel, out = None, dtype = None ):
+    
+    Wiener_coeff = np.asarray( Wiener_coeff )
+    nrof_taps = Wiener_coeff.shape[ -1 ]
+    
+    if out is None:
+        out = np.empty( channel.shape, dtype = channel.dtype if dtype is None else dtype )
+    
+    # Coefficient of tap k broadcast over the snr axis: a scalar for a single set, a ( snrs, ) vector for a bank
+    tap_coeff = lambda k: Wiener_coeff[ ..., k ].astype( out.dtype )
+    
+    np.multiply( channel, tap_coeff( 0 ), out = out )
+    
+    scratch = np.empty_like( out )
+    for k in range( 1, min( nrof_taps, channel.shape[ 0 ] ) ):
+        np.multiply( channel[ : -k ], tap_coeff( k ), out = scratch[ : -k ] )
+        out[ k : ] += scratch[ : -k ]
+    
+    return out
+################################################################################
 
-def flatten_snr_axis( data ):
+# This function reshapes the data from ( N, M, P ) to ( N * P, M ), stacking the slices data[:, :, p] along the first axis.
+# The result never aliases data, so callers may modify it in place: it is a single C-contiguous copy. The reshape or
+# the dtype conversion usually makes that copy; only when both could return a view ( e.g. P == 1 ) is it made here.
+def flatten_axis( data, dtype = None ):
     N, M, P = data.shape
-    reshaped_data  = np.ndarray( [ N * P, M ] )
-    for p in range( P ):
-        reshaped_data[ N * p : N * ( p + 1 ), :] = data[:, :, p] 
+    reshaped_data = np.reshape( snr_major_view( data ), ( N * P, M ) )
+    if dtype is not None:
+        reshaped_data = reshaped_data.astype( dtype, copy = False )
+    if np.may_share_memory( reshaped_data, data ):
+        reshaped_data = reshaped_data.copy()
     return reshaped_data
 
+# Same as flatten_axis, converting to float64 by default ( float32 for training )
+def flatten_snr_axis( data, dtype = np.float64 ):
+    return flatten_axis( data, dtype = dtype )
+
+# View of ( N, M, P ) data as ( P, N, M ), without copying
+def snr_major_view( data ):
+    return np.moveaxis( data, 2, 0 )
+